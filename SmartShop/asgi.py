@@ -3,6 +3,10 @@ ASGI config for SmartShop project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this module (e.g. ``uvicorn SmartShop.asgi:application``)
+so the async streaming chatbot endpoint (``chatbot/stream/``) streams its
+server-sent events without holding a worker thread per open chat.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
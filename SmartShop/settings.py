@@ -70,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'SmartShop.wsgi.application'
+ASGI_APPLICATION = 'SmartShop.asgi.application'
 
 
 # Database
@@ -87,6 +88,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Intent cache, chat conversation state and the catalogue generation are shared
+# between worker processes through this backend: set REDIS_URL in production.
+# Without it (development) each process gets its own LocMemCache.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -133,3 +155,140 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 LOGIN_URL = "/accounts/login/"
 LOGIN_REDIRECT_URL = "/recommendations/dashboard/"
 LOGOUT_REDIRECT_URL = "/accounts/login/"
+
+
+# Smart search: cache of parsed query intents (AI parse results)
+# Local tier = per-process LRU, shared tier = the CACHE_ALIAS backend of CACHES
+# above (only shared between processes when REDIS_URL is set).
+SMART_SEARCH_INTENT_CACHE = {
+    "ENABLED": True,
+    "LOCAL_MAX_ENTRIES": 2048,
+    "LOCAL_TTL": 600,        # seconds
+    "SHARED_TTL": 86400,     # seconds
+    "CACHE_ALIAS": "default",
+}
+
+# Smart search: how queries are parsed
+#   "sequential" - AI parse first, heuristic parser only when the AI call fails
+#   "race"       - run both concurrently; use the AI result only if it arrives
+#                  within SMART_SEARCH_AI_DEADLINE_MS, else the heuristic result
+#   "local"      - heuristic parser only (no network); the semantic stage below
+#                  bridges vocabulary gaps, but queries are never mapped to a
+#                  category, so only opt in when the AI parse is unavailable
+SMART_SEARCH_PARSE_MODE = "race"
+SMART_SEARCH_AI_DEADLINE_MS = 250
+SMART_SEARCH_PARSE_WORKERS = 8
+
+# Recommendations
+#   "collaborative" - local item-item collaborative filtering (no network)
+#   "llm"           - LLM ranks the catalogue; falls back to collaborative filtering
+RECOMMENDATION_ENGINE = "collaborative"
+RECOMMENDATION_LLM_RERANK = False    # re-rank collaborative candidates with the LLM
+RECOMMENDATION_LIMIT = 10
+RECOMMENDATION_CF_MODEL_PATH = os.path.join(BASE_DIR, 'var', 'cf_model.npz')
+RECOMMENDATION_CF_REFRESH_SECONDS = 60
+
+# LLM gateway: one pooled client shared by every AI feature
+#   BACKEND "openai" - OpenAI API (needs OPENAI_API_KEY)
+#   BACKEND "stub"   - deterministic local answers, no network (tests, benchmarks)
+LLM_GATEWAY = {
+    "BACKEND": os.getenv("LLM_BACKEND", "openai"),
+    "MODEL": "gpt-4o-mini",
+    "MAX_CONNECTIONS": 20,
+    "MAX_KEEPALIVE_CONNECTIONS": 10,
+    "KEEPALIVE_EXPIRY": 30.0,   # seconds
+    "CONNECT_TIMEOUT": 5.0,     # seconds
+    "TIMEOUT": 30.0,            # seconds
+    "MAX_RETRIES": 2,           # exponential backoff between attempts
+    "REQUESTS_PER_MINUTE": None,  # sync-call limiter, None = unlimited
+    "TOKENS_PER_MINUTE": None,
+}
+
+# Background jobs (AI descriptions, review summaries); run `manage.py run_jobs`
+JOB_QUEUE = {
+    "MAX_ATTEMPTS": 3,
+    "RETRY_BACKOFF_SECONDS": 30,   # doubled after every failed attempt
+    "LEASE_SECONDS": 600,          # re-queue jobs left running by a dead worker
+    "POLL_INTERVAL": 2.0,          # seconds
+    "BATCH_SIZE": 10,
+}
+
+# Review summaries: incremental map-reduce over reviews newer than the stored summary
+REVIEW_SUMMARY = {
+    "CHUNK_MAX_CHARS": 6000,      # review text per map prompt
+    "CHUNK_MAX_REVIEWS": 40,
+    "MAX_REVIEW_CHARS": 1500,     # longer reviews are truncated
+    "MAX_PARALLEL_CHUNKS": 4,     # map prompts in flight per product
+    "REDUCE_FAN_IN": 4,           # summaries merged per reduce prompt
+}
+
+# Autocomplete: in-memory prefix index, rebuilt after catalogue changes
+AUTOCOMPLETE = {
+    "TOP_K": 10,
+    "MIN_QUERY_LENGTH": 2,
+    "INFIX_MIN_LENGTH": 3,     # shorter queries only match at word starts
+    "PRECOMPUTE_DEPTH": 3,     # prefixes up to this length get precomputed top-k lists
+    "CACHE_ENTRIES": 4096,
+    "REFRESH_SECONDS": 300,    # re-read popularity at most this often
+    "MAX_AGE": 60,             # Cache-Control max-age of responses (seconds)
+}
+
+# Chatbot: per-user conversation state in the cache, chat log written in batches.
+# Follow-ups routed to another worker only find the state in a shared cache
+# (see CACHES / REDIS_URL above).
+CHAT_CONVERSATION = {
+    "CACHE_ALIAS": "default",
+    "STATE_TTL": 1800,           # seconds a conversation is remembered
+    "LOG_BATCH_SIZE": 50,        # chat messages per bulk insert
+    "LOG_FLUSH_INTERVAL": 5.0,   # seconds a message may wait for its batch
+    "LOG_MAX_BUFFER": 1000,      # buffered messages before writing inline
+}
+
+# Product list API: keyset pages (?cursor=) and NDJSON exports (?stream=1)
+PRODUCT_LIST = {
+    "PAGE_SIZE": 100,
+    "MAX_PAGE_SIZE": 1000,
+    "STREAM_CHUNK_SIZE": 2000,   # rows per query while streaming an export
+}
+
+# Catalogue generation behind the ETag / Last-Modified of catalogue views
+CATALOGUE_VERSION = {
+    "CACHE_ALIAS": "default",
+    "CACHE_TTL": 5,   # seconds before a process re-reads the generation row
+}
+
+# Smart search: whole responses cached per normalized query and catalogue generation
+SMART_SEARCH_RESPONSE_CACHE = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 2048,
+    "TTL": 600,                      # seconds a response stays fresh
+    "NEGATIVE_TTL": 60,              # seconds for responses without results
+    "STALE_WHILE_REVALIDATE": True,  # serve an outdated response, refresh it in the background
+    "MAX_STALE": 3600,
+}
+
+# Smart search backend: "memory" (process-local inverted index) or "fulltext"
+# (FTS5 on SQLite / FULLTEXT on MySQL, see rebuild_search_index); falls back to
+# "memory" when the database has no full-text table.  "fulltext" matches words
+# and word prefixes instead of substrings (on MySQL subject to
+# innodb_ft_min_token_size and stopwords), so check results before switching.
+SMART_SEARCH_BACKEND = "memory"
+
+# Smart search: local semantic stage (hashed n-gram embeddings, no network).
+# Results are ordered by fusing keyword and embedding rankings; queries without
+# literal matches fall back to the nearest products by meaning.
+SMART_SEARCH_SEMANTIC = {
+    "ENABLED": True,
+    "DIMENSIONS": 1024,      # float32 columns per product
+    "TOP_K": 50,
+    "MIN_SIMILARITY": 0.15,
+}
+
+# "Similar products" on the detail page, precomputed by build_similar_products
+# and refreshed through the job queue when products change
+SIMILAR_PRODUCTS = {
+    "TOP_K": 8,
+    "BLOCK_SIZE": 256,       # products scored per matrix multiplication
+    "WEIGHTS": {"text": 0.5, "category": 0.25, "brand": 0.1, "price": 0.15},
+    "REFRESH_DELAY": 60,     # seconds; edits within the window share one refresh
+}
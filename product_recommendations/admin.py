@@ -1,20 +1,74 @@
 from django.contrib import admin
 from product_recommendations.models import (
+    BackgroundJob,
     Category,
     Product,
+    ProductReviewStats,
     UserProfile,
     UserInteraction,
     Order,
     OrderItem,
     Recommendation,
-    Review
+    Review,
+    ReviewSummary,
+    SimilarProduct,
 )
 
+
+# __str__ of these models follows user/product relations; select them up front
+# so changelists don't issue one query per row.
+
+@admin.register(UserInteraction)
+class UserInteractionAdmin(admin.ModelAdmin):
+    list_select_related = ("user", "product")
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_select_related = ("user",)
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    list_select_related = ("product",)
+
+
+@admin.register(Recommendation)
+class RecommendationAdmin(admin.ModelAdmin):
+    list_select_related = ("user", "product")
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_select_related = ("product",)
+
+
+@admin.register(ReviewSummary)
+class ReviewSummaryAdmin(admin.ModelAdmin):
+    list_display = ("product", "review_count", "average_rating", "sentiment", "updated_at")
+    list_select_related = ("product",)
+
+
+@admin.register(ProductReviewStats)
+class ProductReviewStatsAdmin(admin.ModelAdmin):
+    list_display = ("product", "review_count", "average_rating", "last_review_id")
+    list_select_related = ("product",)
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ("task", "product", "status", "attempts", "run_after", "finished_at")
+    list_filter = ("status", "task")
+    list_select_related = ("product",)
+
+
+@admin.register(SimilarProduct)
+class SimilarProductAdmin(admin.ModelAdmin):
+    list_display = ("product", "rank", "similar", "score")
+    list_select_related = ("product", "similar")
+    raw_id_fields = ("product", "similar")
+
+
 admin.site.register(Category)
 admin.site.register(Product)
 admin.site.register(UserProfile)
-admin.site.register(UserInteraction)
-admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(Recommendation)
-admin.site.register(Review)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ProductRecommendationsConfig(AppConfig):
     name = 'product_recommendations'
+
+    def ready(self):
+        # Register signal handlers (search index maintenance)
+        from product_recommendations import signals  # noqa: F401
@@ -0,0 +1,12 @@
+"""
+Offline benchmark suite for the search, ranking, recommendation and chat
+hot paths (``manage.py run_benchmarks``).
+
+- ``runner`` measures wall time, database queries and peak Python memory
+  per benchmark and compares a run against a stored JSON baseline
+- ``cases`` defines the benchmarks themselves
+
+Benchmarks run against a throwaway test database filled by the synthetic
+data generator, with the LLM gateway forced to its stub backend, so results
+are reproducible and need no network access.
+"""
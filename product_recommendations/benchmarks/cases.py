@@ -0,0 +1,256 @@
+"""
+Benchmark definitions.
+
+Each case is a function ``case(ctx)`` yielding ``Benchmark`` (or ``Skip``)
+objects; ``CASES`` lists them in run order.  Cases expect a catalogue built
+by the synthetic data generator (``seed_data --products ...``).
+"""
+
+import contextlib
+import io
+import itertools
+import json
+import os
+import re
+import tempfile
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from product_recommendations.benchmarks.runner import Benchmark, Skip
+from product_recommendations.models import Product, UserInteraction
+from product_recommendations.services.ai_recommendation_service import generate_recommendations_for_user
+from product_recommendations.services.collaborative_filtering import build_cf_model
+from product_recommendations.services.conversation import save_conversation_state
+from product_recommendations.services.query_intent_cache import get_intent_cache
+from product_recommendations.services.smart_search_service import (
+    _parse_query_fallback,
+    _score_and_sort_products,
+    smart_search_products,
+)
+
+
+class BenchmarkContext:
+    """
+    Shared fixtures: the most active user, logged in on a test client, and a
+    temporary directory for files the cases write (the CF model).  Use it as
+    a context manager, or call ``close()``, to remove that directory.
+    """
+
+    def __init__(self):
+        self.product_count = Product.objects.filter(is_active=True).count()
+        top = (
+            UserInteraction.objects.values("user_id")
+            .annotate(n=Count("id")).order_by("-n", "user_id").first()
+        )
+        if top is None:
+            raise ValueError("Benchmarks need a generated dataset with interactions")
+        self.user = User.objects.get(pk=top["user_id"])
+        self.client = Client()
+        self.client.force_login(self.user)
+        # Chat follow-ups refer to a kettle, as the search stages do
+        products = Product.objects.filter(is_active=True).order_by("id")
+        self.product = products.filter(name__icontains="kettle").first() or products.first()
+        self._tmp = tempfile.TemporaryDirectory(prefix="smartshop-benchmarks-")
+        self.cf_model_path = os.path.join(self._tmp.name, "cf_model.npz")
+
+    def close(self):
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# -----------------------------
+#   Smart search
+# -----------------------------
+
+# stage -> (query, parsed intent).  Intents are put in the intent cache so
+# each query deterministically lands on one step of the fallback ladder.
+SEARCH_STAGES = {
+    "strict": ("fitness yoga mat under 80", {"category": "Fitness", "max_price": 80.0, "keywords": ["yoga", "mat"]}),
+    "keywords_price": ("beauty kettle under 80", {"category": "Beauty", "max_price": 80.0, "keywords": ["kettle"]}),
+    "keywords_only": ("beauty kettle under 3", {"category": "Beauty", "max_price": 3.0, "keywords": ["kettle"]}),
+    "price_relaxed": ("kettle under 3", {"category": None, "max_price": 3.0, "keywords": ["kettle"]}),
+    "full_query": ("nova", {"category": None, "max_price": None, "keywords": ["xyzzy"]}),
+}
+
+_STAGE_LABELS = {"strict-check": "strict", "kw+price": "keywords_price", "kw-only": "keywords_only", "relaxed": "price_relaxed"}
+
+
+def _landed_stage(query):
+    """Which ladder step answered ``query`` (read from the service's debug lines)."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        smart_search_products(query, return_metadata=True)
+    for label, count in reversed(re.findall(r"\[smart_search\] (\S+) count=(\d+)", out.getvalue())):
+        if int(count):
+            return _STAGE_LABELS[label]
+    return "full_query"
+
+
+def smart_search(ctx):
+    cache = get_intent_cache()
+    for stage, (query, intent) in SEARCH_STAGES.items():
+        cache.set(query, intent)
+        yield Benchmark(
+            f"smart_search.{stage}",
+            partial(smart_search_products, query, return_metadata=True),
+            info={"query": query, "stage": _landed_stage(query)},
+        )
+
+    # Intent cache miss: a fresh query every time, parsed by the stub LLM
+    fresh = itertools.count()
+    yield Benchmark(
+        "smart_search.uncached_parse",
+        lambda: smart_search_products(f"wireless earbuds under {60 + next(fresh)}", return_metadata=True),
+    )
+
+    # Vague query: heuristic parse, hybrid keyword + embedding ranking
+    yield Benchmark(
+        "smart_search.hybrid",
+        partial(smart_search_products, "something to boil water for tea", return_metadata=True),
+    )
+
+    # Whole endpoint, answered from the response cache after the first call
+    def search_view(query):
+        response = ctx.client.get("/search/", {"q": query})
+        assert response.status_code == 200, response.status_code
+
+    yield Benchmark("smart_search_view.cached", partial(search_view, SEARCH_STAGES["strict"][0]))
+
+
+PARSE_QUERIES = [
+    "I need a power bank under $50",
+    "hair dryer less than 40",
+    "looking for a stainless steel air fryer",
+    "best running shoes for the gym below $120",
+    "vitamin c serum",
+    "cheap resistance band set and water bottle",
+    "recommend a wireless keyboard for remote work",
+    "protein shaker under 15",
+]
+
+
+def parse_query(ctx):
+    def parse_all():
+        for q in PARSE_QUERIES:
+            _parse_query_fallback(q)
+
+    yield Benchmark(f"parse_query_fallback.x{len(PARSE_QUERIES)}", parse_all)
+
+
+def scoring(ctx):
+    for size in (1000, 10000, 100000):
+        name = f"score_and_sort.{size // 1000}k"
+        if size > ctx.product_count:
+            yield Skip(name, f"needs {size} products, dataset has {ctx.product_count}")
+            continue
+        products = list(Product.objects.filter(is_active=True).select_related("category").order_by("id")[:size])
+        yield Benchmark(name, partial(_score_and_sort_products, products, ["wireless", "earbuds"], 80.0, top_k=20))
+
+
+# -----------------------------
+#   Recommendations
+# -----------------------------
+
+def recommendations(ctx):
+    # Never overwrite the deployment's persisted model
+    with override_settings(RECOMMENDATION_CF_MODEL_PATH=ctx.cf_model_path):
+        build_cf_model(full=True)
+
+    def recommend():
+        interactions = UserInteraction.objects.filter(user=ctx.user).select_related("product")
+        return generate_recommendations_for_user(ctx.user, interactions)
+
+    yield Benchmark(
+        "recommendations.collaborative",
+        recommend,
+        settings={"RECOMMENDATION_ENGINE": "collaborative", "RECOMMENDATION_LLM_RERANK": False},
+    )
+    yield Benchmark(
+        "recommendations.llm",
+        recommend,
+        settings={"RECOMMENDATION_ENGINE": "llm"},
+    )
+
+
+# -----------------------------
+#   Endpoints
+# -----------------------------
+
+CHAT_INTENTS = {
+    "greeting": "hi",
+    "search": "yoga mat under $80",
+    "availability": "is it in stock?",
+    "reviews": "what do the reviews say?",
+    "no_results": "xyzzy plugh",
+}
+
+
+def chatbot(ctx):
+    def post(message):
+        response = ctx.client.post("/chatbot/", json.dumps({"message": message}), content_type="application/json")
+        assert response.status_code == 200, response.status_code
+
+    def previous_turn():
+        # Follow-up intents resolve the product from the last turn
+        save_conversation_state(ctx.user, {"intent": "search", "product": ctx.product, "products": [], "meta": {}})
+
+    for intent, message in CHAT_INTENTS.items():
+        follow_up = intent in ("availability", "reviews")
+        yield Benchmark(
+            f"chatbot_api.{intent}",
+            partial(post, message),
+            before=previous_turn if follow_up else None,
+            info={"message": message},
+        )
+
+
+AUTOCOMPLETE_PREFIXES = ["ke", "wirel", "yoga m", "nova", "stainless"]
+
+
+def autocomplete(ctx):
+    def complete_all():
+        for q in AUTOCOMPLETE_PREFIXES:
+            response = ctx.client.get("/search/autocomplete/", {"q": q})
+            assert response.status_code == 200, response.status_code
+
+    yield Benchmark(f"autocomplete_search.x{len(AUTOCOMPLETE_PREFIXES)}", complete_all)
+
+
+def product_list(ctx):
+    url = "/api/recommendations/products/"
+
+    def fetch(params):
+        response = ctx.client.get(url, params)
+        assert response.status_code == 200, response.status_code
+        return response.content
+
+    def export():
+        response = ctx.client.get(url, {"stream": "1"})
+        assert response.status_code == 200, response.status_code
+        return sum(len(chunk) for chunk in response.streaming_content)
+
+    # A page near the end of the catalogue costs the same as the first one
+    last_page = Product.objects.filter(is_active=True).order_by("-id").values_list("id", flat=True)[100]
+    yield Benchmark("product_list", partial(fetch, {}), info={"products": ctx.product_count})
+    yield Benchmark("product_list.last_page", partial(fetch, {"cursor": last_page}))
+    yield Benchmark("product_list.export_ndjson", export, info={"products": ctx.product_count})
+
+    # Client revalidating a page it already has
+    etag = ctx.client.get(url)["ETag"]
+
+    def revalidate():
+        response = ctx.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304, response.status_code
+
+    yield Benchmark("product_list.not_modified", revalidate)
+
+
+CASES = [smart_search, parse_query, scoring, recommendations, chatbot, autocomplete, product_list]
@@ -0,0 +1,191 @@
+"""
+Measurement and baseline comparison for the benchmark suite.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+
+class Benchmark:
+    """
+    One measured callable.
+
+    ``before`` runs before every iteration outside the timed region (e.g. to
+    reset state); ``settings`` are applied with ``override_settings`` for the
+    whole measurement; ``info`` is copied into the result as-is.
+    """
+
+    def __init__(self, name, fn, before=None, settings=None, info=None):
+        self.name = name
+        self.fn = fn
+        self.before = before
+        self.settings = settings or {}
+        self.info = info or {}
+
+
+class Skip:
+    """Placeholder for a benchmark that cannot run on the current dataset."""
+
+    def __init__(self, name, reason):
+        self.name = name
+        self.reason = reason
+
+
+def _quiet(fn):
+    # Several services print debug lines on every call
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+
+def measure(benchmark, repeat=5, warmup=1):
+    """Run ``benchmark`` and return its result dict (times in milliseconds)."""
+    with override_settings(**benchmark.settings):
+        for _ in range(warmup):
+            if benchmark.before:
+                benchmark.before()
+            _quiet(benchmark.fn)
+
+        times = []
+        queries = 0
+        for _ in range(repeat):
+            if benchmark.before:
+                benchmark.before()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                _quiet(benchmark.fn)
+                times.append((time.perf_counter() - started) * 1000)
+            queries = len(ctx.captured_queries)
+
+        # Separate traced run: tracemalloc slows everything down
+        if benchmark.before:
+            benchmark.before()
+        tracemalloc.start()
+        try:
+            _quiet(benchmark.fn)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "name": benchmark.name,
+        "wall_ms": {
+            "median": round(statistics.median(times), 3),
+            "min": round(min(times), 3),
+            "max": round(max(times), 3),
+            "mean": round(statistics.fmean(times), 3),
+        },
+        "queries": queries,
+        "peak_kb": round(peak / 1024, 1),
+        "iterations": repeat,
+        **({"info": benchmark.info} if benchmark.info else {}),
+    }
+
+
+def run_suite(cases, ctx, repeat=5, only=None, log=print):
+    """
+    Run every benchmark produced by ``cases`` (callables ``case(ctx)``
+    yielding ``Benchmark``/``Skip`` objects). ``only`` is a list of name
+    substrings. Returns the list of result dicts.
+    """
+    results = []
+    for case in cases:
+        for item in case(ctx):
+            if only and not any(part in item.name for part in only):
+                continue
+            if isinstance(item, Skip):
+                results.append({"name": item.name, "skipped": item.reason})
+                log(f"  {item.name:<40} skipped: {item.reason}")
+                continue
+            result = measure(item, repeat=repeat)
+            results.append(result)
+            log(
+                f"  {item.name:<40} {result['wall_ms']['median']:>10.2f} ms "
+                f"{result['queries']:>5} queries {result['peak_kb']:>10.1f} KB"
+            )
+    return results
+
+
+def build_report(results, meta):
+    return {
+        "meta": {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            **meta,
+        },
+        "results": results,
+    }
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(os.fspath(path)) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+        fh.write("\n")
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def compare_reports(current, baseline, threshold=0.25, min_delta_ms=0.5, min_delta_kb=64):
+    """
+    Compare two reports benchmark by benchmark.
+
+    A benchmark regresses when its median time grows by more than
+    ``threshold`` (and by at least ``min_delta_ms``, to ignore timer noise),
+    when it issues more queries, or when its peak memory grows by more than
+    ``threshold`` (and ``min_delta_kb``).  Returns rows with a ``status`` of
+    "ok", "faster", "regression", "new" or "skipped".
+    """
+    before = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    for result in current.get("results", []):
+        name = result["name"]
+        old = before.get(name)
+        if "skipped" in result or (old is not None and "skipped" in old):
+            rows.append({"name": name, "status": "skipped"})
+            continue
+        if old is None:
+            rows.append({"name": name, "status": "new", "current_ms": result["wall_ms"]["median"]})
+            continue
+
+        old_ms, new_ms = old["wall_ms"]["median"], result["wall_ms"]["median"]
+        ratio = new_ms / old_ms if old_ms else float("inf")
+        reasons = []
+        if ratio > 1 + threshold and new_ms - old_ms >= min_delta_ms:
+            reasons.append(f"time x{ratio:.2f}")
+        if result["queries"] > old["queries"]:
+            reasons.append(f"queries {old['queries']} -> {result['queries']}")
+        old_kb, new_kb = old["peak_kb"], result["peak_kb"]
+        if new_kb > old_kb * (1 + threshold) and new_kb - old_kb >= min_delta_kb:
+            reasons.append(f"memory {old_kb:.0f} -> {new_kb:.0f} KB")
+
+        if reasons:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold) and old_ms - new_ms >= min_delta_ms:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append({
+            "name": name,
+            "status": status,
+            "baseline_ms": old_ms,
+            "current_ms": new_ms,
+            "ratio": round(ratio, 3),
+            "reasons": reasons,
+        })
+    return rows
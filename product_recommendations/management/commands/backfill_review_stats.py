@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from product_recommendations.models import Product
+from product_recommendations.services.review_stats import rebuild_review_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-product review stats (counts, rating histogram, sentiment distribution) "
+        "from the reviews table, e.g. after reviews were bulk-loaded"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', default=[],
+                            help='Only rebuild this product id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products per aggregate query')
+
+    def handle(self, *args, **kwargs):
+        started = time.monotonic()
+        product_ids = None
+        if kwargs['product']:
+            product_ids = list(Product.objects.filter(pk__in=kwargs['product']).values_list('pk', flat=True))
+        written = rebuild_review_stats(product_ids, batch_size=kwargs['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt review stats for {written} products in {elapsed:.1f}s"))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from product_recommendations.services.collaborative_filtering import build_cf_model
+
+
+class Command(BaseCommand):
+    help = "Update the collaborative-filtering model with new interactions/orders and persist it to disk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from scratch instead of updating incrementally')
+
+    def handle(self, *args, **kwargs):
+        started = time.monotonic()
+        model, applied = build_cf_model(full=kwargs['full'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied {applied} events in {elapsed:.1f}s "
+            f"({model.user_count} users, {model.item_count} items, "
+            f"watermarks: interaction={model.last_interaction_id} order_item={model.last_order_item_id})"
+        ))
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from product_recommendations.services.collaborative_filtering import build_cf_model
+from product_recommendations.services.recommendation_pipeline import run_batch, users_needing_refresh
+
+
+class Command(BaseCommand):
+    help = "Precompute and store ranked recommendations (default: only users with new interactions since the last run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute recommendations for every user')
+        parser.add_argument('--user-ids', type=str, help='Comma-separated user ids to recompute')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker threads')
+
+    def handle(self, *args, **kwargs):
+        if kwargs.get('user_ids'):
+            id_list = [int(i.strip()) for i in kwargs['user_ids'].split(',') if i.strip().isdigit()]
+            users = User.objects.filter(id__in=id_list).order_by('id')
+        elif kwargs['all']:
+            users = User.objects.all().order_by('id')
+        else:
+            users = users_needing_refresh()
+
+        users = list(users)
+
+        if getattr(settings, 'RECOMMENDATION_ENGINE', 'llm') == 'collaborative':
+            _, applied = build_cf_model()
+            self.stdout.write(f"Collaborative-filtering model updated with {applied} new events")
+
+        self.stdout.write(f"Computing recommendations for {len(users)} users with {kwargs['workers']} worker(s)...")
+
+        def on_result(user, count, error):
+            if error is not None:
+                self.stdout.write(self.style.ERROR(f"  {user.username}: failed ({error})"))
+            elif count:
+                self.stdout.write(self.style.SUCCESS(f"  {user.username}: stored {count} recommendations"))
+            else:
+                self.stdout.write(self.style.WARNING(f"  {user.username}: no recommendations (kept previous ranking)"))
+
+        started = time.monotonic()
+        succeeded, failed = run_batch(users, workers=kwargs['workers'], on_result=on_result)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {succeeded} succeeded, {failed} failed in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from product_recommendations.services.similar_products import build_similar_products, refresh_similar_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the top-k content-based neighbours of every active product (category, brand, "
+        "price band, description text) for the product detail page"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', default=[],
+                            help='Only refresh the lists affected by this product id (repeatable)')
+
+    def handle(self, *args, **kwargs):
+        started = time.monotonic()
+        if kwargs['product']:
+            written = refresh_similar_products(kwargs['product'])
+        else:
+            last_report = [started]
+
+            def log(done, total):
+                now = time.monotonic()
+                if now - last_report[0] >= 5 or done == total:
+                    last_report[0] = now
+                    self.stdout.write(f"  {done}/{total} products")
+
+            written = build_similar_products(log=log)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Wrote similar products for {written} products in {elapsed:.1f}s"))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from product_recommendations.models import Product
+from product_recommendations.services.catalogue_version import bump_catalogue_version
 
 class Command(BaseCommand):
     help = "Fix mismatched image file names for products (e.g., brightlite -> brightlight)"
@@ -20,4 +21,6 @@ class Command(BaseCommand):
         if total_changed == 0:
             self.stdout.write("No product image URLs required updating.")
         else:
+            # QuerySet.update() skips the signal that bumps the catalogue generation
+            bump_catalogue_version()
             self.stdout.write(self.style.SUCCESS(f"Total updated: {total_changed}"))
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from product_recommendations.models import Product, Review
 from django.db import transaction
-from product_recommendations.services.review_summary_service import get_or_generate_review_summary
+from product_recommendations.services.review_summary_batch import regenerate_summaries
 import random
 
 class Command(BaseCommand):
@@ -10,6 +10,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--ids', type=str, help='Comma-separated product ids to update')
         parser.add_argument('--names', type=str, help='Comma-separated product name substrings to match')
+        parser.add_argument('--concurrency', type=int, default=1, help='Summaries regenerated in parallel')
 
     def handle(self, *args, **kwargs):
         ids = kwargs.get('ids')
@@ -84,12 +85,18 @@ class Command(BaseCommand):
                         review_text=text.format(product=p.name, brand=(p.brand or p.name), category=p.category.name)
                     )
 
-                # clear caches and regenerate summary
-                p.reviews.update(ai_summary_cache=None, sentiment_label=None, last_summarized_at=None)
-                summary = get_or_generate_review_summary(p)
-                if summary:
-                    self.stdout.write(self.style.SUCCESS(f'  Regenerated summary: {summary.get("summary")[:120]}'))
-                else:
-                    self.stdout.write(self.style.WARNING('  No summary generated (no reviews)'))
+        # regenerate summaries from the new reviews
+        def on_result(product_id, product, summary, error, progress):
+            if error is not None:
+                self.stdout.write(self.style.ERROR(f'  {progress.format()}  Product {product_id}: failed ({error})'))
+            elif summary:
+                self.stdout.write(self.style.SUCCESS(
+                    f'  {progress.format()}  Product {product_id}: regenerated summary: {(summary.get("summary") or "")[:120]}'
+                ))
+            else:
+                self.stdout.write(self.style.WARNING(f'  {progress.format()}  Product {product_id}: no summary generated (no reviews)'))
+
+        product_ids = sorted(set(products.values_list('id', flat=True)))
+        regenerate_summaries(product_ids, concurrency=kwargs['concurrency'], on_result=on_result)
 
         self.stdout.write(self.style.SUCCESS('Done.'))
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Avg
-from product_recommendations.models import Product
+from product_recommendations.models import Product, ReviewSummary
+from product_recommendations.services.review_stats import get_review_stats
 
 class Command(BaseCommand):
     help = 'Print review texts for a specific product name (for debugging)'
@@ -18,19 +18,25 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS(f'Product: {p.name} (id={p.id})'))
         for r in p.reviews.all():
-            self.stdout.write(f'- [{r.rating}] {r.review_text} | sentiment_label={r.sentiment_label} | cache_len={len(r.ai_summary_cache or "")}')
+            self.stdout.write(f'- [{r.rating}] {r.review_text}')
 
-        avg = p.reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        self.stdout.write(self.style.SUCCESS(f'Average rating: {avg}'))
+        stats = get_review_stats(p)
+        if stats is not None:
+            self.stdout.write(self.style.SUCCESS(
+                f'Average rating: {stats.average_rating} ({stats.review_count} reviews, '
+                f'histogram {stats.histogram}, sentiment {stats.sentiment_distribution})'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Average rating: None (no review stats)'))
 
-        cached = p.reviews.filter(ai_summary_cache__isnull=False).first()
+        cached = ReviewSummary.objects.filter(product=p).first()
         if cached:
-            self.stdout.write(self.style.SUCCESS('Cached content (first 200 chars):'))
-            self.stdout.write(cached.ai_summary_cache[:200])
+            self.stdout.write(self.style.SUCCESS('Stored summary (first 200 chars):'))
+            self.stdout.write(cached.summary[:200])
+            self.stdout.write(self.style.SUCCESS(
+                f'Stored sentiment: {cached.sentiment!r} ({cached.review_count} reviews, last id {cached.last_review_id})'
+            ))
             # test sentiment extractor
             from product_recommendations.services.review_summary_service import extract_sentiment
-            s = extract_sentiment(cached.ai_summary_cache, p.reviews.all())
-            self.stdout.write(self.style.SUCCESS(f'Extracted sentiment from cache: {repr(s)}'))
-            s2 = extract_sentiment(' '.join([r.review_text for r in p.reviews.all()][:3]), p.reviews.all())
+            s2 = extract_sentiment(' '.join([r.review_text for r in p.reviews.all()][:3]), p)
             self.stdout.write(self.style.SUCCESS(f'Extracted sentiment from excerpt: {s2}'))
-
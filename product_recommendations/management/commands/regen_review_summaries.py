@@ -1,24 +1,94 @@
-from django.core.management.base import BaseCommand
-from product_recommendations.models import Product, Review
-from product_recommendations.services.review_summary_service import get_or_generate_review_summary
+import os
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from product_recommendations.models import Product
+from product_recommendations.services.llm_gateway import configure_rate_limit
+from product_recommendations.services.review_summary_batch import (
+    Checkpoint, products_with_reviews_since, regenerate_summaries
+)
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, 'var', 'regen_review_summaries.checkpoint')
+
+
+def _parse_since(value):
+    """ISO date/datetime, or a relative age such as 12h / 7d."""
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    if value[-1:] in units and value[:-1].isdigit():
+        return timezone.now() - timedelta(**{units[value[-1]]: int(value[:-1])})
+
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid --since value: {value!r} (use YYYY-MM-DD, an ISO datetime, or e.g. 7d)")
+        moment = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
 
 class Command(BaseCommand):
-    help = "Regenerate AI review summaries for all products (clears cache first)"
+    help = "Regenerate AI review summaries for all products (replaces stored summaries)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Products summarized in parallel')
+        parser.add_argument('--rpm', type=int, help='Max LLM requests per minute')
+        parser.add_argument('--tpm', type=int, help='Max LLM tokens per minute')
+        parser.add_argument('--since', type=str,
+                            help='Only products with reviews since this date/datetime or age (e.g. 7d, 12h)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Fold new reviews into stored summaries instead of rebuilding them')
+        parser.add_argument('--checkpoint', type=str, default=DEFAULT_CHECKPOINT,
+                            help='File recording finished products')
+        parser.add_argument('--resume', action='store_true', help='Skip products finished by a previous run')
 
     def handle(self, *args, **kwargs):
-        products = Product.objects.all()
-        total = products.count()
-        self.stdout.write(f"Regenerating summaries for {total} products...")
-
-        for p in products:
-            # Clear cached values on reviews for this product
-            Review.objects.filter(product=p).update(ai_summary_cache=None, sentiment_label=None, last_summarized_at=None)
-
-            # Force generation (will use fallback if OPENAI_API_KEY is missing)
-            summary = get_or_generate_review_summary(p)
-            if summary:
-                self.stdout.write(self.style.SUCCESS(f"  Generated summary for {p.id}: {p.name}"))
+        if kwargs['since']:
+            product_ids = products_with_reviews_since(_parse_since(kwargs['since']))
+        else:
+            product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+
+        checkpoint = Checkpoint(kwargs['checkpoint'])
+        if kwargs['resume']:
+            done = checkpoint.load()
+            skipped = len(product_ids)
+            product_ids = [pid for pid in product_ids if pid not in done]
+            skipped -= len(product_ids)
+            self.stdout.write(f"Resuming: {skipped} products already done")
+        else:
+            checkpoint.reset()
+
+        if kwargs['rpm'] or kwargs['tpm']:
+            configure_rate_limit(kwargs['rpm'], kwargs['tpm'])
+
+        total = len(product_ids)
+        self.stdout.write(f"Regenerating summaries for {total} products with concurrency {kwargs['concurrency']}...")
+
+        def on_result(product_id, product, summary, error, progress):
+            if error is not None:
+                self.stdout.write(self.style.ERROR(f"  {progress.format()}  Failed {product_id}: {error}"))
+            elif summary:
+                self.stdout.write(self.style.SUCCESS(f"  {progress.format()}  Generated summary for {product.id}: {product.name}"))
             else:
-                self.stdout.write(self.style.WARNING(f"  Skipped {p.id}: {p.name} (no reviews)"))
+                self.stdout.write(self.style.WARNING(f"  {progress.format()}  Skipped {product.id}: {product.name} (no reviews)"))
+
+        progress = regenerate_summaries(
+            product_ids,
+            concurrency=kwargs['concurrency'],
+            incremental=kwargs['incremental'],
+            checkpoint=checkpoint,
+            on_result=on_result,
+        )
 
-        self.stdout.write(self.style.SUCCESS("Done."))
\ No newline at end of file
+        snap = progress.snapshot()
+        style = self.style.SUCCESS if not snap['failed'] else self.style.WARNING
+        self.stdout.write(style(
+            f"Done. {snap['done'] - snap['failed']} succeeded, {snap['failed']} failed "
+            f"in {snap['elapsed']:.1f}s ({snap['rate'] * 60:.1f} products/min)"
+        ))
+        if snap['failed']:
+            self.stdout.write("Re-run with --resume to retry only the failed products.")
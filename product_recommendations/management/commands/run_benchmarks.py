@@ -0,0 +1,143 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from product_recommendations.benchmarks.cases import CASES, BenchmarkContext
+from product_recommendations.benchmarks.runner import (
+    build_report, compare_reports, load_report, run_suite, write_report
+)
+from product_recommendations.models import Product
+from product_recommendations.services.autocomplete_index import get_autocomplete_index
+from product_recommendations.services.collaborative_filtering import reset_cf_model
+from product_recommendations.services.conversation import get_chat_log
+from product_recommendations.services.llm_gateway import reset_llm_clients
+from product_recommendations.services.product_mentions import get_mention_index
+from product_recommendations.services.query_intent_cache import get_intent_cache
+from product_recommendations.services.search_index import get_search_index
+from product_recommendations.services.search_response_cache import get_search_response_cache
+from product_recommendations.services.semantic_search import get_semantic_index
+from product_recommendations.services.synthetic_data import SyntheticDataGenerator
+
+BENCHMARK_DIR = os.path.join(settings.BASE_DIR, 'var', 'benchmarks')
+
+SCALES = {
+    'small': dict(products=2000, users=500, interactions=50_000, reviews_per_product=3, orders=1000, chat_messages=1000),
+    'medium': dict(products=20_000, users=5000, interactions=500_000, reviews_per_product=5, orders=10_000, chat_messages=10_000),
+    'large': dict(products=100_000, users=20_000, interactions=1_000_000, reviews_per_product=5, orders=50_000, chat_messages=50_000),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark search, ranking, recommendation and chat hot paths on a generated dataset "
+        "in a throwaway test database, with the stub LLM backend (no network needed)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Dataset size')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for the generated dataset')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed iterations per benchmark')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Only run benchmarks whose name contains this (repeatable)')
+        parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'latest.json'),
+                            help='Where to write the JSON results')
+        parser.add_argument('--baseline', default=os.path.join(BENCHMARK_DIR, 'baseline.json'),
+                            help='Baseline JSON to compare against')
+        parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Relative slowdown that counts as a regression (0.25 = 25%%)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on regressions')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the test database (and its dataset) between runs')
+
+    def handle(self, *args, **options):
+        scale = SCALES[options['scale']]
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        model_dir = tempfile.TemporaryDirectory()
+        overrides = override_settings(
+            LLM_GATEWAY={**getattr(settings, 'LLM_GATEWAY', {}), 'BACKEND': 'stub'},
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                'LOCATION': 'smartshop-benchmarks'}},
+            RECOMMENDATION_CF_MODEL_PATH=os.path.join(model_dir.name, 'cf_model.npz'),
+        )
+        overrides.enable()
+        self._reset_state()
+        try:
+            if not Product.objects.exists():
+                self.stdout.write(f"Generating '{options['scale']}' dataset (seed {options['seed']})...")
+                SyntheticDataGenerator(seed=options['seed'], log=self.stdout.write, **scale).run()
+            else:
+                self.stdout.write("Reusing dataset from the kept test database")
+
+            self.stdout.write(f"Running benchmarks ({options['repeat']} iterations each)...")
+            with BenchmarkContext() as ctx:
+                results = run_suite(CASES, ctx, repeat=options['repeat'],
+                                    only=options['only'], log=self.stdout.write)
+            report = build_report(results, {
+                'scale': options['scale'], 'seed': options['seed'], 'repeat': options['repeat'], **scale,
+            })
+        finally:
+            overrides.disable()
+            self._reset_state()
+            model_dir.cleanup()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        write_report(report, options['output'])
+        self.stdout.write(f"Results written to {options['output']}")
+
+        regressions = []
+        if options['save_baseline']:
+            write_report(report, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+        elif os.path.exists(options['baseline']):
+            regressions = self._compare(report, load_report(options['baseline']), options['threshold'])
+        else:
+            self.stdout.write(f"No baseline at {options['baseline']}; run with --save-baseline to create one")
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+
+    def _reset_state(self):
+        # Process-wide caches must not leak between the real and test databases
+        get_chat_log().clear()
+        reset_llm_clients()
+        reset_cf_model()
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        get_autocomplete_index().invalidate()
+        get_mention_index().invalidate()
+        get_intent_cache().clear_local()
+        get_search_response_cache().clear()
+
+    def _compare(self, report, baseline, threshold):
+        meta = baseline.get('meta', {})
+        if meta.get('scale') != report['meta']['scale'] or meta.get('database') != report['meta']['database']:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with scale={meta.get('scale')} on {meta.get('database')}; "
+                "comparison may be meaningless"
+            ))
+
+        self.stdout.write(f"Compared with baseline from {meta.get('created_at', '?')}:")
+        regressions = []
+        for row in compare_reports(report, baseline, threshold=threshold):
+            if row['status'] in ('new', 'skipped'):
+                self.stdout.write(f"  {row['name']:<40} {row['status']}")
+                continue
+            line = (
+                f"  {row['name']:<40} {row['baseline_ms']:>10.2f} -> {row['current_ms']:>10.2f} ms "
+                f"(x{row['ratio']:.2f}) {row['status']}"
+            )
+            if row['status'] == 'regression':
+                regressions.append(row['name'])
+                self.stdout.write(self.style.ERROR(f"{line}: {', '.join(row['reasons'])}"))
+            elif row['status'] == 'faster':
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
+        return regressions
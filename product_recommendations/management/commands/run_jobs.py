@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from product_recommendations.services.job_queue import default_worker_id, run_pending, work_forever
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (AI descriptions, review summaries); polls until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the due jobs and exit instead of polling')
+        parser.add_argument('--max-jobs', type=int, help='With --once: stop after this many jobs')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--worker-id', type=str, help='Name recorded on claimed jobs (default: host:pid)')
+
+    def handle(self, *args, **kwargs):
+        worker_id = kwargs.get('worker_id') or default_worker_id()
+
+        if kwargs['once']:
+            succeeded, failed = run_pending(worker_id, limit=kwargs.get('max_jobs'))
+            self.stdout.write(self.style.SUCCESS(f"Done. {succeeded} succeeded, {failed} failed"))
+            return
+
+        self.stdout.write(f"Worker {worker_id} waiting for jobs (Ctrl+C to stop)...")
+
+        def on_batch(succeeded, failed):
+            style = self.style.SUCCESS if not failed else self.style.WARNING
+            self.stdout.write(style(f"  {succeeded} succeeded, {failed} failed"))
+
+        try:
+            work_forever(worker_id, poll_interval=kwargs.get('poll_interval'), on_batch=on_batch)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
@@ -1,4 +1,4 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from product_recommendations.models import (
     UserProfile,
@@ -6,13 +6,34 @@ from product_recommendations.models import (
     Product,
     Review
 )
+from product_recommendations.services.synthetic_data import SyntheticDataGenerator
 import random
+import time
+
+GENERATOR_OPTIONS = ('products', 'users', 'interactions', 'reviews_per_product', 'orders', 'chat_messages')
 
 
 class Command(BaseCommand):
-    help = "Seed initial data for SmartShop AI-driven e-commerce platform"
+    help = (
+        "Seed initial data for SmartShop AI-driven e-commerce platform. "
+        "With --products/--users (etc.) generate a synthetic dataset of that size instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, help='Synthetic products to generate')
+        parser.add_argument('--users', type=int, help='Synthetic users to generate')
+        parser.add_argument('--interactions', type=int, default=0, help='User interactions to generate')
+        parser.add_argument('--reviews-per-product', type=int, default=0,
+                            help='Average reviews per product (skewed towards popular products)')
+        parser.add_argument('--orders', type=int, default=0, help='Orders to generate (1-4 items each)')
+        parser.add_argument('--chat-messages', type=int, default=0, help='Chatbot messages to generate')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; same seed, same dataset')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
 
     def handle(self, *args, **kwargs):
+        if any(kwargs[name] for name in GENERATOR_OPTIONS):
+            return self.generate(kwargs)
+
         self.stdout.write(self.style.SUCCESS("🌱 Seeding SmartShop data started..."))
 
         # =========================================================
@@ -575,3 +596,37 @@ class Command(BaseCommand):
                 )
 
         self.stdout.write(self.style.SUCCESS("✅ SmartShop data seeding completed successfully!"))
+
+    def generate(self, options):
+        if not options['products'] or not options['users']:
+            raise CommandError("Synthetic mode needs both --products and --users")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🌱 Generating synthetic data (seed {options['seed']}): "
+            + ", ".join(f"{name}={options[name]}" for name in GENERATOR_OPTIONS)
+        ))
+        generator = SyntheticDataGenerator(
+            products=options['products'],
+            users=options['users'],
+            interactions=options['interactions'],
+            reviews_per_product=options['reviews_per_product'],
+            orders=options['orders'],
+            chat_messages=options['chat_messages'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        started = time.monotonic()
+        try:
+            created = generator.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Synthetic data generated in {time.monotonic() - started:.1f}s: "
+            + ", ".join(f"{count} {name}" for name, count in created.items())
+        ))
+        self.stdout.write(
+            "Rows were bulk inserted, so no AI jobs were queued; product pages queue "
+            "descriptions and review summaries on first view."
+        )
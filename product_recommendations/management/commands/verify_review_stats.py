@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from product_recommendations.services.review_stats import rebuild_review_stats, verify_review_stats
+
+
+class Command(BaseCommand):
+    help = "Check the per-product review stats against the reviews table and optionally repair drifted rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', default=[],
+                            help='Only check this product id (repeatable)')
+        parser.add_argument('--fix', action='store_true', help='Recompute the rows that differ')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products per aggregate query')
+
+    def handle(self, *args, **kwargs):
+        mismatches = verify_review_stats(kwargs['product'] or None, batch_size=kwargs['batch_size'])
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Review stats are consistent"))
+            return
+
+        for product_id, diff in mismatches:
+            fields = ", ".join(f"{field} {stored} != {actual}" for field, (stored, actual) in sorted(diff.items()))
+            self.stdout.write(self.style.WARNING(f"Product {product_id}: {fields}"))
+
+        if kwargs['fix']:
+            rebuild_review_stats([product_id for product_id, _ in mismatches], batch_size=kwargs['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Repaired review stats for {len(mismatches)} products"))
+            return
+        raise CommandError(f"{len(mismatches)} products have inconsistent review stats (run with --fix)")
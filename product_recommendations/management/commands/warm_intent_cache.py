@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from product_recommendations.models import ChatMessage
+from product_recommendations.services.query_intent_cache import get_intent_cache, normalize_query
+from product_recommendations.services.smart_search_service import _parse_query_with_ai
+
+
+class Command(BaseCommand):
+    help = "Pre-warm the parsed query intent cache from chat message history (most frequent first)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='Maximum number of distinct queries to warm')
+        parser.add_argument('--min-count', type=int, default=1, help='Only warm queries asked at least this many times')
+
+    def handle(self, *args, **kwargs):
+        limit = kwargs['limit']
+        min_count = kwargs['min_count']
+        intent_cache = get_intent_cache()
+
+        rows = (
+            ChatMessage.objects
+            .values('message')
+            .annotate(n=Count('id'))
+            .filter(n__gte=min_count)
+            .order_by('-n')
+        )
+
+        seen = set()
+        warmed = skipped = failed = 0
+        for row in rows.iterator():
+            if len(seen) >= limit:
+                break
+            query = normalize_query(row['message'])
+            if not query or query in seen:
+                continue
+            seen.add(query)
+
+            if intent_cache.contains(query):
+                skipped += 1
+                continue
+
+            if _parse_query_with_ai(query) is None:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"  Could not parse: {query!r}"))
+            else:
+                warmed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. warmed={warmed} already_cached={skipped} failed={failed}"
+        ))
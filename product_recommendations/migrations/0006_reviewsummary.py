@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_recommendations', '0005_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summary', models.TextField(blank=True)),
+                ('pros', models.JSONField(blank=True, default=list)),
+                ('cons', models.JSONField(blank=True, default=list)),
+                ('sentiment', models.CharField(blank=True, max_length=20)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('average_rating', models.FloatField(blank=True, null=True)),
+                ('last_review_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='review_summary', to='product_recommendations.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Review summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,144 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:52
+
+from django.db import migrations
+from django.db.models import Avg, Count, Max
+
+
+# Parsers for the cached summary text, copied from review_summary_service as
+# of this migration so later changes to the service cannot alter it.
+
+def sentiment_from_rating(avg):
+    if avg is None:
+        return None
+    if avg >= 4.0:
+        return "Positive"
+    if avg <= 2.5:
+        return "Negative"
+    return "Neutral"
+
+
+def extract_sentiment(text, average_rating=None):
+    for line in text.splitlines():
+        if line.strip().lower().startswith("sentiment:"):
+            val = line.split(":", 1)[1].strip()
+            if val:
+                return val.capitalize()
+
+    if average_rating is not None:
+        return sentiment_from_rating(average_rating)
+
+    lowered = text.lower()
+
+    positive_words = ["great", "recommend", "effective", "excellent", "love", "good", "satisfied", "amazing", "best", "ideal"]
+    negative_words = ["not impressed", "underwhelming", "dislike", "poor", "terrible", "bad", "disappointed", "worse", "didn't", "dont", "did not", "snap"]
+
+    pos = sum(lowered.count(w) for w in positive_words)
+    neg = sum(lowered.count(w) for w in negative_words)
+
+    if pos > neg and pos > 0:
+        return "Positive"
+    if neg > pos and neg > 0:
+        return "Negative"
+    if "average" in lowered or "okay" in lowered or "decent" in lowered or "mixed" in lowered:
+        return "Neutral"
+    return "Unknown"
+
+
+def extract_bullets(text, section):
+    bullets = []
+    capture = False
+
+    for line in text.splitlines():
+        if section in line:
+            capture = True
+            continue
+        if capture:
+            if line.strip().startswith("-"):
+                bullets.append(line.strip("- ").strip())
+            elif line.strip() == "":
+                continue
+            else:
+                break
+
+    return bullets
+
+
+def extract_summary_only(text):
+    summary_lines = []
+
+    capture = False
+    for line in text.splitlines():
+        if line.strip().startswith("Summary:"):
+            capture = True
+            first = line.replace("Summary:", "").strip()
+            if first:
+                summary_lines.append(first)
+            continue
+
+        if capture:
+            if line.strip().startswith(("Pros:", "Cons:", "Sentiment:")):
+                break
+            if line.strip():
+                summary_lines.append(line.strip())
+
+    return " ".join(summary_lines)
+
+
+def _summary_text(content):
+    # Heuristic fallback summaries were cached as plain text, not in the
+    # "Summary: / Pros: / Cons:" layout
+    if "Summary:" not in content:
+        return content.strip()
+    return extract_summary_only(content)
+
+
+def copy_cached_summaries(apps, schema_editor):
+    Review = apps.get_model("product_recommendations", "Review")
+    ReviewSummary = apps.get_model("product_recommendations", "ReviewSummary")
+
+    stats = {
+        row["product_id"]: row
+        for row in Review.objects.values("product_id").annotate(
+            count=Count("id"), avg_rating=Avg("rating"), last_id=Max("id")
+        )
+    }
+
+    cached = (
+        Review.objects
+        .filter(ai_summary_cache__isnull=False, last_summarized_at__isnull=False)
+        .exclude(ai_summary_cache="")
+        .order_by("product_id", "id")
+        .values_list("product_id", "ai_summary_cache", "sentiment_label")
+    )
+
+    rows = []
+    seen = set()
+    for product_id, content, sentiment_label in cached.iterator(chunk_size=2000):
+        if product_id in seen:
+            continue
+        seen.add(product_id)
+        product_stats = stats[product_id]
+        avg = product_stats["avg_rating"]
+        rows.append(ReviewSummary(
+            product_id=product_id,
+            summary=_summary_text(content),
+            pros=extract_bullets(content, "Pros"),
+            cons=extract_bullets(content, "Cons"),
+            sentiment=sentiment_label or extract_sentiment(content, average_rating=avg) or sentiment_from_rating(avg) or "",
+            review_count=product_stats["count"],
+            average_rating=avg,
+            last_review_id=product_stats["last_id"],
+        ))
+
+    ReviewSummary.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_recommendations', '0006_reviewsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_cached_summaries, migrations.RunPython.noop),
+    ]
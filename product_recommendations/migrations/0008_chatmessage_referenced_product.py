@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_recommendations', '0007_backfill_reviewsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='referenced_product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chat_mentions', to='product_recommendations.product'),
+        ),
+    ]
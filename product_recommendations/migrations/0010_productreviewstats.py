@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_recommendations', '0009_chatmessage_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductReviewStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='product_recommendations.product')),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+                ('sentiment_positive', models.IntegerField(default=0)),
+                ('sentiment_neutral', models.IntegerField(default=0)),
+                ('sentiment_negative', models.IntegerField(default=0)),
+                ('sentiment_unlabeled', models.IntegerField(default=0)),
+                ('last_review_id', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Product review stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'created_at'], name='review_product_created_idx'),
+        ),
+    ]
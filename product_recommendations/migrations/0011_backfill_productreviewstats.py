@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:07
+
+from django.db import migrations
+from django.db.models import Count, Max, Q, Sum
+
+
+SENTIMENTS = ("positive", "neutral", "negative")
+
+
+def backfill_review_stats(apps, schema_editor):
+    Review = apps.get_model("product_recommendations", "Review")
+    ProductReviewStats = apps.get_model("product_recommendations", "ProductReviewStats")
+
+    aggregates = {"review_count": Count("id"), "rating_sum": Sum("rating"), "last_review_id": Max("id")}
+    for stars in range(1, 6):
+        aggregates[f"rating_{stars}"] = Count("id", filter=Q(rating=stars))
+    for label in SENTIMENTS:
+        aggregates[f"sentiment_{label}"] = Count("id", filter=Q(sentiment_label__iexact=label))
+
+    rows = []
+    for row in Review.objects.order_by().values("product_id").annotate(**aggregates).iterator(chunk_size=2000):
+        row["rating_sum"] = row["rating_sum"] or 0
+        row["sentiment_unlabeled"] = row["review_count"] - sum(row[f"sentiment_{label}"] for label in SENTIMENTS)
+        rows.append(ProductReviewStats(**row))
+
+    ProductReviewStats.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_recommendations', '0010_productreviewstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    CatalogueVersion = apps.get_model("product_recommendations", "CatalogueVersion")
+    CatalogueVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_recommendations', '0012_product_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:05
+
+from django.db import migrations
+
+
+COLUMNS = "name, brand, base_description, use_case, material, category"
+KEYWORD_COLUMNS = ("name", "brand", "base_description", "use_case", "category")
+
+SOURCE = (
+    "SELECT p.id, p.name, COALESCE(p.brand, ''), p.base_description, COALESCE(p.use_case, ''), "
+    "COALESCE(p.material, ''), c.name FROM product_recommendations_product p "
+    "JOIN product_recommendations_category c ON c.id = p.category_id WHERE p.is_active"
+)
+
+SQLITE_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS product_search_fts USING fts5("
+    f"{COLUMNS}, tokenize = 'unicode61 remove_diacritics 2')"
+)
+SQLITE_FILL = f"INSERT INTO product_search_fts (rowid, {COLUMNS}) {SOURCE}"
+
+MYSQL_FULLTEXT = ", ".join(
+    [f"FULLTEXT KEY ft_keywords ({', '.join(KEYWORD_COLUMNS)})", f"FULLTEXT KEY ft_full_query ({COLUMNS})"]
+    + [f"FULLTEXT KEY ft_{column} ({column})" for column in KEYWORD_COLUMNS]
+)
+MYSQL_CREATE = (
+    "CREATE TABLE IF NOT EXISTS product_search_document ("
+    "product_id BIGINT NOT NULL PRIMARY KEY, name VARCHAR(200) NOT NULL, "
+    "brand VARCHAR(100) NOT NULL, base_description LONGTEXT NOT NULL, use_case VARCHAR(255) NOT NULL, "
+    f"material VARCHAR(255) NOT NULL, category VARCHAR(100) NOT NULL, {MYSQL_FULLTEXT}"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+)
+MYSQL_FILL = f"INSERT INTO product_search_document (product_id, {COLUMNS}) {SOURCE}"
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_FILL)
+    elif vendor == "mysql":
+        schema_editor.execute(MYSQL_CREATE)
+        schema_editor.execute(MYSQL_FILL)
+
+
+def drop_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS product_search_fts")
+    elif vendor == "mysql":
+        schema_editor.execute("DROP TABLE IF EXISTS product_search_document")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product_recommendations", "0013_catalogueversion"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_recommendations', '0014_product_search_fulltext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='product_recommendations.product')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product_recommendations.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarproduct',
+            constraint=models.UniqueConstraint(fields=('product', 'rank'), name='similar_product_rank_uniq'),
+        ),
+    ]
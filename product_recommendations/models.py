@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 
 # -----------------------------
@@ -83,6 +84,14 @@ class Product(models.Model):
     # Product image
     image_url = models.URLField(blank=True, null=True)
 
+    class Meta:
+        # Keyset pages of the product_list API (WHERE ... AND id > cursor ORDER BY id)
+        indexes = [
+            models.Index(fields=["is_active", "id"], name="product_active_id_idx"),
+            models.Index(fields=["category", "is_active", "id"], name="product_category_active_id_idx"),
+            models.Index(fields=["is_active", "price", "id"], name="product_active_price_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -217,10 +226,128 @@ class Review(models.Model):
         null=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "created_at"], name="review_product_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.rating}★"
 
 
+class ReviewSummary(models.Model):
+    """
+    AI summary of a product's reviews, one row per product.
+    ``last_review_id`` is the newest review covered by the summary.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="review_summary"
+    )
+
+    summary = models.TextField(blank=True)
+    pros = models.JSONField(default=list, blank=True)
+    cons = models.JSONField(default=list, blank=True)
+    sentiment = models.CharField(max_length=20, blank=True)
+
+    review_count = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(blank=True, null=True)
+    last_review_id = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Review summaries"
+
+    def __str__(self):
+        return f"Summary for product {self.product_id} ({self.review_count} reviews)"
+
+
+class ProductReviewStats(models.Model):
+    """
+    Running review aggregates of a product, one row per product.  Kept up to
+    date with ``F()`` increments by the review signal handlers (see
+    ``services.review_stats``); a missing row means no reviews.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="review_stats"
+    )
+
+    # Signed on purpose: a drifted row must never make a review delete fail
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+
+    # Reviews by stored sentiment_label
+    sentiment_positive = models.IntegerField(default=0)
+    sentiment_neutral = models.IntegerField(default=0)
+    sentiment_negative = models.IntegerField(default=0)
+    sentiment_unlabeled = models.IntegerField(default=0)
+
+    # Highest review id ever counted (ids are never reused)
+    last_review_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Product review stats"
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.review_count if self.review_count > 0 else None
+
+    @property
+    def histogram(self):
+        return {stars: getattr(self, f"rating_{stars}") for stars in range(1, 6)}
+
+    @property
+    def sentiment_distribution(self):
+        return {
+            "positive": self.sentiment_positive,
+            "neutral": self.sentiment_neutral,
+            "negative": self.sentiment_negative,
+            "unlabeled": self.sentiment_unlabeled,
+        }
+
+    def __str__(self):
+        return f"Review stats for product {self.product_id} ({self.review_count} reviews)"
+
+
+class SimilarProduct(models.Model):
+    """
+    Precomputed content-based neighbour of a product: one row per
+    (product, rank), written by the ``build_similar_products`` job (see
+    ``services.similar_products``).  The detail page reads a product's
+    neighbours with one query on the (product, rank) index.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="similar_links"
+    )
+    similar = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()   # 0 = most similar
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="similar_product_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} ~ {self.similar_id} (#{self.rank}, {self.score:.3f})"
+
+
 # -----------------------------
 #   ChatMessage Model
 # -----------------------------
@@ -229,7 +356,91 @@ class ChatMessage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
     response = models.TextField(blank=True)
+    # Product the reply was about; follow-up questions resolve to it
+    referenced_product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        related_name="chat_mentions",
+        blank=True,
+        null=True,
+    )
+    # Set when the turn happens; rows are written later in batches
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"], name="chat_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.message[:30]}"
+
+# -----------------------------
+#   Catalogue Version Model
+# -----------------------------
+
+class CatalogueVersion(models.Model):
+    """
+    Single row whose ``generation`` is bumped, inside the writing
+    transaction, whenever products, categories or reviews change.  HTTP
+    validators (ETag / Last-Modified) are derived from it.
+    """
+    generation = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Catalogue generation {self.generation}"
+
+
+# -----------------------------
+#   Background Job Model
+# -----------------------------
+
+class BackgroundJob(models.Model):
+    """
+    A unit of deferred work (e.g. AI description or review-summary generation)
+    executed by the ``run_jobs`` worker command.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    task = models.CharField(max_length=50)
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="jobs",
+        blank=True,
+        null=True
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+
+    run_after = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_status_run_after_idx"),
+            models.Index(fields=["task", "product", "status"], name="job_task_product_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.user.username}: {self.message[:30]}"
\ No newline at end of file
+        return f"{self.task} #{self.pk} ({self.status})"
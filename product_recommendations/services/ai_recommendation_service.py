@@ -1,13 +1,15 @@
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
 import re
+from django.conf import settings
+from django.db.models import QuerySet
 from product_recommendations.models import Product
 from product_recommendations.models import UserProfile
+from product_recommendations.services.collaborative_filtering import get_cf_model
+from product_recommendations.services.llm_gateway import get_llm_client
 
-load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def _get_openai_client():
+    return get_llm_client("recommendations")
+
 
 def personalize_score(base_score, product, user_profile):
     score = base_score
@@ -38,17 +40,20 @@ def personalize_score(base_score, product, user_profile):
     return round(score, 2)
 
 
-def generate_recommendations_for_user(user, interactions):
+def _ask_llm_for_ranking(interactions, product_names):
+    """Ask the LLM to rank ``product_names`` for a user.
+    Returns the ranked names, or None when the API call fails."""
     interaction_summary = []
 
+    if isinstance(interactions, QuerySet):
+        # Avoid one product query per interaction
+        interactions = interactions.select_related("product").only("interaction_type", "product__name")
+
     for interaction in interactions:
         interaction_summary.append(
             f"{interaction.interaction_type} -> {interaction.product.name}"
         )
 
-    products = Product.objects.filter(is_active=True)
-    product_names = [p.name for p in products]
-
     prompt = f"""
 You are a product recommendation engine.
 
@@ -62,9 +67,12 @@ Recommend a ranked list of products the user is most likely to purchase.
 Return only a comma-separated list of product names.
 """
 
+    client = _get_openai_client()
+    if client is None:
+        return None
+
     try:
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an AI recommendation engine."},
                 {"role": "user", "content": prompt}
@@ -73,7 +81,7 @@ Return only a comma-separated list of product names.
         )
     except Exception as e:
         print("OpenAI API error:", e)
-        return Product.objects.none()
+        return None
 
     # Safely extract content from the chat response
     content = ""
@@ -81,27 +89,19 @@ Return only a comma-separated list of product names.
         content = response.choices[0].message.content
 
     # Split by comma and strip numbering like '1.' or '1)'
-    recommended_names = [
+    return [
         re.sub(r'^\s*\d+[\.|\)]\s*', '', name).strip()
         for name in content.split(",")
         if name.strip()
     ]
 
-    # Fetch user profile
-    user_profile = UserProfile.objects.filter(user=user).first()
-
-    # Preserve AI ordering by mapping name -> rank
-    ai_rank = {name: idx for idx, name in enumerate(recommended_names)}
-
-    recommended_products = (
-        products
-        .filter(name__in=recommended_names)
-    )
 
+def _personalize_ranking(ranked_products, user_profile):
+    """Apply personalize_score on top of (product, rank) pairs (rank -> base score)."""
     scored_products = []
 
-    for product in recommended_products:
-        base_score = 1.0 - (ai_rank.get(product.name, 0) * 0.05)
+    for product, rank in ranked_products:
+        base_score = 1.0 - (rank * 0.05)
 
         final_score = personalize_score(
             base_score=base_score,
@@ -113,9 +113,85 @@ Return only a comma-separated list of product names.
 
     # Sort by personalized score
     scored_products.sort(key=lambda x: x[1], reverse=True)
+    return scored_products
 
-    # Return ordered products (you may also return scores if needed)
-    return [p[0] for p in scored_products]
 
+def _generate_with_llm(user, interactions, user_profile):
+    """LLM engine: rank the whole active catalogue. None when the API fails."""
+    products = Product.objects.filter(is_active=True).select_related("category")
+    recommended_names = _ask_llm_for_ranking(interactions, [p.name for p in products])
+    if recommended_names is None:
+        return None
+
+    # Preserve AI ordering by mapping name -> rank
+    ai_rank = {name: idx for idx, name in enumerate(recommended_names)}
+    recommended_products = [
+        (product, ai_rank.get(product.name, 0))
+        for product in products.filter(name__in=recommended_names)
+    ]
+    return _personalize_ranking(recommended_products, user_profile)
 
 
+def _generate_with_cf(user, interactions, user_profile):
+    """Collaborative-filtering engine (local, no network), optionally re-ranked by the LLM."""
+    limit = getattr(settings, "RECOMMENDATION_LIMIT", 10)
+    candidates = get_cf_model().recommend(user.id, n=limit)
+
+    by_id = Product.objects.filter(is_active=True).select_related("category").in_bulk(
+        [item for item, _ in candidates]
+    )
+    ranked = [(by_id[item], score) for item, score in candidates if item in by_id]
+    if not ranked:
+        return []
+
+    if getattr(settings, "RECOMMENDATION_LLM_RERANK", False):
+        recommended_names = _ask_llm_for_ranking(interactions, [p.name for p, _ in ranked])
+        if recommended_names:
+            llm_rank = {name: idx for idx, name in enumerate(recommended_names)}
+            reranked = [(p, llm_rank.get(p.name, len(llm_rank))) for p, _ in ranked]
+            return _personalize_ranking(reranked, user_profile)
+
+    # Normalise CF scores to (0, 1] so personalisation bonuses keep their weight
+    top = ranked[0][1] or 1.0
+    scored_products = [
+        (
+            product,
+            personalize_score(
+                base_score=max(score / top, 0.0),
+                product=product,
+                user_profile=user_profile
+            )
+        )
+        for product, score in ranked
+    ]
+    scored_products.sort(key=lambda x: x[1], reverse=True)
+    return scored_products
+
+
+def generate_recommendations_for_user(user, interactions, with_scores=False):
+    """
+    Produce a personalised, ranked product list for the user.
+
+    The engine is chosen by settings.RECOMMENDATION_ENGINE:
+    - "collaborative": local item-item collaborative filtering (optionally
+      re-ranked by the LLM when RECOMMENDATION_LLM_RERANK is set)
+    - "llm": the LLM ranks the whole catalogue; falls back to collaborative
+      filtering when the API is unavailable
+
+    Returns products ordered by final score, or (product, score) pairs when
+    with_scores is True.
+    """
+    # Fetch user profile
+    user_profile = UserProfile.objects.filter(user=user).first()
+
+    scored_products = None
+    if getattr(settings, "RECOMMENDATION_ENGINE", "llm") == "llm":
+        scored_products = _generate_with_llm(user, interactions, user_profile)
+    if scored_products is None:
+        scored_products = _generate_with_cf(user, interactions, user_profile)
+
+    if with_scores:
+        return scored_products
+
+    # Return ordered products
+    return [p[0] for p in scored_products]
@@ -0,0 +1,305 @@
+"""
+In-memory autocomplete over product names, brands, categories and the known
+search phrases of ``smart_search_service``.
+
+``autocomplete_search`` used to run two ``icontains`` queries per keystroke
+and return matches in arbitrary order.  Suggestions now come from a sorted
+array of word-start keys (every suffix of a suggestion that begins at a word
+boundary), so a prefix lookup is two binary searches:
+
+- suggestions whose text starts with the query rank first, then those with a
+  word starting with it, then (for queries of 3+ characters) those containing
+  it mid-word
+- within a tier, suggestions are ordered by popularity: weighted user
+  interactions plus units ordered, summed per brand/category/phrase
+- top-k lists for all short prefixes (the busiest, widest ranges) are
+  precomputed at build time; longer prefixes are memoized in an LRU
+
+The index is rebuilt after a catalogue change to one of ``SUGGESTION_FIELDS``
+(see ``signals``) and every ``REFRESH_SECONDS`` so popularity stays fresh.
+Only the very first build runs inline; later rebuilds run in a background
+thread while every request keeps answering from the previous snapshot.
+Configured via ``settings.AUTOCOMPLETE``.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, IntegerField, Sum, When
+
+from product_recommendations.services.caching import TTLLRUCache
+
+
+DEFAULTS = {
+    "TOP_K": 10,
+    "MIN_QUERY_LENGTH": 2,
+    "INFIX_MIN_LENGTH": 3,     # shorter queries only match at word starts
+    "PRECOMPUTE_DEPTH": 3,     # prefixes up to this length get precomputed top-k lists
+    "CACHE_ENTRIES": 4096,     # memoized results for longer queries
+    "REFRESH_SECONDS": 300,    # popularity is re-read at most this often
+    "MAX_AGE": 60,             # Cache-Control max-age of responses (seconds)
+}
+
+# Popularity points per interaction type; every ordered unit counts as a purchase
+INTERACTION_WEIGHTS = {"view": 1, "click": 2, "add_to_cart": 3, "like": 3, "purchase": 5}
+ORDERED_UNIT_WEIGHT = 5
+
+# Product fields suggestions are built from; saves touching none of them
+# leave the index alone
+SUGGESTION_FIELDS = frozenset({"name", "brand", "category", "category_id", "is_active"})
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+TIER_PREFIX, TIER_WORD, TIER_INFIX = 0, 1, 2
+
+# Above every character a normalized key can contain
+_KEY_END = "\x7f"
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "AUTOCOMPLETE", {})}
+
+
+def normalize(text):
+    """Lowercase words joined by single spaces ("Wi-Fi  Plug" -> "wi fi plug")."""
+    return " ".join(WORD_RE.findall((text or "").lower()))
+
+
+class _Snapshot:
+    """Immutable suggestion tables built from one catalogue read."""
+
+    def __init__(self, entries, config):
+        self.config = config
+        # Global popularity order: rank 0 is the most popular suggestion
+        ordered = sorted(entries.items(), key=lambda item: (-item[1][1], item[0]))
+        self.norms = [norm for norm, _ in ordered]
+        self.texts = [text for _, (text, _) in ordered]
+
+        keys = []
+        self.vocab = defaultdict(list)   # word -> suggestion ids
+        for entry_id, norm in enumerate(self.norms):
+            for position, match in enumerate(WORD_RE.finditer(norm)):
+                keys.append((norm[match.start():], TIER_PREFIX if position == 0 else TIER_WORD, entry_id))
+                self.vocab[match.group()].append(entry_id)
+        keys.sort()
+        self.keys = [key for key, _, _ in keys]
+        self.key_tiers = [tier for _, tier, _ in keys]
+        self.key_entries = [entry_id for _, _, entry_id in keys]
+
+        self.top = {}
+        depth, min_length = config["PRECOMPUTE_DEPTH"], config["MIN_QUERY_LENGTH"]
+        prefixes = {key[:n] for key in self.keys for n in range(min_length, depth + 1) if len(key) >= n}
+        for prefix in prefixes:
+            self.top[prefix] = self._word_matches(prefix, config["TOP_K"])[0]
+
+        self.cache = TTLLRUCache(max_entries=config["CACHE_ENTRIES"])
+
+    def _word_matches(self, q, k):
+        """Top ``k`` ids matching ``q`` at the start of the text or a word,
+        plus the set of every id that matched."""
+        lo = bisect.bisect_left(self.keys, q)
+        hi = bisect.bisect_left(self.keys, q + _KEY_END, lo)
+        best = {}
+        for i in range(lo, hi):
+            entry_id, tier = self.key_entries[i], self.key_tiers[i]
+            if tier < best.get(entry_id, TIER_INFIX):
+                best[entry_id] = tier
+        # Suggestion ids are popularity ranks, so (tier, id) is the ranking
+        ranked = heapq.nsmallest(k, best.items(), key=lambda item: (item[1], item[0]))
+        return [entry_id for entry_id, _ in ranked], best
+
+    def _infix_matches(self, q, k, exclude):
+        first = q.split(" ", 1)[0]
+        candidates = set()
+        for word, entry_ids in self.vocab.items():
+            if first in word:
+                candidates.update(entry_ids)
+        return heapq.nsmallest(
+            k, (entry_id for entry_id in candidates if entry_id not in exclude and q in self.norms[entry_id])
+        )
+
+    def complete(self, q, k):
+        """Top ``k`` suggestion ids for normalized query ``q`` (k <= TOP_K)."""
+        short = len(q) < self.config["INFIX_MIN_LENGTH"]
+        top = self.top.get(q)
+        if top is not None and (short or len(top) >= k):
+            return top[:k]
+
+        cached = self.cache.get((q, k))
+        if cached is not None:
+            return cached
+        ids, matched = self._word_matches(q, k)
+        if len(ids) < k and not short:
+            ids += self._infix_matches(q, k - len(ids), matched)
+        self.cache.set((q, k), ids)
+        return ids
+
+
+def _popularity():
+    """product_id -> popularity points from interactions and order lines."""
+    from product_recommendations.models import OrderItem, UserInteraction
+
+    points = defaultdict(float)
+    weight = Case(
+        *[When(interaction_type=kind, then=value) for kind, value in INTERACTION_WEIGHTS.items()],
+        default=0,
+        output_field=IntegerField(),
+    )
+    interactions = (
+        UserInteraction.objects.order_by().values("product_id")
+        .annotate(points=Sum(weight)).values_list("product_id", "points")
+    )
+    for product_id, value in interactions:
+        points[product_id] += value or 0
+    units = (
+        OrderItem.objects.order_by().values("product_id")
+        .annotate(units=Sum("quantity")).values_list("product_id", "units")
+    )
+    for product_id, value in units:
+        points[product_id] += (value or 0) * ORDERED_UNIT_WEIGHT
+    return points
+
+
+def load_suggestions():
+    """
+    Read the catalogue and return {normalized text: (display text, weight)}
+    for product names, brands, category names and known phrases.
+    """
+    from product_recommendations.models import Category, Product
+    from product_recommendations.services.smart_search_service import KNOWN_PHRASES
+
+    points = _popularity()
+    entries = {}
+    brand_weight = defaultdict(float)
+    brand_text = {}
+    category_weight = defaultdict(float)
+    phrase_weight = dict.fromkeys(KNOWN_PHRASES, 1.0)
+
+    def add(text, weight):
+        norm = normalize(text)
+        if norm and (norm not in entries or entries[norm][1] < weight):
+            entries[norm] = (text, weight)
+
+    rows = Product.objects.filter(is_active=True).values_list("id", "name", "brand", "category_id")
+    for product_id, name, brand, category_id in rows.iterator(chunk_size=2000):
+        weight = 1.0 + points.get(product_id, 0)
+        add(name, weight)
+        if brand:
+            brand_weight[normalize(brand)] += weight
+            brand_text.setdefault(normalize(brand), brand)
+        category_weight[category_id] += weight
+        lowered = (name or "").lower()
+        for phrase in KNOWN_PHRASES:
+            if phrase in lowered:
+                phrase_weight[phrase] += weight
+
+    for norm, weight in brand_weight.items():
+        add(brand_text[norm], weight)
+    for category_id, name in Category.objects.values_list("id", "name"):
+        add(name, 1.0 + category_weight.get(category_id, 0))
+    for phrase, weight in phrase_weight.items():
+        add(phrase, weight)
+    return entries
+
+
+class AutocompleteIndex:
+    def __init__(self, config=None):
+        self._config = config
+        self._snapshot = None
+        self._stale = True
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return self._config or _config()
+
+    def build(self, entries):
+        """Replace the suggestions with ``{normalized: (text, weight)}``."""
+        snapshot = _Snapshot(entries, self.config)
+        self._snapshot = snapshot
+        self._stale = False
+        self._built_at = time.monotonic()
+        return snapshot
+
+    def rebuild(self):
+        self._stale = False   # changes made while reading mark it stale again
+        return self.build(load_suggestions())
+
+    def mark_stale(self):
+        """Rebuild on next use (called on catalogue changes)."""
+        self._stale = True
+
+    def invalidate(self):
+        """Drop the index entirely; the next lookup rebuilds it before answering."""
+        with self._lock:
+            self._snapshot = None
+            self._stale = True
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self.rebuild()
+                return self._snapshot
+
+        expired = time.monotonic() - self._built_at >= self.config["REFRESH_SECONDS"]
+        if (self._stale or expired) and self._lock.acquire(blocking=False):
+            # Released by the rebuild thread; requests keep serving this snapshot
+            try:
+                self._submit(self._background_rebuild)
+            except Exception:
+                self._lock.release()
+                raise
+        return snapshot
+
+    def _submit(self, fn):
+        threading.Thread(target=fn, name="autocomplete-rebuild", daemon=True).start()
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            # Keep the old snapshot; retry after the next REFRESH_SECONDS
+            self._built_at = time.monotonic()
+            print("Autocomplete rebuild error:", e)
+        finally:
+            self._lock.release()
+            close_old_connections()
+
+    def suggest(self, query, limit=None):
+        """Ranked suggestion texts for ``query`` (empty below MIN_QUERY_LENGTH)."""
+        config = self.config
+        q = normalize(query)
+        if len(q) < config["MIN_QUERY_LENGTH"]:
+            return []
+        snapshot = self._current()
+        k = min(limit, config["TOP_K"]) if limit else config["TOP_K"]
+        return [snapshot.texts[entry_id] for entry_id in snapshot.complete(q, k)]
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"built": False}
+        return {
+            "built": True,
+            "suggestions": len(snapshot.texts),
+            "keys": len(snapshot.keys),
+            "precomputed_prefixes": len(snapshot.top),
+            "cache": snapshot.cache.stats(),
+        }
+
+
+_index = AutocompleteIndex()
+
+
+def get_autocomplete_index():
+    """Return the process-wide autocomplete index."""
+    return _index
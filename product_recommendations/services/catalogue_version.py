@@ -0,0 +1,174 @@
+"""
+Global catalogue generation number and the HTTP validators derived from it.
+
+Catalogue pages and APIs only change when a product, category or review is
+written, a few times a day.  Every such write bumps
+``CatalogueVersion.generation`` with an ``UPDATE ... SET generation =
+generation + 1`` in the writer's own transaction (see ``signals``), so a
+rolled-back write never invalidates anything.  Once the transaction commits
+the new value is pushed to the cache.
+
+Views wrapped in ``django.views.decorators.http.condition`` with the
+functions below get ``ETag`` / ``Last-Modified`` headers, and a request
+whose ``If-None-Match`` still matches is answered with 304 from a single
+cache read: no SQL, no search, no AI parse.  Processes that do not share a
+cache backend notice a bump within ``CACHE_TTL`` seconds.  Configured via
+``settings.CATALOGUE_VERSION``.
+
+Process-local structures built from the catalogue (search index, semantic
+index, mention automaton) follow the generation with a ``CatalogueSync``, so
+writes made by other processes -- other workers, ``run_jobs``, management
+commands -- reach them as well.
+"""
+
+import hashlib
+import threading
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from product_recommendations.models import CatalogueVersion
+
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "CACHE_KEY": "smartshop:catalogue:v1:version",
+    "CACHE_TTL": 5,          # seconds before a process re-reads the row
+    "ETAG_PREFIX": "catalogue",
+}
+
+ROW_ID = 1
+
+# Product fields that views with catalogue validators render or search by
+# (product_list, products_page, smart search, autocomplete).  Saves whose
+# update_fields touch none of them, e.g. the background job writing
+# ai_description, keep the generation.
+CATALOGUE_FIELDS = frozenset({
+    "name", "category", "category_id", "description", "base_description", "price", "stock",
+    "is_active", "brand", "use_case", "material", "image_url",
+})
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "CATALOGUE_VERSION", {})}
+
+
+def _read_row():
+    row = CatalogueVersion.objects.filter(pk=ROW_ID).values_list("generation", "updated_at").first()
+    return row if row is not None else (0, None)
+
+
+def get_catalogue_version():
+    """(generation, updated_at) of the catalogue; usually one cache read."""
+    config = _config()
+    cache = caches[config["CACHE_ALIAS"]]
+    try:
+        version = cache.get(config["CACHE_KEY"])
+    except Exception:
+        version = None
+    if version is None:
+        version = _read_row()
+        try:
+            # add(), not set(): never overwrite a value pushed by a newer commit
+            cache.add(config["CACHE_KEY"], version, config["CACHE_TTL"])
+        except Exception:
+            pass
+    return version
+
+
+def _publish():
+    config = _config()
+    version = _read_row()
+    try:
+        caches[config["CACHE_ALIAS"]].set(config["CACHE_KEY"], version, config["CACHE_TTL"])
+    except Exception as e:
+        print("Catalogue version cache error:", e)
+    for sync in list(_syncs):
+        sync.advance(version[0])
+
+
+def bump_catalogue_version():
+    """Increment the generation as part of the current transaction."""
+    updated = CatalogueVersion.objects.filter(pk=ROW_ID).update(
+        generation=F("generation") + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogueVersion.objects.get_or_create(pk=ROW_ID, defaults={"generation": 1})
+    transaction.on_commit(_publish)
+
+
+# -----------------------------
+#   Process-local followers
+# -----------------------------
+
+_syncs = weakref.WeakSet()
+
+
+class CatalogueSync:
+    """
+    The catalogue generation a process-local structure reflects.
+
+    This process's own writes reach such structures through the signal
+    handlers, so committing one moves every follower from generation G-1 to
+    G.  Any other difference from ``get_catalogue_version()`` means another
+    process wrote and the owner has to re-read the catalogue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation = None   # None: nothing built yet
+        _syncs.add(self)
+
+    def behind(self):
+        """The current generation if the structure must catch up, else None."""
+        generation = get_catalogue_version()[0]
+        return None if generation == self.generation else generation
+
+    def synced(self, generation):
+        """Record that the structure now reflects ``generation``."""
+        with self._lock:
+            self.generation = generation
+
+    def reset(self):
+        with self._lock:
+            self.generation = None
+
+    def advance(self, generation):
+        """A local write committed as ``generation``; a gap means a remote one."""
+        with self._lock:
+            if self.generation is not None and self.generation == generation - 1:
+                self.generation = generation
+
+
+# -----------------------------
+#   condition() callbacks
+# -----------------------------
+
+def generation_etag(generation):
+    """Unquoted ETag of a catalogue generation."""
+    return f"{_config()['ETAG_PREFIX']}-{generation}"
+
+
+def catalogue_etag(request, *args, **kwargs):
+    generation, _ = get_catalogue_version()
+    return generation_etag(generation)
+
+
+def catalogue_last_modified(request, *args, **kwargs):
+    return get_catalogue_version()[1]
+
+
+def personal_catalogue_etag(request, *args, **kwargs):
+    """
+    ETag for pages that also render the visitor (navbar, CSRF token).  The
+    session and CSRF cookies identify the visitor without a session lookup.
+    """
+    cookies = "|".join(
+        request.COOKIES.get(name, "") for name in (settings.SESSION_COOKIE_NAME, settings.CSRF_COOKIE_NAME)
+    )
+    visitor = hashlib.sha1(cookies.encode("utf-8")).hexdigest()[:16]
+    return f"{catalogue_etag(request)}-{visitor}"
@@ -0,0 +1,302 @@
+"""
+Chatbot turn resolution shared by the JSON (`chatbot_api`) and streaming
+(`chatbot_stream`) chat endpoints.
+
+`answer_chat_message` works out what the user is asking about (greeting,
+availability / review follow-up, product search) and builds the reply text;
+persisting the turn is left to the caller (``conversation.record_chat_turn``).
+"""
+
+from product_recommendations.models import ChatMessage, Product, ReviewSummary
+from product_recommendations.services.conversation import get_conversation_state
+from product_recommendations.services.llm_gateway import get_async_llm_client
+from product_recommendations.services.product_mentions import get_mention_index
+from product_recommendations.services.review_stats import get_review_stats
+from product_recommendations.services.smart_search_service import smart_search_products
+
+
+GREETINGS = ["hi", "hello", "hey", "good morning", "good afternoon"]
+AVAILABILITY_INTENTS = ["stock", "in stock", "available", "availability"]
+REVIEW_INTENTS = ["review", "reviews", "rating", "good", "bad", "feedback", "worth"]
+
+
+def _chat_turn(intent, reply, product=None, products=None, meta=None):
+    return {
+        "intent": intent,
+        "reply": reply,
+        "product": product,
+        "products": list(products or []),
+        "meta": meta or {"parsed": {}, "applied_filters": {}},
+    }
+
+
+def _product_from_last_reply(user):
+    """
+    Product the previous reply was about.  Comes from the cached conversation
+    state; when that has expired, from the last stored ChatMessage (its
+    product reference, or else the first product its text mentions).
+    """
+    state = get_conversation_state(user)
+    if state is not None:
+        product_id = state.get("product_id")
+        if product_id is None:
+            return None
+        # Review follow-ups read the stats row; it comes with the product
+        return Product.objects.select_related("review_stats").filter(pk=product_id, is_active=True).first()
+
+    last_message = (
+        ChatMessage.objects
+        .filter(user=user)
+        .select_related("referenced_product")
+        .order_by("-created_at")
+        .first()
+    )
+    if last_message is None:
+        return None
+
+    product = last_message.referenced_product
+    if product is not None:
+        return product if product.is_active else None
+
+    mentioned = get_mention_index().find_products(last_message.response)
+    if not mentioned:
+        return None
+    return Product.objects.filter(pk=mentioned[0], is_active=True).first()
+
+
+def answer_chat_message(user, user_message):
+    """
+    Resolve one chat turn for ``user``.
+    Returns a dict with the intent ("greeting", "clarify", "availability",
+    "reviews", "search" or "no_results"), the reply text, the referenced
+    product (if any), the matched products and the smart search metadata.
+    """
+    msg = user_message.lower().strip()
+    
+    # Check for follow-up intents (availability or reviews)
+    is_followup = any(k in msg for k in (AVAILABILITY_INTENTS + REVIEW_INTENTS))
+
+    # Check last message for product context if follow-up
+    last_product = _product_from_last_reply(user) if is_followup else None
+
+    # Greeting intent
+    if msg in GREETINGS:
+        reply = (
+            f"Hi {user.first_name or user.username}! 👋 "
+            "How can I help you today?"
+        )
+        return _chat_turn("greeting", reply)
+    
+    # ---- Primary: smart search for products ----
+    products = []
+    meta = {"parsed": {}, "applied_filters": {}}
+    
+    if not is_followup or not last_product:     
+        # Use smart search with metadata to get parsed filters and price info
+        products, meta = smart_search_products(user_message, user=user, return_metadata=True)
+    
+        # Prefer exact keyword matches for concrete product nouns
+        if products:
+            tokens = [w for w in msg.split() if w not in ["i", "need", "want", "a", "an", "the"]]
+
+            explicit_matches = [
+                p for p in products
+                if any(token in p.name.lower() for token in tokens)
+            ]            
+            if explicit_matches:
+                products = explicit_matches    
+    
+        products = list(products)[:1] # IMPORTANT: only 1 product for clarity
+
+    product = last_product if (is_followup and last_product) else (products[0] if products else None)   
+            
+    
+    # If no products found, try to reference last chat message for context
+    if not product and not is_followup:
+        product = _product_from_last_reply(user)
+    
+    if not product and len(products) > 1 and any(k in msg for k in AVAILABILITY_INTENTS + REVIEW_INTENTS):
+        reply = (
+            "I found a few matching products. "
+            "Could you tell me which one you're referring to?"
+        )
+        return _chat_turn("clarify", reply, product=product, products=products, meta=meta)
+
+     
+    # Handle availability requests  
+    if product and any(k in msg for k in AVAILABILITY_INTENTS):
+        if product.stock > 0:
+            reply = f"Yes, **{product.name}** is currently in stock."
+        else:
+            reply = f"Sorry, **{product.name}** is currently out of stock."
+
+        return _chat_turn("availability", reply, product=product, products=products, meta=meta)
+         
+
+    # Handle review-related questions
+    if product and any(k in msg for k in REVIEW_INTENTS):
+        stats = get_review_stats(product)
+        total_reviews = stats.review_count if stats is not None else 0
+        avg_rating = stats.average_rating if stats is not None else None
+
+        if not total_reviews:
+            reply = f"There are no customer reviews yet for **{product.name}**."
+        else:
+            # Use the stored AI summary if available
+            summary = ReviewSummary.objects.filter(product=product).first()
+
+            if summary is not None and summary.summary:
+                reply = (
+                    f"Here’s what customers say about **{product.name}**:\n\n"
+                    f"**AI Summary:** {summary.summary}\n\n"
+                    f"**Overall Sentiment:** {summary.sentiment or 'Unknown'}\n"
+                    f"**Average Rating:** {avg_rating:.1f}/5 "
+                    f"from {total_reviews} reviews"
+                )
+            else:
+                # Fallback: no AI summary yet, but reviews exist
+                reply = (
+                    f"**{product.name}** has {total_reviews} reviews "
+                    f"with an average rating of {avg_rating:.1f}/5.\n\n"
+                    "Detailed AI summaries will be available soon."
+                )
+
+        return _chat_turn("reviews", reply, product=product, products=products, meta=meta)
+  
+
+    # Build reply based on search results
+    if products:
+        max_price = meta.get('parsed', {}).get('max_price')
+        price_relaxed = meta.get('applied_filters', {}).get('price_relaxed', False)
+        
+        # Build product list with pricing info
+        product_lines = []
+        for p in products:
+            line = p.name
+            price = float(p.price)
+            line += f" (${price:.2f})"
+            
+            # Add price-relative warning based on how much it exceeds budget
+            if max_price and price > max_price:
+                overage_pct = ((price - max_price) / max_price) * 100
+                if overage_pct <= 10:
+                    indicator = "⚠️ slightly above"
+                elif overage_pct <= 25:
+                    indicator = "⚠️ moderately above"
+                else:
+                    indicator = "⚠️ well above"
+                line += f" {indicator} your ${max_price:.0f} budget"
+            
+            product_lines.append(line)
+        
+        reply = "Here's what I found for you: " + ", ".join(product_lines)
+        
+        # Add note if price constraint was relaxed
+        if price_relaxed and max_price:
+            reply += f"\n(Note: No items strictly under ${max_price:.0f} found, showing alternatives)"
+    else:
+        parsed = meta.get("parsed", {}) or {}
+        category = parsed.get("mapped_category") or parsed.get("category")
+        keywords = parsed.get("keywords", [])
+
+        reply = "I don't currently have a matching item in the SmartShop catalogue."
+
+        if category:
+            reply += f" I detected a request related to **{category}**."
+
+            category_exists = Product.objects.filter(
+                is_active=True,
+                category__name__icontains=category
+            ).exists()
+
+            if category_exists:
+                reply += (
+                    f" While I don't have that specific item, you can browse other products "
+                    f"available under **{category}**."
+                )
+            else:
+                reply += f" At the moment, there are no products listed under **{category}**."
+
+        if keywords:
+            reply += f" (Keywords detected: {', '.join(keywords)}.)"
+
+        reply += " You can browse **All Products** or try a more specific search."
+
+    intent = "search" if products else "no_results"
+    return _chat_turn(intent, reply, product=product, products=products, meta=meta)
+
+
+# -----------------------------
+#   Streaming replies
+# -----------------------------
+
+def _get_async_openai_client():
+    return get_async_llm_client("chat")
+
+
+def chunk_reply(reply, size=3):
+    """Split a ready-made reply into small word groups for incremental display."""
+    words = reply.split(" ")
+    for i in range(0, len(words), size):
+        chunk = " ".join(words[i:i + size])
+        yield chunk if i + size >= len(words) else chunk + " "
+
+
+def _product_reply_prompt(user_message, turn):
+    lines = [
+        f"- {p.name} (${float(p.price):.2f}), {'in stock' if p.stock > 0 else 'out of stock'}"
+        for p in turn["products"]
+    ]
+    parsed = turn["meta"].get("parsed") or {}
+    return f"""
+You are a helpful shopping assistant for SmartShop.
+
+User query:
+{user_message}
+
+Detected budget: {parsed.get("max_price") or "none"}
+
+Matching products:
+{chr(10).join(lines)}
+
+Draft answer (facts you must keep, including any budget warnings):
+{turn["reply"]}
+
+Respond concisely and helpfully in 1-3 sentences.
+Always write each product name exactly as given, in bold (e.g. **Product Name**).
+"""
+
+
+async def stream_chat_reply(user_message, turn):
+    """
+    Yield the reply for a resolved turn as incremental text chunks.
+    Search results are phrased by a streamed completion when the API is
+    available; every other intent (and any API failure before the first
+    token) streams the deterministic reply.
+    """
+    client = _get_async_openai_client() if turn["intent"] == "search" else None
+    if client is not None:
+        sent_any = False
+        try:
+            stream = await client.chat.completions.create(
+                messages=[
+                    {"role": "system", "content": "You are a helpful shopping assistant."},
+                    {"role": "user", "content": _product_reply_prompt(user_message, turn)},
+                ],
+                temperature=0.4,
+                stream=True,
+            )
+            async for event in stream:
+                delta = event.choices[0].delta.content if event.choices else None
+                if delta:
+                    sent_any = True
+                    yield delta
+            if sent_any:
+                return
+        except Exception as e:
+            print("OpenAI streaming error:", e)
+            if sent_any:
+                return
+
+    for chunk in chunk_reply(turn["reply"]):
+        yield chunk
@@ -0,0 +1,461 @@
+"""
+Local item-item collaborative-filtering recommender.
+
+Implicit feedback from ``UserInteraction`` (weighted by interaction type) and
+``OrderItem`` (weighted as purchases) forms a sparse user x item matrix R.
+The model keeps, as NumPy CSR arrays:
+
+- R itself (rows sorted by user id, columns by item index)
+- the item-item co-occurrence matrix C = R^T R, whose diagonal holds the
+  squared item norms
+- the cosine similarity matrix S, sim(i, j) = C[i, j] / sqrt(C[i, i] * C[j, j])
+  with the diagonal dropped, and the popularity ranking (items by norm)
+
+New rows are folded in by id watermark: only the rows of users with new
+events change, so C is updated by subtracting their old outer products
+r_u^T r_u and adding the new ones.  S and the popularity ranking are
+derived at refresh time, so ``recommend`` is one gather over S's rows plus
+a ``bincount``.  Refreshes build new arrays and swap them in at once;
+readers never take a lock.
+
+The model is persisted as a compressed ``.npz`` file
+(settings.RECOMMENDATION_CF_MODEL_PATH) and needs no network access.
+In-process models are topped up in a background thread at most every
+RECOMMENDATION_CF_REFRESH_SECONDS, while requests keep using the previous
+arrays.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+from product_recommendations.models import OrderItem, UserInteraction
+
+
+# Implicit feedback weights: purchase > add_to_cart > like > click > view
+INTERACTION_WEIGHTS = {
+    "purchase": 5.0,
+    "add_to_cart": 3.0,
+    "like": 2.0,
+    "click": 1.0,
+    "view": 0.5,
+}
+ORDER_ITEM_WEIGHT = INTERACTION_WEIGHTS["purchase"]
+
+# Co-occurrence entries this close to zero after a subtraction are dropped
+_EPSILON = 1e-9
+
+_EMPTY_IDS = np.empty(0, dtype=np.int64)
+_EMPTY_VALUES = np.empty(0, dtype=np.float64)
+
+
+class CSRMatrix(namedtuple("CSRMatrix", "indptr indices data")):
+    """Compressed sparse rows: row i is ``indices/data[indptr[i]:indptr[i + 1]]``."""
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, n_rows, drop_zeros=False):
+        """Build from (row, col, value) triplets, summing duplicates."""
+        if len(rows):
+            order = np.lexsort((cols, rows))
+            rows, cols, values = rows[order], cols[order], values[order]
+            first = np.ones(len(rows), dtype=bool)
+            first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            starts = np.flatnonzero(first)
+            rows, cols, values = rows[starts], cols[starts], np.add.reduceat(values, starts)
+            if drop_zeros:
+                keep = np.abs(values) > _EPSILON
+                rows, cols, values = rows[keep], cols[keep], values[keep]
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+        return cls(indptr, cols.astype(np.int64), values.astype(np.float64))
+
+    @property
+    def n_rows(self):
+        return len(self.indptr) - 1
+
+    def row_ids(self):
+        """Row index of every stored entry."""
+        return np.repeat(np.arange(self.n_rows), np.diff(self.indptr))
+
+    def row(self, i):
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def rows(self, row_indices):
+        """(position in ``row_indices``, column, value) of every entry of those rows."""
+        starts, ends = self.indptr[row_indices], self.indptr[row_indices + 1]
+        lengths = ends - starts
+        owner = np.repeat(np.arange(len(row_indices)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + offsets
+        return owner, self.indices[positions], self.data[positions]
+
+    def get(self, i, j):
+        cols, values = self.row(i)
+        k = np.searchsorted(cols, j)
+        return float(values[k]) if k < len(cols) and cols[k] == j else 0.0
+
+
+def _empty_csr(n_rows=0):
+    return CSRMatrix(np.zeros(n_rows + 1, dtype=np.int64), _EMPTY_IDS, _EMPTY_VALUES)
+
+
+def _outer_products(owners, items, weights):
+    """
+    Entries of sum_u r_u^T r_u for the rows given as (owner, item, weight)
+    triplets sorted by owner: every ordered pair of one owner's items.
+    """
+    if not len(owners):
+        return _EMPTY_IDS, _EMPTY_IDS, _EMPTY_VALUES
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    counts = np.diff(np.r_[starts, len(owners)])
+    group_size = np.repeat(counts, counts)                # per entry
+    left = np.repeat(np.arange(len(owners)), group_size)
+    first_of_group = np.repeat(np.repeat(starts, counts), group_size)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(group_size) - group_size, group_size)
+    right = first_of_group + offsets
+    return items[left], items[right], weights[left] * weights[right]
+
+
+# User rows, co-occurrence and derived arrays of one model version
+_State = namedtuple(
+    "_State",
+    "item_ids user_ids ratings purchased co similarity norms popular",
+)
+
+
+def _derive(item_ids, user_ids, ratings, purchased, co):
+    """Similarity matrix, norms and popularity ranking from the co-occurrence matrix."""
+    rows = co.row_ids()
+    diagonal = rows == co.indices
+    norms = np.zeros(len(item_ids), dtype=np.float64)
+    norms[rows[diagonal]] = co.data[diagonal]
+
+    off = ~diagonal
+    rows, cols, values = rows[off], co.indices[off], co.data[off]
+    denom = np.sqrt(norms[rows] * norms[cols])
+    values = np.divide(values, denom, out=np.zeros_like(values), where=denom > 0)
+    similarity = CSRMatrix.from_coo(rows, cols, values, len(item_ids))
+
+    # Most popular first (total implicit feedback), ties by item id
+    popular = np.lexsort((item_ids, -norms))
+    popular = popular[norms[popular] > 0]
+    return _State(item_ids, user_ids, ratings, purchased, co, similarity, norms, popular)
+
+
+def _empty_state():
+    return _derive(_EMPTY_IDS, _EMPTY_IDS, _empty_csr(), _empty_csr(), _empty_csr())
+
+
+def _index_of(ids, values):
+    """Positions of ``values`` in the sorted array ``ids`` (-1 when absent)."""
+    values = np.asarray(values, dtype=np.int64)
+    positions = np.searchsorted(ids, values)
+    found = positions < len(ids)
+    found[found] = ids[positions[found]] == values[found]
+    return np.where(found, positions, -1)
+
+
+class ItemItemModel:
+    def __init__(self):
+        self._state = _empty_state()
+        self.last_interaction_id = 0
+        self.last_order_item_id = 0
+        self._lock = threading.RLock()   # serializes writers only
+
+    @property
+    def user_count(self):
+        return len(self._state.user_ids)
+
+    @property
+    def item_count(self):
+        return len(self._state.item_ids)
+
+    # ------------------------------------------------------------------
+    # Incremental training
+    # ------------------------------------------------------------------
+
+    def add_events(self, users, items, weights, purchased):
+        """Fold in events given as parallel sequences of user id, item id, weight and purchase flag."""
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        purchased = np.asarray(purchased, dtype=bool)
+        with self._lock:
+            if len(users):
+                self._state = self._apply(self._state, users, items, weights, purchased)
+
+    @staticmethod
+    def _apply(state, users, items, weights, purchased):
+        item_ids = np.union1d(state.item_ids, items)
+        user_ids = np.union1d(state.user_ids, users)
+        remap_items = np.searchsorted(item_ids, state.item_ids)
+        remap_users = np.searchsorted(user_ids, state.user_ids)
+
+        # Old R and purchases in the new index spaces
+        old_rows = remap_users[state.ratings.row_ids()]
+        old_cols = remap_items[state.ratings.indices]
+        rows = np.searchsorted(user_ids, users)
+        cols = np.searchsorted(item_ids, items)
+        ratings = CSRMatrix.from_coo(
+            np.r_[old_rows, rows], np.r_[old_cols, cols], np.r_[state.ratings.data, weights], len(user_ids)
+        )
+        purchased_csr = CSRMatrix.from_coo(
+            np.r_[remap_users[state.purchased.row_ids()], rows[purchased]],
+            np.r_[remap_items[state.purchased.indices], cols[purchased]],
+            np.ones(len(state.purchased.data) + int(purchased.sum())),
+            len(user_ids),
+        )
+        purchased_csr = purchased_csr._replace(data=np.ones_like(purchased_csr.data))
+
+        # C += sum over changed users of (new r_u^T r_u - old r_u^T r_u)
+        changed = np.unique(rows)
+        changed_old = np.flatnonzero(np.isin(old_rows, changed))
+        minus_a, minus_b, minus_v = _outer_products(
+            old_rows[changed_old], old_cols[changed_old], state.ratings.data[changed_old]
+        )
+        owner, plus_items, plus_weights = ratings.rows(changed)
+        plus_a, plus_b, plus_v = _outer_products(owner, plus_items, plus_weights)
+
+        co_rows = remap_items[state.co.row_ids()]
+        co = CSRMatrix.from_coo(
+            np.r_[co_rows, minus_a, plus_a],
+            np.r_[remap_items[state.co.indices], minus_b, plus_b],
+            np.r_[state.co.data, -minus_v, plus_v],
+            len(item_ids),
+            drop_zeros=True,
+        )
+        return _derive(item_ids, user_ids, ratings, purchased_csr, co)
+
+    def update_from_db(self):
+        """Fold in interactions and order items newer than the watermarks.
+        Returns the number of events applied."""
+        with self._lock:
+            return self._update_from_db()
+
+    def _update_from_db(self):
+        last_interaction_id, last_order_item_id = self.last_interaction_id, self.last_order_item_id
+        users, items, weights, purchased = [], [], [], []
+
+        rows = (
+            UserInteraction.objects
+            .filter(id__gt=last_interaction_id)
+            .order_by("id")
+            .values_list("id", "user_id", "product_id", "interaction_type")
+        )
+        for row_id, user_id, product_id, interaction_type in rows.iterator(chunk_size=5000):
+            weight = INTERACTION_WEIGHTS.get(interaction_type, 0.0)
+            if weight:
+                users.append(user_id)
+                items.append(product_id)
+                weights.append(weight)
+                purchased.append(interaction_type == "purchase")
+            last_interaction_id = row_id
+
+        rows = (
+            OrderItem.objects
+            .filter(id__gt=last_order_item_id)
+            .order_by("id")
+            .values_list("id", "order__user_id", "product_id", "quantity")
+        )
+        for row_id, user_id, product_id, quantity in rows.iterator(chunk_size=5000):
+            users.append(user_id)
+            items.append(product_id)
+            weights.append(ORDER_ITEM_WEIGHT * max(quantity, 1))
+            purchased.append(True)
+            last_order_item_id = row_id
+
+        self.add_events(users, items, weights, purchased)
+        self.last_interaction_id, self.last_order_item_id = last_interaction_id, last_order_item_id
+        return len(users)
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def similarity(self, a, b):
+        state = self._state
+        i, j = _index_of(state.item_ids, [a, b])
+        return state.similarity.get(i, j) if i >= 0 and j >= 0 else 0.0
+
+    def popularity(self, n, exclude=()):
+        """Most popular items by total implicit feedback (cold start)."""
+        state = self._state
+        popular = state.popular
+        if len(exclude):
+            excluded = _index_of(state.item_ids, list(exclude))
+            popular = popular[~np.isin(popular, excluded)]
+        popular = popular[:n]
+        return list(zip(state.item_ids[popular].tolist(), np.sqrt(state.norms[popular]).tolist()))
+
+    def recommend(self, user_id, n=10, exclude=None):
+        """
+        Top-n (item_id, score) pairs for ``user_id``, scored as
+        sum_j R[u, j] * sim(j, item).  Falls back to popularity when the user
+        has no usable history.
+        """
+        state = self._state
+        excluded = []
+        user = _index_of(state.user_ids, [user_id])[0]
+        if user >= 0:
+            history, ratings = state.ratings.row(user)
+            excluded.extend(state.item_ids[state.purchased.row(user)[0]].tolist())
+        else:
+            history, ratings = _EMPTY_IDS, _EMPTY_VALUES
+        excluded.extend(exclude or ())
+
+        owner, cols, sims = state.similarity.rows(history)
+        scores = np.bincount(cols, weights=sims * ratings[owner], minlength=len(state.item_ids))
+        excluded_rows = _index_of(state.item_ids, excluded)
+        scores[excluded_rows[excluded_rows >= 0]] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        candidates = candidates[np.lexsort((state.item_ids[candidates], -scores[candidates]))][:n]
+        ranked = list(zip(state.item_ids[candidates].tolist(), scores[candidates].tolist()))
+
+        if len(ranked) < n:
+            seen = {item for item, _ in ranked} | set(excluded)
+            ranked += [(item, 0.0) for item, _ in self.popularity(n - len(ranked), exclude=seen)]
+        return ranked
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        with self._lock:
+            state = self._state
+            watermarks = [self.last_interaction_id, self.last_order_item_id]
+        os.makedirs(os.path.dirname(os.fspath(path)) or ".", exist_ok=True)
+        tmp_path = f"{os.fspath(path)}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            item_ids=state.item_ids,
+            user_ids=state.user_ids,
+            ratings_indptr=state.ratings.indptr,
+            ratings_indices=state.ratings.indices,
+            ratings_data=state.ratings.data.astype(np.float32),
+            purchased_indptr=state.purchased.indptr,
+            purchased_indices=state.purchased.indices,
+            co_indptr=state.co.indptr,
+            co_indices=state.co.indices,
+            co_data=state.co.data,
+            watermarks=np.asarray(watermarks, dtype=np.int64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        model = cls()
+        with np.load(path) as data:
+            if "co_indptr" in data:
+                purchased = data["purchased_indices"]
+                model._state = _derive(
+                    data["item_ids"],
+                    data["user_ids"],
+                    CSRMatrix(data["ratings_indptr"], data["ratings_indices"],
+                              data["ratings_data"].astype(np.float64)),
+                    CSRMatrix(data["purchased_indptr"], purchased, np.ones(len(purchased))),
+                    CSRMatrix(data["co_indptr"], data["co_indices"], data["co_data"]),
+                )
+            else:
+                # Files written by the dict-based model: replay the stored ratings
+                users, items = data["user_u"], data["user_i"]
+                bought = set(zip(data["purchased_u"].tolist(), data["purchased_i"].tolist()))
+                flags = [pair in bought for pair in zip(users.tolist(), items.tolist())]
+                model.add_events(users, items, data["user_r"], flags)
+            model.last_interaction_id, model.last_order_item_id = data["watermarks"].tolist()
+        return model
+
+
+_model = None
+_model_refreshed_at = 0.0
+_model_refreshing = False
+_model_lock = threading.Lock()
+
+
+def _model_path():
+    return getattr(settings, "RECOMMENDATION_CF_MODEL_PATH", os.path.join(settings.BASE_DIR, "var", "cf_model.npz"))
+
+
+def _refresh(model):
+    global _model_refreshed_at, _model_refreshing
+    try:
+        model.update_from_db()
+    except Exception as e:
+        print("CF model refresh error:", e)
+    finally:
+        with _model_lock:
+            _model_refreshed_at = time.monotonic()
+            _model_refreshing = False
+        close_old_connections()
+
+
+def _submit_refresh(model):
+    threading.Thread(target=_refresh, args=(model,), name="cf-model-refresh", daemon=True).start()
+
+
+def get_cf_model(refresh=False):
+    """
+    Process-wide model: loaded from disk and topped up on first use, then
+    refreshed in a background thread at most every
+    RECOMMENDATION_CF_REFRESH_SECONDS (``refresh=True`` tops it up inline).
+    Requests keep using the current arrays while a refresh runs.
+    """
+    global _model, _model_refreshed_at, _model_refreshing
+    interval = getattr(settings, "RECOMMENDATION_CF_REFRESH_SECONDS", 60)
+    with _model_lock:
+        if _model is None:
+            path = _model_path()
+            try:
+                _model = ItemItemModel.load(path) if os.path.exists(path) else ItemItemModel()
+            except Exception as e:
+                print("CF model load error:", e)
+                _model = ItemItemModel()
+            _model.update_from_db()
+            _model_refreshed_at = time.monotonic()
+            return _model
+        model = _model
+        due = (
+            not refresh and not _model_refreshing
+            and time.monotonic() - _model_refreshed_at >= interval
+        )
+        if due:
+            _model_refreshing = True
+
+    if refresh:
+        model.update_from_db()
+        with _model_lock:
+            _model_refreshed_at = time.monotonic()
+    elif due:
+        _submit_refresh(model)
+    return model
+
+
+def build_cf_model(full=False):
+    """Update (or rebuild with full=True) the persisted model. Returns (model, events_applied)."""
+    global _model, _model_refreshed_at
+    path = _model_path()
+    if full or not os.path.exists(path):
+        model = ItemItemModel()
+    else:
+        model = ItemItemModel.load(path)
+    applied = model.update_from_db()
+    model.save(path)
+    with _model_lock:
+        _model = model
+        _model_refreshed_at = time.monotonic()
+    return model, applied
+
+
+def reset_cf_model():
+    """Forget the in-process model (it is reloaded on next use)."""
+    global _model, _model_refreshed_at, _model_refreshing
+    with _model_lock:
+        _model = None
+        _model_refreshed_at = 0.0
+        _model_refreshing = False
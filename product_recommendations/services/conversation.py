@@ -0,0 +1,232 @@
+"""
+Per-user chatbot conversation state and write-behind chat logging.
+
+Most chat turns are follow-ups ("is it in stock?") that only need to know
+what the previous reply was about.  After every turn the chat endpoints call
+``record_chat_turn``, which
+
+- stores the conversation state (last referenced product, intent, result
+  set and parsed query) in the cache under the user's id, so the next turn
+  resolves its context without reading ``ChatMessage``
+- queues the ``ChatMessage`` row in a process-wide buffer instead of
+  inserting it inline
+
+The buffer is written with one ``bulk_create`` when a request finishes and a
+batch is due (``LOG_BATCH_SIZE`` rows or ``LOG_FLUSH_INTERVAL`` seconds),
+i.e. after the response has been sent; a daemon thread per process writes
+messages that have waited ``LOG_FLUSH_INTERVAL`` on an otherwise idle
+worker, and the rest is written at interpreter exit.  A hard kill loses at
+most that interval's messages.
+
+Follow-ups of a conversation may be served by another worker process, so
+the state must live in a shared cache backend (``CACHE_ALIAS``, e.g. Redis
+via ``REDIS_URL``).  With a per-process LocMemCache, a follow-up routed
+elsewhere finds no state and answers without the earlier context.
+Configured via ``settings.CHAT_CONVERSATION``.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.utils import timezone
+
+from product_recommendations.models import ChatMessage
+
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "KEY_PREFIX": "smartshop:chat:v1:",
+    "STATE_TTL": 1800,           # seconds a conversation is remembered
+    "LOG_BATCH_SIZE": 50,        # chat messages per bulk insert
+    "LOG_FLUSH_INTERVAL": 5.0,   # seconds a message may wait for its batch
+    "LOG_MAX_BUFFER": 1000,      # buffered messages before writing inline
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "CHAT_CONVERSATION", {})}
+
+
+# -----------------------------
+#   Conversation state
+# -----------------------------
+
+def _state_key(user_id):
+    return f"{_config()['KEY_PREFIX']}{user_id}"
+
+
+def get_conversation_state(user):
+    """Last turn's state for ``user`` (dict) or None when unknown/expired."""
+    config = _config()
+    try:
+        return caches[config["CACHE_ALIAS"]].get(_state_key(user.pk))
+    except Exception:
+        return None
+
+
+def save_conversation_state(user, turn):
+    config = _config()
+    product = turn["product"] or (turn["products"][0] if turn["products"] else None)
+    state = {
+        "product_id": product.pk if product is not None else None,
+        "intent": turn["intent"],
+        "product_ids": [p.pk for p in turn["products"]],
+        "parsed": (turn["meta"] or {}).get("parsed"),
+    }
+    try:
+        caches[config["CACHE_ALIAS"]].set(_state_key(user.pk), state, config["STATE_TTL"])
+    except Exception as e:
+        print("Conversation state cache error:", e)
+    return state
+
+
+def clear_conversation_state(user):
+    try:
+        caches[_config()["CACHE_ALIAS"]].delete(_state_key(user.pk))
+    except Exception:
+        pass
+
+
+# -----------------------------
+#   Write-behind chat log
+# -----------------------------
+
+class ChatLogBuffer:
+    """Thread-safe buffer of unsaved ChatMessage rows."""
+
+    def __init__(self):
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher_pid = None
+        self.written = 0
+        self.failures = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, message):
+        self._ensure_flusher()
+        with self._lock:
+            self._pending.append(message)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._wake.set()
+            overflowing = len(self._pending) >= _config()["LOG_MAX_BUFFER"]
+        if overflowing:
+            self.flush()
+
+    def due(self):
+        config = _config()
+        with self._lock:
+            if not self._pending:
+                return False
+            return (
+                len(self._pending) >= config["LOG_BATCH_SIZE"]
+                or time.monotonic() - self._oldest >= config["LOG_FLUSH_INTERVAL"]
+            )
+
+    def flush(self):
+        """Write every buffered message. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._oldest = self._pending, [], None
+            if not batch:
+                return 0
+            try:
+                ChatMessage.objects.bulk_create(batch, batch_size=_config()["LOG_BATCH_SIZE"])
+            except Exception as e:
+                self.failures += 1
+                print(f"[chat-log] could not write {len(batch)} messages, will retry: {e}")
+                with self._lock:
+                    keep = _config()["LOG_MAX_BUFFER"] - len(self._pending)
+                    self._pending[:0] = batch[-keep:] if keep > 0 else []
+                    if self._pending and self._oldest is None:
+                        self._oldest = time.monotonic()
+                return 0
+            self.written += len(batch)
+            return len(batch)
+
+    def flush_overdue(self):
+        """
+        Flush when the oldest message has waited ``LOG_FLUSH_INTERVAL``.
+        Returns the seconds until the next check, None while the buffer is empty.
+        """
+        with self._lock:
+            oldest = self._oldest
+        if oldest is None:
+            return None
+        remaining = oldest + _config()["LOG_FLUSH_INTERVAL"] - time.monotonic()
+        if remaining > 0:
+            return remaining
+        self.flush()
+        close_old_connections()
+        return self.flush_overdue()
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork: every worker process starts its own
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+        threading.Thread(target=self._run_flusher, name="chat-log-flush", daemon=True).start()
+
+    def _run_flusher(self):
+        while True:
+            try:
+                delay = self.flush_overdue()
+            except Exception as e:
+                print(f"[chat-log] flush thread error: {e}")
+                delay = _config()["LOG_FLUSH_INTERVAL"]
+            if delay is None:
+                self._wake.wait()
+                self._wake.clear()
+            else:
+                time.sleep(delay)
+
+    def clear(self):
+        with self._lock:
+            self._pending, self._oldest = [], None
+
+
+_buffer = ChatLogBuffer()
+
+
+def get_chat_log():
+    """Return the process-wide chat log buffer."""
+    return _buffer
+
+
+def flush_chat_log():
+    return _buffer.flush()
+
+
+def flush_chat_log_if_due():
+    if _buffer.due():
+        _buffer.flush()
+
+
+atexit.register(flush_chat_log)
+
+
+def record_chat_turn(user, message, reply, turn):
+    """Remember the turn for follow-ups and queue its ChatMessage row."""
+    state = save_conversation_state(user, turn)
+    _buffer.add(ChatMessage(
+        user_id=user.pk,
+        message=message,
+        response=reply,
+        referenced_product_id=state["product_id"],
+        created_at=timezone.now(),
+    ))
+    return state
@@ -0,0 +1,358 @@
+"""
+Database full-text search backend for smart search.
+
+With ``settings.SMART_SEARCH_BACKEND = "fulltext"`` the fallback ladder of
+``smart_search_products`` is answered by the database instead of the
+process-local ``search_index``:
+
+- SQLite: an FTS5 virtual table ``product_search_fts`` (rowid = product id)
+  over name / brand / base_description / use_case / material / category,
+  ranked with ``bm25()`` using the field weights of ``search_scoring``
+- MySQL: a ``product_search_document`` table with FULLTEXT indexes, ranked
+  with a weighted sum of per-column ``MATCH ... AGAINST`` relevances
+
+``candidates()`` runs ONE statement that returns every keyword match
+together with its relevance and whether it passes the category and price
+filters, so all ladder steps are decided from that result instead of up to
+five separate scans.  Keywords match whole words or word prefixes
+("earbud" finds "earbuds") rather than arbitrary substrings; InnoDB also
+ignores words shorter than ``innodb_ft_min_token_size`` and stopwords.
+
+The tables are created by a migration on the vendors that support them, kept
+in sync by the Product/Category signal handlers and rebuilt with the
+``rebuild_search_index`` command (needed after ``bulk_create``).  On other
+databases no backend is available and smart search keeps using the
+in-memory index.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from product_recommendations.models import Category, Product
+from product_recommendations.services.search_index import tokenize
+from product_recommendations.services.search_scoring import FIELD_WEIGHTS, rank_order
+
+
+# Document columns, in table order.  The category column holds the category name.
+COLUMNS = ("name", "brand", "base_description", "use_case", "material", "category")
+
+# Columns searched by keyword filters / by the final full-query fallback
+KEYWORD_COLUMNS = ("name", "brand", "base_description", "use_case", "category")
+FULL_QUERY_COLUMNS = COLUMNS
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class Candidates:
+    """
+    Result of one ``candidates()`` query: product id -> (price, relevance,
+    in_category, in_price).  Sets for the ladder are derived from it.
+    """
+
+    def __init__(self, rows, has_keywords):
+        self.rows = {pid: (float(price), float(relevance or 0.0), bool(in_cat), bool(in_price))
+                     for pid, price, relevance, in_cat, in_price in rows}
+        self.has_keywords = has_keywords
+
+    def all_ids(self):
+        return set(self.rows)
+
+    def keyword_ids(self):
+        return set(self.rows) if self.has_keywords else None
+
+    def category_ids(self):
+        return {pid for pid, row in self.rows.items() if row[2]}
+
+    def price_ids(self):
+        return {pid for pid, row in self.rows.items() if row[3]}
+
+    def scores(self, ids, max_price=None):
+        """Relevance plus the smart-search price adjustment, aligned with ``ids``
+        (0 for ids this result does not hold)."""
+        rows = [self.rows.get(pid, (0.0, 0.0, False, False)) for pid in ids]
+        prices = np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows))
+        scores = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+        if max_price:
+            known = np.fromiter((pid in self.rows for pid in ids), dtype=bool, count=len(rows))
+            scores[known] += np.where(
+                prices[known] > max_price,
+                -(prices[known] - max_price) / (max_price + 1.0),
+                (max_price - prices[known]) / (max_price + 1.0) * 0.5,
+            )
+        return scores
+
+    def rank(self, ids, max_price=None, top_k=None):
+        """``ids`` by descending ``scores()``."""
+        ids = sorted(ids)
+        return [ids[i] for i in rank_order(self.scores(ids, max_price), top_k)]
+
+
+class FullTextBackend:
+    vendor = None
+    table = None
+    key = None        # document column holding the product id
+    like_sql = None   # category-name LIKE clause
+
+    def __init__(self):
+        self._ready = {}   # database name -> table exists
+
+    # -----------------------------
+    #   Schema
+    # -----------------------------
+
+    def create_schema(self, schema_editor):
+        raise NotImplementedError
+
+    def drop_schema(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {_quote(self.table)}")
+
+    def available(self):
+        """True when the current database has the full-text table."""
+        name = connection.settings_dict["NAME"]
+        ready = self._ready.get(name)
+        if ready is None:
+            ready = self._ready[name] = self.table in connection.introspection.table_names()
+        return ready
+
+    def reset(self):
+        self._ready = {}
+
+    # -----------------------------
+    #   Maintenance
+    # -----------------------------
+
+    def _source_sql(self, where):
+        """SELECT of (id, columns...) for active products matching ``where``."""
+        p, c = _quote(Product._meta.db_table), _quote(Category._meta.db_table)
+        return (
+            f"SELECT p.id, p.name, COALESCE(p.brand, ''), p.base_description, COALESCE(p.use_case, ''), "
+            f"COALESCE(p.material, ''), c.name FROM {p} p JOIN {c} c ON c.id = p.category_id "
+            f"WHERE p.is_active AND {where}"
+        )
+
+    def _delete(self, cursor, where, params):
+        raise NotImplementedError
+
+    def _insert(self, cursor, where, params):
+        raise NotImplementedError
+
+    def _refresh(self, delete_where, insert_where, params):
+        if not self.available():
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, delete_where, params)
+            self._insert(cursor, insert_where, params)
+
+    def rebuild(self):
+        """Re-index every active product. Returns the number of documents."""
+        with connection.cursor() as cursor:
+            self._delete(cursor, "1 = 1", [])
+            self._insert(cursor, "1 = 1", [])
+            cursor.execute(f"SELECT COUNT(*) FROM {_quote(self.table)}")
+            return cursor.fetchone()[0]
+
+    def index_products(self, product_ids):
+        """(Re)index products; inactive or missing ones end up unindexed."""
+        product_ids = list(product_ids)
+        if product_ids:
+            marks = ", ".join(["%s"] * len(product_ids))
+            self._refresh(f"{self.key} IN ({marks})", f"p.id IN ({marks})", product_ids)
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if product_ids and self.available():
+            marks = ", ".join(["%s"] * len(product_ids))
+            with connection.cursor() as cursor:
+                self._delete(cursor, f"{self.key} IN ({marks})", product_ids)
+
+    def index_category(self, category_id):
+        """Re-index the products of a category (after a rename)."""
+        p = _quote(Product._meta.db_table)
+        self._refresh(
+            f"{self.key} IN (SELECT id FROM {p} WHERE category_id = %s)", "p.category_id = %s", [category_id]
+        )
+
+    # -----------------------------
+    #   Queries
+    # -----------------------------
+
+    def _filter_columns(self, mapped_category, max_price):
+        sql, params = [], []
+        if mapped_category:
+            sql.append(self.like_sql)
+            params.append(_like_pattern(mapped_category))
+        else:
+            sql.append("0")
+        if max_price is not None:
+            sql.append("p.price <= %s")
+            params.append(max_price)
+        else:
+            sql.append("0")
+        return sql, params
+
+    def candidates(self, keywords, mapped_category=None, max_price=None):
+        """
+        One query over active products: keyword matches (all active products
+        when there are no keywords) with relevance and filter flags.
+        """
+        p, c = _quote(Product._meta.db_table), _quote(Category._meta.db_table)
+        (in_category, in_price), filter_params = self._filter_columns(mapped_category, max_price)
+        expression = self.match_expression(keywords, KEYWORD_COLUMNS)
+        if expression is None:
+            if keywords:
+                return Candidates([], has_keywords=True)
+            sql = (
+                f"SELECT p.id, p.price, 0, {in_category}, {in_price} "
+                f"FROM {p} p JOIN {c} c ON c.id = p.category_id WHERE p.is_active"
+            )
+            params = filter_params
+        else:
+            sql, params = self._match_sql(expression, in_category, in_price, filter_params)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return Candidates(cursor.fetchall(), has_keywords=bool(keywords))
+
+    def match_full_query(self, query):
+        """Active products containing the query as a phrase in any column."""
+        expression = self.match_expression([query], FULL_QUERY_COLUMNS)
+        if expression is None:
+            return Candidates([], has_keywords=True)
+        sql, params = self._match_sql(expression, "0", "0", [])
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return Candidates(cursor.fetchall(), has_keywords=True)
+
+    def category_names(self):
+        return list(Category.objects.order_by("id").values_list("name", flat=True))
+
+    def match_expression(self, keywords, columns):
+        raise NotImplementedError
+
+    def _match_sql(self, expression, in_category, in_price, filter_params):
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(FullTextBackend):
+    vendor = "sqlite"
+    table = "product_search_fts"
+    key = "rowid"
+    like_sql = "c.name LIKE %s ESCAPE '\\'"
+
+    def create_schema(self, schema_editor):
+        columns = ", ".join(COLUMNS)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            f"{columns}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def _delete(self, cursor, where, params):
+        cursor.execute(f"DELETE FROM {self.table} WHERE {where}", params)
+
+    def _insert(self, cursor, where, params):
+        cursor.execute(
+            f"INSERT INTO {self.table} (rowid, {', '.join(COLUMNS)}) {self._source_sql(where)}", params
+        )
+
+    def match_expression(self, keywords, columns):
+        terms = []
+        for kw in keywords or []:
+            tokens = tokenize(kw)
+            if tokens:
+                # Prefix match on the last token: "earbud" -> earbuds, "power ban" -> power bank
+                terms.append(f'"{" ".join(tokens)}"*')
+        if not terms:
+            return None
+        return "{%s} : (%s)" % (" ".join(columns), " OR ".join(dict.fromkeys(terms)))
+
+    def _match_sql(self, expression, in_category, in_price, filter_params):
+        p, c = _quote(Product._meta.db_table), _quote(Category._meta.db_table)
+        weights = ", ".join(str(FIELD_WEIGHTS.get(column, 0.0)) for column in COLUMNS)
+        sql = (
+            # bm25() is lower for better matches
+            f"SELECT p.id, p.price, -bm25({self.table}, {weights}), {in_category}, {in_price} FROM {self.table} "
+            f"JOIN {p} p ON p.id = {self.table}.rowid JOIN {c} c ON c.id = p.category_id "
+            f"WHERE {self.table} MATCH %s AND p.is_active"
+        )
+        return sql, filter_params + [expression]
+
+
+class MySQLFulltextBackend(FullTextBackend):
+    vendor = "mysql"
+    table = "product_search_document"
+    key = "product_id"
+    like_sql = "c.name LIKE %s"   # backslash is MySQL's default LIKE escape
+
+    def create_schema(self, schema_editor):
+        table = _quote(self.table)
+        fulltext = [
+            ("ft_keywords", KEYWORD_COLUMNS),
+            ("ft_full_query", FULL_QUERY_COLUMNS),
+        ] + [(f"ft_{column}", (column,)) for column in KEYWORD_COLUMNS]
+        indexes = ", ".join(f"FULLTEXT KEY {name} ({', '.join(cols)})" for name, cols in fulltext)
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f"product_id BIGINT NOT NULL PRIMARY KEY, name VARCHAR(200) NOT NULL, "
+            f"brand VARCHAR(100) NOT NULL, base_description LONGTEXT NOT NULL, use_case VARCHAR(255) NOT NULL, "
+            f"material VARCHAR(255) NOT NULL, category VARCHAR(100) NOT NULL, {indexes}"
+            f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        )
+
+    def _delete(self, cursor, where, params):
+        cursor.execute(f"DELETE FROM {_quote(self.table)} WHERE {where}", params)
+
+    def _insert(self, cursor, where, params):
+        cursor.execute(
+            f"INSERT INTO {_quote(self.table)} (product_id, {', '.join(COLUMNS)}) {self._source_sql(where)}", params
+        )
+
+    def match_expression(self, keywords, columns):
+        terms = []
+        for kw in keywords or []:
+            tokens = tokenize(kw)
+            if len(tokens) == 1:
+                terms.append(f"{tokens[0]}*")
+            elif tokens:
+                terms.append(f'"{" ".join(tokens)}"')
+        if not terms:
+            return None
+        return (columns, " ".join(dict.fromkeys(terms)))
+
+    def _match_sql(self, expression, in_category, in_price, filter_params):
+        columns, against = expression
+        p, c = _quote(Product._meta.db_table), _quote(Category._meta.db_table)
+        relevance = " + ".join(
+            f"{FIELD_WEIGHTS[column]} * MATCH(d.{column}) AGAINST (%s IN BOOLEAN MODE)" for column in KEYWORD_COLUMNS
+        )
+        sql = (
+            f"SELECT p.id, p.price, {relevance}, {in_category}, {in_price} FROM {_quote(self.table)} d "
+            f"JOIN {p} p ON p.id = d.product_id JOIN {c} c ON c.id = p.category_id "
+            f"WHERE MATCH({', '.join(f'd.{column}' for column in columns)}) AGAINST (%s IN BOOLEAN MODE) "
+            f"AND p.is_active"
+        )
+        return sql, [against] * len(KEYWORD_COLUMNS) + filter_params + [against]
+
+
+BACKENDS = {backend.vendor: backend for backend in (SQLiteFTS5Backend(), MySQLFulltextBackend())}
+
+
+def get_fulltext_backend():
+    """Full-text backend for the current database vendor, or None."""
+    return BACKENDS.get(connection.vendor)
+
+
+def fulltext_search_backend():
+    """The backend smart search should use, or None for the in-memory index."""
+    if getattr(settings, "SMART_SEARCH_BACKEND", "memory") != "fulltext":
+        return None
+    backend = get_fulltext_backend()
+    if backend is None or not backend.available():
+        return None
+    return backend
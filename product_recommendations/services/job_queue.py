@@ -0,0 +1,221 @@
+"""
+Lightweight database-backed job queue.
+
+Slow work (AI product descriptions and review summaries, similar-product
+refreshes) is recorded as ``BackgroundJob`` rows and executed by the
+``run_jobs`` management command, so request handlers never wait on an LLM
+completion or a catalogue-wide computation.  No broker is needed:
+workers poll the table and claim a job with a conditional UPDATE
+(``status=pending -> running``), which is atomic on every database backend,
+so several workers can share one queue.
+
+Failed jobs are retried with exponential backoff up to ``MAX_ATTEMPTS``;
+jobs left ``running`` by a crashed worker are released after
+``LEASE_SECONDS``.  Configured via ``settings.JOB_QUEUE``.
+"""
+
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from product_recommendations.models import BackgroundJob
+
+
+DEFAULTS = {
+    "MAX_ATTEMPTS": 3,
+    "RETRY_BACKOFF_SECONDS": 30,   # doubled after every failed attempt
+    "LEASE_SECONDS": 600,          # running jobs older than this are re-queued
+    "POLL_INTERVAL": 2.0,          # seconds between polls of an empty queue
+    "BATCH_SIZE": 10,
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "JOB_QUEUE", {})}
+
+
+# -----------------------------
+#   Tasks
+# -----------------------------
+
+def _generate_product_description(product):
+    from product_recommendations.services.product_description_service import (
+        get_or_generate_product_description
+    )
+
+    get_or_generate_product_description(product)
+
+
+def _generate_review_summary(product):
+    from product_recommendations.services.review_summary_service import refresh_review_summary
+
+    refresh_review_summary(product)
+
+
+def _refresh_similar_products(product):
+    from product_recommendations.services.similar_products import refresh_similar_products
+
+    # One refresh loads the whole catalogue's features, so it covers every
+    # queued change at once; the other pending refresh jobs are closed here
+    pending = BackgroundJob.objects.filter(task="similar_products", status=BackgroundJob.STATUS_PENDING)
+    queued = dict(pending.values_list("id", "product_id"))
+    pending.filter(id__in=list(queued)).update(status=BackgroundJob.STATUS_DONE, finished_at=timezone.now())
+    changed = {pid for pid in queued.values() if pid is not None}
+    if product is not None:
+        changed.add(product.pk)
+    refresh_similar_products(changed)
+
+
+# task name -> callable(product)
+TASKS = {
+    "product_description": _generate_product_description,
+    "review_summary": _generate_review_summary,
+    "similar_products": _refresh_similar_products,
+}
+
+
+# -----------------------------
+#   Producer side
+# -----------------------------
+
+def enqueue_job(task, product=None, delay=0):
+    """
+    Queue ``task`` for ``product`` unless an identical job is already pending.
+    Returns the (new or existing) pending job.
+    """
+    if task not in TASKS:
+        raise ValueError(f"Unknown job task: {task}")
+
+    product_id = getattr(product, "pk", product)
+    existing = (
+        BackgroundJob.objects
+        .filter(task=task, product_id=product_id, status=BackgroundJob.STATUS_PENDING)
+        .first()
+    )
+    if existing is not None:
+        return existing
+
+    return BackgroundJob.objects.create(
+        task=task,
+        product_id=product_id,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+# -----------------------------
+#   Worker side
+# -----------------------------
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def release_stale_jobs():
+    """Put jobs whose worker died mid-run back in the queue. Returns the count."""
+    lease = timedelta(seconds=_config()["LEASE_SECONDS"])
+    return (
+        BackgroundJob.objects
+        .filter(status=BackgroundJob.STATUS_RUNNING, started_at__lt=timezone.now() - lease)
+        .update(status=BackgroundJob.STATUS_PENDING, locked_by="")
+    )
+
+
+def claim_jobs(worker_id, limit):
+    """Atomically claim up to ``limit`` due jobs for ``worker_id``."""
+    now = timezone.now()
+    candidates = (
+        BackgroundJob.objects
+        .filter(status=BackgroundJob.STATUS_PENDING, run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:limit * 2]
+    )
+
+    claimed = []
+    for job_id in candidates:
+        won = (
+            BackgroundJob.objects
+            .filter(id=job_id, status=BackgroundJob.STATUS_PENDING)
+            .update(status=BackgroundJob.STATUS_RUNNING, locked_by=worker_id, started_at=now)
+        )
+        if won:
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+
+    return list(
+        BackgroundJob.objects
+        .filter(id__in=claimed)
+        .select_related("product", "product__category")
+        .order_by("run_after", "id")
+    )
+
+
+def run_job(job):
+    """Execute one claimed job and record the outcome. Returns True on success."""
+    config = _config()
+    job.attempts += 1
+    try:
+        TASKS[job.task](job.product)
+    except Exception as e:
+        job.last_error = f"{e}\n{traceback.format_exc()}"[-4000:]
+        job.locked_by = ""
+        if job.attempts < config["MAX_ATTEMPTS"]:
+            backoff = config["RETRY_BACKOFF_SECONDS"] * 2 ** (job.attempts - 1)
+            job.status = BackgroundJob.STATUS_PENDING
+            job.run_after = timezone.now() + timedelta(seconds=backoff)
+        else:
+            job.status = BackgroundJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        job.save(update_fields=["attempts", "last_error", "locked_by", "status", "run_after", "finished_at"])
+        print(f"[jobs] {job.task} #{job.pk} failed (attempt {job.attempts}): {e}")
+        return False
+
+    job.status = BackgroundJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["attempts", "status", "finished_at"])
+    return True
+
+
+def run_pending(worker_id=None, limit=None):
+    """
+    Drain due jobs once (no polling). Returns (succeeded, failed) counts.
+    ``limit`` caps the number of jobs processed.
+    """
+    config = _config()
+    worker_id = worker_id or default_worker_id()
+    succeeded = failed = 0
+
+    release_stale_jobs()
+    while limit is None or succeeded + failed < limit:
+        batch = config["BATCH_SIZE"]
+        if limit is not None:
+            batch = min(batch, limit - succeeded - failed)
+        jobs = claim_jobs(worker_id, batch)
+        if not jobs:
+            break
+        for job in jobs:
+            if run_job(job):
+                succeeded += 1
+            else:
+                failed += 1
+    return succeeded, failed
+
+
+def work_forever(worker_id=None, poll_interval=None, on_batch=None):
+    """Poll the queue until interrupted. ``on_batch(succeeded, failed)`` reports progress."""
+    poll_interval = poll_interval if poll_interval is not None else _config()["POLL_INTERVAL"]
+    worker_id = worker_id or default_worker_id()
+    while True:
+        close_old_connections()
+        succeeded, failed = run_pending(worker_id)
+        if succeeded or failed:
+            if on_batch:
+                on_batch(succeeded, failed)
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,509 @@
+"""
+Shared gateway for every chat-completion call made by SmartShop.
+
+Services used to build their own ``OpenAI(...)`` client (one at import time,
+the others on every call), throwing away HTTP keep-alive and TLS sessions.
+This module owns the clients instead:
+
+- one sync ``OpenAI`` client per process and one ``AsyncOpenAI`` client per
+  event loop, each over a pooled ``httpx`` transport with configurable
+  connection limits and timeouts
+- retries with exponential backoff (the SDK's ``max_retries``) on connection
+  errors, 408/409/429 and 5xx responses
+- per-call latency and token metrics, broken down by ``purpose``
+- an optional requests/tokens-per-minute limiter shared by all sync calls
+  (batch jobs such as regen_review_summaries)
+- a ``"stub"`` backend that answers locally so tests and benchmarks run
+  without the network
+
+Services ask for a client with ``get_llm_client(purpose)`` (or
+``get_async_llm_client``) and keep calling ``client.chat.completions.create``;
+``None`` means no backend is available and the caller should use its
+non-AI fallback.  Configured via ``settings.LLM_GATEWAY``.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+
+from django.conf import settings
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+try:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+except Exception:
+    OpenAI = AsyncOpenAI = DefaultHttpxClient = DefaultAsyncHttpxClient = None
+
+
+DEFAULTS = {
+    "BACKEND": "openai",            # "openai" | "stub"
+    "MODEL": "gpt-4o-mini",
+    "MAX_CONNECTIONS": 20,
+    "MAX_KEEPALIVE_CONNECTIONS": 10,
+    "KEEPALIVE_EXPIRY": 30.0,       # seconds
+    "CONNECT_TIMEOUT": 5.0,         # seconds
+    "TIMEOUT": 30.0,                # seconds, read/write/pool
+    "MAX_RETRIES": 2,
+    "REQUESTS_PER_MINUTE": None,    # None = unlimited
+    "TOKENS_PER_MINUTE": None,      # prompt + completion tokens, None = unlimited
+    "STUB_LATENCY_MS": 0,           # simulated round trip for the stub backend
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "LLM_GATEWAY", {})}
+
+
+# -----------------------------
+#   Metrics
+# -----------------------------
+
+class LLMMetrics:
+    """Thread-safe call counters, latency and token usage per purpose."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_purpose = {}
+
+    def record(self, purpose, latency_ms, usage=None, error=False):
+        with self._lock:
+            entry = self._by_purpose.setdefault(purpose, {
+                "calls": 0,
+                "errors": 0,
+                "latency_ms_total": 0.0,
+                "latency_ms_max": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+            })
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["latency_ms_total"] += latency_ms
+            entry["latency_ms_max"] = max(entry["latency_ms_max"], latency_ms)
+            if usage is not None:
+                entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                entry["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for purpose, entry in self._by_purpose.items():
+                result[purpose] = {
+                    **entry,
+                    "latency_ms_total": round(entry["latency_ms_total"], 1),
+                    "latency_ms_max": round(entry["latency_ms_max"], 1),
+                    "latency_ms_avg": round(entry["latency_ms_total"] / entry["calls"], 1),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._by_purpose = {}
+
+
+_metrics = LLMMetrics()
+
+
+def get_llm_metrics():
+    """Return the process-wide LLM call metrics."""
+    return _metrics
+
+
+# -----------------------------
+#   Rate limiting
+# -----------------------------
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests and tokens per minute.
+
+    ``acquire(estimated_tokens)`` blocks until one request and the estimated
+    tokens fit in both buckets; ``settle`` corrects the token bucket once the
+    real usage is known.  Buckets refill continuously and hold at most one
+    minute's allowance.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, clock=time.monotonic, sleep=time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = clock()
+
+    @property
+    def enabled(self):
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, estimated_tokens=0):
+        if not self.enabled:
+            return
+        if self.tokens_per_minute:
+            # A single oversized request may use at most a full minute's budget
+            estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill(self._clock())
+                wait = 0.0
+                if self.requests_per_minute and self._requests < 1:
+                    wait = (1 - self._requests) * 60 / self.requests_per_minute
+                if self.tokens_per_minute and self._tokens < estimated_tokens:
+                    wait = max(wait, (estimated_tokens - self._tokens) * 60 / self.tokens_per_minute)
+                if wait <= 0:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= estimated_tokens
+                    return
+            self._sleep(wait)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens -= actual_tokens - min(estimated_tokens, self.tokens_per_minute)
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Rough prompt + completion token estimate (~4 characters per token)."""
+    chars = sum(len(m.get("content") or "") for m in messages or [])
+    return chars // 4 + (max_tokens or 256)
+
+
+_limiter = None
+
+
+def get_rate_limiter():
+    """Process-wide limiter built from LLM_GATEWAY (see ``configure_rate_limit``)."""
+    global _limiter
+    if _limiter is None:
+        config = _config()
+        _limiter = RateLimiter(config["REQUESTS_PER_MINUTE"], config["TOKENS_PER_MINUTE"])
+    return _limiter
+
+
+def configure_rate_limit(requests_per_minute=None, tokens_per_minute=None):
+    """Replace the process-wide limit (e.g. from a batch command's options)."""
+    global _limiter
+    _limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    return _limiter
+
+
+# -----------------------------
+#   Metered client wrappers
+# -----------------------------
+
+class _MeteredCompletions:
+    def __init__(self, completions, purpose, model):
+        self._completions = completions
+        self._purpose = purpose
+        self._model = model
+
+    def create(self, **kwargs):
+        kwargs.setdefault("model", self._model)
+        limiter = get_rate_limiter()
+        estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+        limiter.acquire(estimated)
+        start = time.perf_counter()
+        try:
+            response = self._completions.create(**kwargs)
+        except Exception:
+            _metrics.record(self._purpose, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        usage = getattr(response, "usage", None)
+        _metrics.record(self._purpose, (time.perf_counter() - start) * 1000, usage)
+        limiter.settle(estimated, getattr(usage, "total_tokens", None))
+        return response
+
+
+class _AsyncMeteredCompletions(_MeteredCompletions):
+    async def create(self, **kwargs):
+        kwargs.setdefault("model", self._model)
+        if kwargs.get("stream"):
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        start = time.perf_counter()
+        try:
+            response = await self._completions.create(**kwargs)
+        except Exception:
+            _metrics.record(self._purpose, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        if kwargs.get("stream"):
+            return self._metered_stream(response, start)
+        _metrics.record(self._purpose, (time.perf_counter() - start) * 1000, getattr(response, "usage", None))
+        return response
+
+    async def _metered_stream(self, stream, start):
+        # Latency covers the whole stream; usage arrives on the final chunk
+        usage = None
+        error = False
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        except BaseException:
+            error = True
+            raise
+        finally:
+            _metrics.record(self._purpose, (time.perf_counter() - start) * 1000, usage, error=error)
+
+
+class _MeteredClient:
+    completions_class = _MeteredCompletions
+
+    def __init__(self, client, purpose, model):
+        self.raw = client
+        self.purpose = purpose
+        self.chat = SimpleNamespace(
+            completions=self.completions_class(client.chat.completions, purpose, model)
+        )
+
+
+class _AsyncMeteredClient(_MeteredClient):
+    completions_class = _AsyncMeteredCompletions
+
+
+# -----------------------------
+#   Stub backend
+# -----------------------------
+
+def _prompt_text(messages):
+    return "\n".join(m.get("content") or "" for m in messages or [] if m.get("role") != "system")
+
+
+def _section(prompt, header):
+    """Lines following ``header`` up to the next blank line."""
+    m = re.search(re.escape(header) + r"[^\n]*\n([\s\S]*?)(?:\n\s*\n|$)", prompt)
+    return m.group(1).strip() if m else ""
+
+
+def _stub_smart_search(prompt):
+    from product_recommendations.services.smart_search_service import _parse_query_fallback
+
+    m = re.search(r'User query:\s*"(.*)"', prompt)
+    parsed = _parse_query_fallback(m.group(1) if m else "")
+    return json.dumps({
+        "category": parsed.get("category") or "",
+        "max_price": parsed.get("max_price"),
+        "keywords": parsed.get("keywords") or [],
+    })
+
+
+def _stub_recommendations(prompt):
+    return _section(prompt, "Available products:")
+
+
+def _stub_product_description(prompt):
+    name = re.search(r"- Name:\s*(.*)", prompt)
+    base = re.search(r"- Base description:\s*(.*)", prompt)
+    text = (base.group(1).strip() if base else "") or f"{name.group(1).strip() if name else 'This product'} is available now."
+    return json.dumps({"description": text})
+
+
+def _stub_review_summary(prompt):
+    # Map prompts list the reviews; reduce prompts list partial summaries
+    parts = [line.strip().lstrip("- ") for line in _section(prompt, "Customer reviews:").splitlines()]
+    if not parts:
+        parts = [
+            _section(block, "Summary:")
+            for block in re.split(r"Partial summary \d+:", prompt)[1:]
+        ]
+    summary = " ".join(p for p in parts[:2] if p)[:300] or "Customers have shared a few thoughts on this product."
+    return f"Summary:\n{summary}\n\nPros:\n\nCons:\n\nSentiment:\n"
+
+
+def _stub_chat(prompt):
+    return _section(prompt, "Draft answer") or "Here is what I found."
+
+
+STUB_RESPONDERS = {
+    "smart_search": _stub_smart_search,
+    "recommendations": _stub_recommendations,
+    "product_description": _stub_product_description,
+    "review_summary": _stub_review_summary,
+    "chat": _stub_chat,
+}
+
+
+def _stub_usage(prompt, content):
+    prompt_tokens = len(prompt.split())
+    completion_tokens = len(content.split())
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+
+
+class StubCompletions:
+    """Deterministic local answers shaped like each purpose's real replies."""
+
+    def __init__(self, purpose, latency_ms=0):
+        self.purpose = purpose
+        self.latency_ms = latency_ms
+
+    def _answer(self, messages):
+        prompt = _prompt_text(messages)
+        responder = STUB_RESPONDERS.get(self.purpose)
+        return prompt, (responder(prompt) if responder else "OK")
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        prompt, content = self._answer(messages)
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+            usage=_stub_usage(prompt, content),
+        )
+
+
+class AsyncStubCompletions(StubCompletions):
+    async def create(self, model=None, messages=None, stream=False, **kwargs):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        prompt, content = self._answer(messages)
+        if not stream:
+            message = SimpleNamespace(role="assistant", content=content)
+            return SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+                usage=_stub_usage(prompt, content),
+            )
+        return self._stream(prompt, content)
+
+    async def _stream(self, prompt, content):
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=text))], usage=None)
+        yield SimpleNamespace(choices=[], usage=_stub_usage(prompt, content))
+
+
+class StubLLMClient:
+    def __init__(self, purpose, latency_ms=0, asynchronous=False):
+        completions_class = AsyncStubCompletions if asynchronous else StubCompletions
+        self.chat = SimpleNamespace(completions=completions_class(purpose, latency_ms))
+
+
+# -----------------------------
+#   Client construction
+# -----------------------------
+
+_lock = threading.Lock()
+_sync_client = None
+_async_clients = weakref.WeakKeyDictionary()   # event loop -> AsyncOpenAI
+_built_for = None
+
+
+def _http_client(config, asynchronous):
+    """Pooled httpx transport; None lets the SDK use its own default pool."""
+    if httpx is None or DefaultHttpxClient is None:
+        return None
+    limits = httpx.Limits(
+        max_connections=config["MAX_CONNECTIONS"],
+        max_keepalive_connections=config["MAX_KEEPALIVE_CONNECTIONS"],
+        keepalive_expiry=config["KEEPALIVE_EXPIRY"],
+    )
+    timeout = httpx.Timeout(config["TIMEOUT"], connect=config["CONNECT_TIMEOUT"])
+    client_class = DefaultAsyncHttpxClient if asynchronous else DefaultHttpxClient
+    return client_class(limits=limits, timeout=timeout)
+
+
+def _client_kwargs(config, asynchronous):
+    kwargs = {
+        "api_key": os.getenv("OPENAI_API_KEY"),
+        "max_retries": config["MAX_RETRIES"],
+        "timeout": config["TIMEOUT"],
+    }
+    http_client = _http_client(config, asynchronous)
+    if http_client is not None:
+        kwargs["http_client"] = http_client
+    return kwargs
+
+
+def _openai_available():
+    return bool(os.getenv("OPENAI_API_KEY")) and OpenAI is not None
+
+
+def _check_config(config):
+    """Drop cached clients when the gateway settings changed (e.g. in tests)."""
+    global _sync_client, _async_clients, _built_for
+    key = (json.dumps(config, sort_keys=True, default=str), os.getenv("OPENAI_API_KEY"))
+    if key != _built_for:
+        _sync_client = None
+        _async_clients = weakref.WeakKeyDictionary()
+        _built_for = key
+
+
+def get_llm_client(purpose="default"):
+    """Shared sync client tagged with ``purpose``, or None when no backend is available."""
+    global _sync_client
+    config = _config()
+    if config["BACKEND"] == "stub":
+        return _MeteredClient(StubLLMClient(purpose, config["STUB_LATENCY_MS"]), purpose, config["MODEL"])
+    if not _openai_available():
+        return None
+
+    with _lock:
+        _check_config(config)
+        if _sync_client is None:
+            _sync_client = OpenAI(**_client_kwargs(config, asynchronous=False))
+        client = _sync_client
+    return _MeteredClient(client, purpose, config["MODEL"])
+
+
+def get_async_llm_client(purpose="default"):
+    """
+    Shared async client for the running event loop, or None when no backend
+    is available.  Async connection pools are bound to the loop that opened
+    them, so each loop gets its own client.
+    """
+    config = _config()
+    if config["BACKEND"] == "stub":
+        stub = StubLLMClient(purpose, config["STUB_LATENCY_MS"], asynchronous=True)
+        return _AsyncMeteredClient(stub, purpose, config["MODEL"])
+    if not _openai_available() or AsyncOpenAI is None:
+        return None
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _check_config(config)
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = AsyncOpenAI(**_client_kwargs(config, asynchronous=True))
+    return _AsyncMeteredClient(client, purpose, config["MODEL"])
+
+
+def reset_llm_clients():
+    """Forget the shared clients and rate limiter (they are rebuilt on next use)."""
+    global _sync_client, _async_clients, _built_for, _limiter
+    with _lock:
+        _sync_client = None
+        _async_clients = weakref.WeakKeyDictionary()
+        _built_for = None
+        _limiter = None
@@ -1,18 +1,10 @@
-import os
 import json
 from product_recommendations.models import Product
-
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+from product_recommendations.services.llm_gateway import get_llm_client
 
 
 def _get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or OpenAI is None:
-        return None
-    return OpenAI(api_key=api_key)
+    return get_llm_client("product_description")
 
 
 def generate_product_description(product: Product) -> str:
@@ -53,7 +45,6 @@ Return JSON only in this format:
 """
 
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.4
     )
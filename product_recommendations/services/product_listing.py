@@ -0,0 +1,176 @@
+"""
+Product listing for the ``product_list`` API: keyset pagination, field
+projection, filters and a fast JSON path.
+
+Pages are read with ``WHERE id > <cursor> ORDER BY id LIMIT n`` on
+composite indexes, so page 1000 costs the same as page 1 and no COUNT is
+run.  Rows come from ``.values_list()`` (only the requested columns) and are
+turned into plain dicts that are encoded in one call, with orjson when it is
+installed and the standard json module otherwise, instead of going through
+``ProductSerializer`` field by field.
+
+``iter_ndjson`` streams a whole (filtered) catalogue as newline-delimited
+JSON in keyset chunks, for exports.  Configured via ``settings.PRODUCT_LIST``.
+"""
+
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+from product_recommendations.models import Product
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+DEFAULTS = {
+    "PAGE_SIZE": 100,
+    "MAX_PAGE_SIZE": 1000,
+    "STREAM_CHUNK_SIZE": 2000,   # rows per query while streaming an export
+}
+
+# Output field -> column read with values_list().  The default set matches
+# ProductSerializer, so existing clients see the same objects.
+FIELDS = {
+    "id": "id",
+    "name": "name",
+    "category": "category_id",
+    "description": "description",
+    "price": "price",
+    "stock": "stock",
+    "is_active": "is_active",
+    "brand": "brand",
+    "use_case": "use_case",
+    "image_url": "image_url",
+    "category_name": "category__name",
+}
+DEFAULT_FIELDS = ["id", "name", "category", "description", "price", "stock", "is_active"]
+
+
+class ListingError(ValueError):
+    """Invalid listing parameters (reported to the client as a 400)."""
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "PRODUCT_LIST", {})}
+
+
+def _int(value, name, minimum=0):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ListingError(f"'{name}' must be an integer")
+    if number < minimum:
+        raise ListingError(f"'{name}' must be at least {minimum}")
+    return number
+
+
+def _price(value, name):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ListingError(f"'{name}' must be a number")
+
+
+def parse_listing_params(params):
+    """
+    Validate query parameters (a QueryDict or dict) and return
+    {"fields", "categories", "min_price", "max_price", "cursor", "limit"}.
+    """
+    config = _config()
+    raw_fields = params.get("fields")
+    if raw_fields:
+        fields = [f.strip() for f in raw_fields.split(",") if f.strip()]
+        unknown = [f for f in fields if f not in FIELDS]
+        if unknown:
+            raise ListingError(f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(FIELDS)})")
+        fields = list(dict.fromkeys(fields))
+    else:
+        fields = list(DEFAULT_FIELDS)
+
+    categories = []
+    values = params.getlist("category") if hasattr(params, "getlist") else [params.get("category")]
+    for value in values:
+        for part in (value or "").split(","):
+            if part.strip():
+                categories.append(_int(part.strip(), "category", minimum=1))
+
+    min_price = _price(params["min_price"], "min_price") if params.get("min_price") else None
+    max_price = _price(params["max_price"], "max_price") if params.get("max_price") else None
+
+    limit = config["PAGE_SIZE"]
+    if params.get("limit"):
+        limit = min(_int(params["limit"], "limit", minimum=1), config["MAX_PAGE_SIZE"])
+
+    cursor = _int(params["cursor"], "cursor") if params.get("cursor") else 0
+    return {
+        "fields": fields,
+        "categories": categories,
+        "min_price": min_price,
+        "max_price": max_price,
+        "cursor": cursor,
+        "limit": limit,
+    }
+
+
+def listing_queryset(options):
+    """Active products matching the filters, in id order."""
+    products = Product.objects.filter(is_active=True)
+    if options["categories"]:
+        products = products.filter(category_id__in=options["categories"])
+    if options["min_price"] is not None:
+        products = products.filter(price__gte=options["min_price"])
+    if options["max_price"] is not None:
+        products = products.filter(price__lte=options["max_price"])
+    return products.order_by("id")
+
+
+def _rows(products, fields, after, limit):
+    """Up to ``limit`` product dicts with id > ``after``, and their ids."""
+    columns = ["id"] + [FIELDS[f] for f in fields]
+    items, ids = [], []
+    for row in products.filter(id__gt=after).values_list(*columns)[:limit]:
+        ids.append(row[0])
+        item = {}
+        for field, value in zip(fields, row[1:]):
+            # Decimals are sent as strings, as DRF does
+            item[field] = str(value) if isinstance(value, Decimal) else value
+        items.append(item)
+    return items, ids
+
+
+def list_products(options):
+    """
+    One page: {"results": [...], "next_cursor": id or None}.  One extra row
+    is read to tell whether another page exists.
+    """
+    limit = options["limit"]
+    results, ids = _rows(listing_queryset(options), options["fields"], options["cursor"], limit + 1)
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = ids[limit - 1]
+    return {"results": results, "next_cursor": next_cursor}
+
+
+def dumps(payload):
+    """Encode ``payload`` to JSON bytes with the fastest available encoder."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def iter_ndjson(options):
+    """Every matching product as one JSON line, read in keyset chunks."""
+    chunk_size = _config()["STREAM_CHUNK_SIZE"]
+    products = listing_queryset(options)
+    after = options["cursor"]
+    while True:
+        rows, ids = _rows(products, options["fields"], after, chunk_size)
+        if not rows:
+            return
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+        after = ids[-1]
@@ -0,0 +1,171 @@
+"""
+Find the catalogue products named in a piece of text (e.g. a chatbot reply).
+
+The chatbot used to resolve "which product was that?" by loading every
+active product and testing ``p.name in text`` one by one.  This module keeps
+an Aho-Corasick automaton over active product names (plus brands that belong
+to a single product) and reports every mention in one pass over the text.
+
+The automaton runs over word tokens rather than characters: matches always
+fall on word boundaries ("Pro" does not match inside "Protein") and the trie
+stays small because product names share leading words.  It is rebuilt
+lazily after catalogue changes, whether made in this process (see
+``signals``) or by another one (the catalogue generation moved on).
+"""
+
+import re
+import threading
+from collections import defaultdict, deque
+
+from product_recommendations.services.catalogue_version import CatalogueSync, get_catalogue_version
+
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Brand aliases shorter than this are too ambiguous to count as a mention
+MIN_ALIAS_LENGTH = 3
+
+
+def tokenize(text):
+    return WORD_RE.findall((text or "").lower())
+
+
+class MentionAutomaton:
+    """Aho-Corasick automaton over token sequences."""
+
+    def __init__(self, patterns):
+        """``patterns``: iterable of (text, product_id); earlier patterns win ties."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]      # state -> [(pattern length in tokens, product_id)]
+
+        for text, product_id in patterns:
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            state = 0
+            for token in tokens:
+                nxt = self._goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][token] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            if not self._out[state]:
+                self._out[state].append((len(tokens), product_id))
+
+        # Breadth-first: failure links point to the longest proper suffix in the trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(token, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def find(self, text):
+        """
+        Product ids mentioned in ``text``, in order of first appearance.
+        Overlapping mentions resolve leftmost-longest.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for end, token in enumerate(tokenize(text)):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length, product_id in out[state]:
+                matches.append((end - length + 1, -length, product_id))
+
+        found = []
+        covered_until = -1
+        for start, neg_length, product_id in sorted(matches):
+            if start <= covered_until:
+                continue
+            covered_until = start - neg_length - 1
+            if product_id not in found:
+                found.append(product_id)
+        return found
+
+
+def load_patterns():
+    """(text, product_id) pairs: product names, then single-product brands."""
+    from product_recommendations.models import Product
+
+    rows = list(
+        Product.objects.filter(is_active=True).order_by("id").values_list("id", "name", "brand")
+    )
+    patterns = [(name, product_id) for product_id, name, _ in rows if name]
+
+    names = {" ".join(tokenize(name)) for _, name, _ in rows}
+    brand_products = defaultdict(set)
+    for product_id, _, brand in rows:
+        alias = " ".join(tokenize(brand))
+        if len(alias) >= MIN_ALIAS_LENGTH and alias not in names:
+            brand_products[alias].add(product_id)
+    patterns += [(alias, ids.pop()) for alias, ids in brand_products.items() if len(ids) == 1]
+    return patterns
+
+
+class ProductMentionIndex:
+    def __init__(self):
+        self._automaton = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self.catalogue = CatalogueSync()
+
+    def rebuild(self):
+        self._stale = False   # changes made while reading mark it stale again
+        generation = get_catalogue_version()[0]
+        self._automaton = MentionAutomaton(load_patterns())
+        self.catalogue.synced(generation)
+        return self._automaton
+
+    def mark_stale(self):
+        """Rebuild on next use (called on catalogue changes)."""
+        self._stale = True
+
+    def invalidate(self):
+        with self._lock:
+            self._automaton = None
+            self._stale = True
+            self.catalogue.reset()
+
+    def _current(self):
+        automaton = self._automaton
+        if automaton is None:
+            with self._lock:
+                if self._automaton is None:
+                    self.rebuild()
+                return self._automaton
+        stale = self._stale or self.catalogue.behind() is not None
+        if stale and self._lock.acquire(blocking=False):
+            # Other threads keep using the previous automaton meanwhile
+            try:
+                automaton = self.rebuild()
+            finally:
+                self._lock.release()
+        return automaton
+
+    def find_products(self, text):
+        """Ids of active products mentioned in ``text``, in order of appearance."""
+        if not text:
+            return []
+        return self._current().find(text)
+
+
+_index = ProductMentionIndex()
+
+
+def get_mention_index():
+    """Return the process-wide product mention index."""
+    return _index
@@ -0,0 +1,153 @@
+"""
+Two-tier cache for parsed search intents produced by `_parse_query_with_ai`.
+
+The AI parse runs with temperature 0.0, so the same normalised query always
+maps to the same {category, max_price, keywords} dict.  Results are cached:
+
+1. in a bounded in-process LRU (fastest, per worker)
+2. in the Django cache backend ``CACHE_ALIAS`` (survives restarts and is
+   shared by workers when ``CACHES`` points at Redis; the LocMemCache used
+   in development is per process)
+
+Configured via ``settings.SMART_SEARCH_INTENT_CACHE``.
+"""
+
+import copy
+import hashlib
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from product_recommendations.services.caching import TTLLRUCache
+
+
+DEFAULTS = {
+    "ENABLED": True,
+    "LOCAL_MAX_ENTRIES": 2048,
+    "LOCAL_TTL": 600,          # seconds
+    "SHARED_TTL": 86400,       # seconds
+    "CACHE_ALIAS": "default",
+    "KEY_PREFIX": "smartshop:intent:v1:",
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "SMART_SEARCH_INTENT_CACHE", {})}
+
+
+def normalize_query(query):
+    """Lowercase and collapse whitespace so trivially different queries share a key."""
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+class QueryIntentCache:
+    def __init__(self, config=None):
+        self.config = config or _config()
+        self.local = TTLLRUCache(
+            max_entries=self.config["LOCAL_MAX_ENTRIES"],
+            ttl=self.config["LOCAL_TTL"],
+        )
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def enabled(self):
+        return self.config["ENABLED"]
+
+    def _shared(self):
+        return caches[self.config["CACHE_ALIAS"]]
+
+    def _shared_key(self, normalized):
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return self.config["KEY_PREFIX"] + digest
+
+    def get(self, query):
+        """Return a copy of the cached intent for ``query`` or None."""
+        if not self.enabled:
+            return None
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+
+        intent = self.local.get(normalized, copy_value=True)
+        if intent is not None:
+            with self._lock:
+                self.local_hits += 1
+            return intent
+
+        try:
+            intent = self._shared().get(self._shared_key(normalized))
+        except Exception:
+            intent = None
+
+        if intent is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self.local.set(normalized, intent)
+        with self._lock:
+            self.shared_hits += 1
+        return copy.deepcopy(intent)
+
+    def set(self, query, intent):
+        if not self.enabled or intent is None:
+            return
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        intent = copy.deepcopy(intent)
+        self.local.set(normalized, intent)
+        try:
+            self._shared().set(self._shared_key(normalized), intent, self.config["SHARED_TTL"])
+        except Exception:
+            pass
+        with self._lock:
+            self.stores += 1
+
+    def contains(self, query):
+        """True when ``query`` is cached in either tier (not counted as a lookup)."""
+        normalized = normalize_query(query)
+        if self.local.get(normalized) is not None:
+            return True
+        try:
+            return self._shared().get(self._shared_key(normalized)) is not None
+        except Exception:
+            return False
+
+    def clear_local(self):
+        self.local.clear()
+        with self._lock:
+            self.local_hits = self.shared_hits = self.misses = self.stores = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            hits = self.local_hits + self.shared_hits
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "local_entries": len(self.local),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_intent_cache():
+    """Return the process-wide parsed-intent cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryIntentCache()
+    return _cache
@@ -0,0 +1,148 @@
+"""
+Precomputed recommendation pipeline.
+
+Recommendations are generated by a batch job (``build_recommendations``
+management command) and persisted in the ``Recommendation`` table with their
+real personalised scores.  Views read the stored ranking with a single query
+instead of calling the recommendation engine on every page load.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import Max, OuterRef, Q, Subquery
+
+from product_recommendations.models import Recommendation, UserInteraction
+from product_recommendations.services.ai_recommendation_service import (
+    generate_recommendations_for_user
+)
+
+GENERATED_BY = "AI Recommendation Engine"
+
+
+def get_stored_recommendations(user):
+    """Stored ranking for ``user``, best first (one query)."""
+    return list(
+        Recommendation.objects
+        .filter(user=user)
+        .select_related("product", "product__category")
+        .order_by("-score", "id")
+    )
+
+
+def store_recommendations(user, scored_products, generated_by=GENERATED_BY):
+    """Replace the stored ranking for ``user`` with ``scored_products``
+    (a list of (product, score) pairs)."""
+    with transaction.atomic():
+        Recommendation.objects.filter(user=user).delete()
+        Recommendation.objects.bulk_create([
+            Recommendation(
+                user=user,
+                product=product,
+                score=score,
+                generated_by=generated_by,
+            )
+            for product, score in scored_products
+        ])
+
+
+def refresh_user_recommendations(user):
+    """
+    Recompute and persist recommendations for one user.
+    Returns the number of stored recommendations; an empty engine result
+    (e.g. the engine is unavailable) keeps the previous ranking.
+    """
+    interactions = UserInteraction.objects.filter(user=user).select_related("product")
+    scored = generate_recommendations_for_user(user, interactions, with_scores=True)
+    if not scored:
+        return 0
+    store_recommendations(user, scored)
+    return len(scored)
+
+
+def get_or_refresh_recommendations(user):
+    """Stored ranking for ``user``; computed once on the spot for users the
+    batch job has not reached yet."""
+    recommendations = get_stored_recommendations(user)
+    if not recommendations and refresh_user_recommendations(user):
+        recommendations = get_stored_recommendations(user)
+    return recommendations
+
+
+def users_needing_refresh():
+    """Users without stored recommendations or with interactions newer than them."""
+    last_interaction = (
+        UserInteraction.objects
+        .filter(user=OuterRef("pk"))
+        .values("user")
+        .annotate(last=Max("timestamp"))
+        .values("last")
+    )
+    last_recommendation = (
+        Recommendation.objects
+        .filter(user=OuterRef("pk"))
+        .values("user")
+        .annotate(last=Max("created_at"))
+        .values("last")
+    )
+    return (
+        User.objects
+        .annotate(
+            last_interaction=Subquery(last_interaction),
+            last_recommendation=Subquery(last_recommendation),
+        )
+        .filter(
+            Q(last_recommendation__isnull=True)
+            | Q(last_interaction__gt=Subquery(last_recommendation))
+        )
+        .order_by("id")
+    )
+
+
+def _refresh_in_worker(user):
+    try:
+        return refresh_user_recommendations(user)
+    finally:
+        # Worker threads hold their own DB connection
+        close_old_connections()
+
+
+def run_batch(users, workers=1, on_result=None):
+    """
+    Refresh recommendations for ``users``.
+    ``on_result(user, stored_count, error)`` is called as each user finishes.
+    Returns (succeeded, failed) counts.
+    """
+    succeeded = failed = 0
+
+    def _report(user, count, error):
+        nonlocal succeeded, failed
+        if error is None:
+            succeeded += 1
+        else:
+            failed += 1
+        if on_result:
+            on_result(user, count, error)
+
+    if workers <= 1:
+        for user in users:
+            try:
+                count = refresh_user_recommendations(user)
+            except Exception as e:
+                _report(user, 0, e)
+            else:
+                _report(user, count, None)
+        return succeeded, failed
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recommendations") as pool:
+        futures = {pool.submit(_refresh_in_worker, user): user for user in users}
+        for future in as_completed(futures):
+            user = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                _report(user, 0, e)
+            else:
+                _report(user, count, None)
+    return succeeded, failed
@@ -0,0 +1,188 @@
+"""
+Denormalized per-product review aggregates (``ProductReviewStats``).
+
+Review counts, averages, the 1-5 star histogram and the sentiment
+distribution used to be recomputed with ``Count``/``Avg`` queries on every
+chat question and page view.  They now live in one row per product:
+
+- the review signal handlers apply each create/update/delete as a single
+  ``UPDATE ... SET col = col + delta`` (``apply_review_change``), so
+  concurrent writers never lose increments
+- a product without a row yet gets one computed from its reviews
+- ``backfill_review_stats`` recomputes rows from scratch (needed after
+  ``bulk_create`` or ``QuerySet.update`` on reviews, which skip signals) and
+  ``verify_review_stats`` reports rows that drifted from the reviews table
+"""
+
+from collections import Counter
+
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Greatest
+
+from product_recommendations.models import Product, ProductReviewStats, Review
+
+
+RATING_FIELDS = {stars: f"rating_{stars}" for stars in range(1, 6)}
+SENTIMENT_FIELDS = {
+    "positive": "sentiment_positive",
+    "neutral": "sentiment_neutral",
+    "negative": "sentiment_negative",
+}
+UNLABELED_FIELD = "sentiment_unlabeled"
+
+COUNTER_FIELDS = (
+    ["review_count", "rating_sum"]
+    + list(RATING_FIELDS.values())
+    + list(SENTIMENT_FIELDS.values())
+    + [UNLABELED_FIELD]
+)
+STAT_FIELDS = COUNTER_FIELDS + ["last_review_id"]
+
+
+def sentiment_field(label):
+    return SENTIMENT_FIELDS.get((label or "").strip().lower(), UNLABELED_FIELD)
+
+
+def review_deltas(rating, sentiment_label, sign=1):
+    """Counter changes caused by adding (sign=1) or removing (-1) one review."""
+    deltas = Counter({"review_count": sign, "rating_sum": sign * rating, sentiment_field(sentiment_label): sign})
+    if rating in RATING_FIELDS:
+        deltas[RATING_FIELDS[rating]] += sign
+    return deltas
+
+
+def get_review_stats(product):
+    """
+    Stats row for ``product`` (instance or id) or None when it has no
+    reviews.  Uses the row fetched by ``select_related("review_stats")``
+    when there is one; otherwise reads it without caching it on the
+    instance, so long-lived instances never see stale counts.
+    """
+    if isinstance(product, Product):
+        if Product.review_stats.is_cached(product):
+            try:
+                return product.review_stats
+            except ProductReviewStats.DoesNotExist:
+                return None
+        product = product.pk
+    return ProductReviewStats.objects.filter(product_id=product).first()
+
+
+def apply_review_change(product_id, deltas, last_review_id=None, create_missing=True):
+    """
+    Apply counter ``deltas`` to the product's row in one UPDATE.  A missing
+    row is computed from the reviews table unless ``create_missing`` is off
+    (deletes: the product itself may be going away).
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if last_review_id:
+        changes["last_review_id"] = Greatest(F("last_review_id"), last_review_id)
+    if not changes:
+        return
+    updated = ProductReviewStats.objects.filter(product_id=product_id).update(**changes)
+    if not updated and create_missing:
+        # First review of this product (or a never backfilled one): the
+        # reviews table already includes this change
+        rebuild_review_stats([product_id])
+
+
+def compute_review_stats(product_ids=None):
+    """{product_id: {field: value}} aggregated from the reviews table."""
+    reviews = Review.objects.order_by()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+
+    aggregates = {
+        "review_count": Count("id"),
+        "rating_sum": Sum("rating"),
+        "last_review_id": Max("id"),
+    }
+    for stars, field in RATING_FIELDS.items():
+        aggregates[field] = Count("id", filter=Q(rating=stars))
+    for label, field in SENTIMENT_FIELDS.items():
+        aggregates[field] = Count("id", filter=Q(sentiment_label__iexact=label))
+
+    stats = {}
+    for row in reviews.values("product_id").annotate(**aggregates):
+        product_id = row.pop("product_id")
+        row["rating_sum"] = row["rating_sum"] or 0
+        row[UNLABELED_FIELD] = row["review_count"] - sum(row[f] for f in SENTIMENT_FIELDS.values())
+        stats[product_id] = row
+    return stats
+
+
+def _empty_stats():
+    return dict.fromkeys(STAT_FIELDS, 0)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def rebuild_review_stats(product_ids=None, batch_size=1000):
+    """
+    Recompute stats rows from the reviews table, ``batch_size`` products per
+    aggregate query.  With no ``product_ids`` every product is rebuilt and
+    rows of products without reviews are removed.  Returns rows written.
+    """
+    if product_ids is None:
+        ProductReviewStats.objects.exclude(
+            product_id__in=Review.objects.values("product_id")
+        ).delete()
+        product_ids = list(Review.objects.order_by("product_id").values_list("product_id", flat=True).distinct())
+    else:
+        product_ids = list(product_ids)
+
+    written = 0
+    for chunk in _chunks(product_ids, batch_size):
+        stats = compute_review_stats(chunk)
+        rows = [
+            ProductReviewStats(product_id=product_id, **stats.get(product_id, _empty_stats()))
+            for product_id in chunk
+        ]
+        ProductReviewStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=STAT_FIELDS,
+        )
+        written += len(rows)
+    return written
+
+
+def verify_review_stats(product_ids=None, batch_size=1000):
+    """
+    Compare stored rows with the reviews table.  Returns a list of
+    (product_id, {field: (stored, actual)}) for every product that differs;
+    a missing row counts as all zeros.
+    """
+    if product_ids is None:
+        product_ids = sorted(
+            set(Review.objects.order_by().values_list("product_id", flat=True).distinct())
+            | set(ProductReviewStats.objects.values_list("product_id", flat=True))
+        )
+    else:
+        product_ids = list(product_ids)
+
+    mismatches = []
+    for chunk in _chunks(product_ids, batch_size):
+        actual = compute_review_stats(chunk)
+        stored = {
+            row["product_id"]: row
+            for row in ProductReviewStats.objects.filter(product_id__in=chunk).values("product_id", *STAT_FIELDS)
+        }
+        for product_id in chunk:
+            have = stored.get(product_id) or _empty_stats()
+            want = actual.get(product_id) or _empty_stats()
+            # last_review_id is a high-water mark: it may stay above the
+            # newest review after deletes
+            diff = {
+                field: (have[field], want[field])
+                for field in STAT_FIELDS
+                if have[field] != want[field]
+                and not (field == "last_review_id" and have[field] > want[field] and product_id in stored)
+            }
+            if diff:
+                mismatches.append((product_id, diff))
+    return mismatches
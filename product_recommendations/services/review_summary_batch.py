@@ -0,0 +1,179 @@
+"""
+Batch engine for (re)generating review summaries across many products.
+
+Used by the ``regen_review_summaries`` and ``fix_product_subtype_reviews``
+commands:
+
+- products are processed by a thread pool (``concurrency``); LLM calls are
+  throttled by the gateway's requests/tokens-per-minute limiter
+- finished product ids are appended to a checkpoint file, so an interrupted
+  run can be resumed without redoing them
+- ``BatchProgress`` reports throughput and an ETA as products complete
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import close_old_connections
+
+from product_recommendations.models import Product, Review
+from product_recommendations.services.review_summary_service import (
+    get_or_generate_review_summary,
+    update_review_summary,
+)
+
+
+def products_with_reviews_since(since):
+    """Ids of products that received reviews at or after ``since``."""
+    return list(
+        Review.objects
+        .filter(created_at__gte=since)
+        .order_by("product_id")
+        .values_list("product_id", flat=True)
+        .distinct()
+    )
+
+
+class Checkpoint:
+    """Append-only record of finished product ids (one JSON object per line)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        done = set()
+        if not self.path or not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    done.add(json.loads(line)["product_id"])
+                except (ValueError, KeyError):
+                    continue  # partially written last line
+        return done
+
+    def reset(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def mark_done(self, product_id):
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.fspath(self.path)) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"product_id": product_id}) + "\n")
+
+
+class BatchProgress:
+    """Completed/failed counters with throughput and ETA."""
+
+    def __init__(self, total, clock=time.monotonic):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+
+    def record(self, ok):
+        with self._lock:
+            self.done += 1
+            self.failed += 0 if ok else 1
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(self._clock() - self._started, 1e-9)
+            rate = self.done / elapsed
+            remaining = self.total - self.done
+            eta = remaining / rate if rate else None
+            return {
+                "done": self.done,
+                "failed": self.failed,
+                "total": self.total,
+                "elapsed": elapsed,
+                "rate": rate,
+                "eta": eta,
+            }
+
+    def format(self):
+        snap = self.snapshot()
+        eta = _format_duration(snap["eta"]) if snap["eta"] is not None else "?"
+        width = len(str(snap["total"]))
+        return (
+            f"[{snap['done']:>{width}}/{snap['total']}] "
+            f"{snap['rate'] * 60:.1f} products/min, "
+            f"elapsed {_format_duration(snap['elapsed'])}, ETA {eta}"
+        )
+
+
+def _format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+def _summarize(product_id, incremental):
+    product = Product.objects.select_related("category").get(pk=product_id)
+    if incremental:
+        return product, update_review_summary(product)
+    return product, get_or_generate_review_summary(product, force=True)
+
+
+def _summarize_in_worker(product_id, incremental):
+    try:
+        return _summarize(product_id, incremental)
+    finally:
+        # Worker threads hold their own DB connection
+        close_old_connections()
+
+
+def regenerate_summaries(product_ids, concurrency=1, incremental=False, checkpoint=None, on_result=None):
+    """
+    Regenerate summaries for ``product_ids``.
+
+    ``incremental`` folds only new reviews into stored summaries instead of
+    rebuilding them.  Products already recorded in ``checkpoint`` are
+    expected to have been filtered out by the caller.
+    ``on_result(product_id, product, summary, error, progress)`` is called as
+    each product finishes.  Returns the final ``BatchProgress``.
+    """
+    progress = BatchProgress(len(product_ids))
+
+    def _report(product_id, product, summary, error):
+        progress.record(error is None)
+        if error is None and checkpoint is not None:
+            checkpoint.mark_done(product_id)
+        if on_result:
+            on_result(product_id, product, summary, error, progress)
+
+    if concurrency <= 1:
+        for product_id in product_ids:
+            try:
+                product, summary = _summarize(product_id, incremental)
+            except Exception as e:
+                _report(product_id, None, None, e)
+            else:
+                _report(product_id, product, summary, None)
+        return progress
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="review-summaries") as pool:
+        futures = {pool.submit(_summarize_in_worker, pid, incremental): pid for pid in product_ids}
+        for future in as_completed(futures):
+            product_id = futures[future]
+            try:
+                product, summary = future.result()
+            except Exception as e:
+                _report(product_id, None, None, e)
+            else:
+                _report(product_id, product, summary, None)
+    return progress
@@ -1,79 +1,198 @@
-from django.utils import timezone
-from product_recommendations.models import Review
-from openai import OpenAI
-import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from product_recommendations.models import Review, ReviewSummary
+from product_recommendations.services.llm_gateway import get_llm_client
+from product_recommendations.services.review_stats import get_review_stats
+
+REVIEW_SUMMARY_DEFAULTS = {
+    "CHUNK_MAX_CHARS": 6000,      # review text per map prompt
+    "CHUNK_MAX_REVIEWS": 40,
+    "MAX_REVIEW_CHARS": 1500,     # longer reviews are truncated
+    "MAX_PARALLEL_CHUNKS": 4,
+    "REDUCE_FAN_IN": 4,           # summaries merged per reduce prompt
+}
 
 def _get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    return get_llm_client("review_summary")
+
+
+def _summary_dict(row):
+    return {
+        "summary": row.summary or None,
+        "pros": list(row.pros or []),
+        "cons": list(row.cons or []),
+        "sentiment": row.sentiment or None,
+        "review_count": row.review_count,
+        "average_rating": row.average_rating,
+    }
+
+
+def get_cached_review_summary(product):
+    """
+    Stored summary for ``product`` or None (one indexed lookup, never calls
+    the model).
+    """
+    row = ReviewSummary.objects.filter(product=product).first()
+    return _summary_dict(row) if row is not None else None
+
+
+def save_review_summary(product, summary, pros, cons, sentiment, review_count, average_rating, last_review_id):
+    """Insert or update the product's summary row in a single statement."""
+    row = ReviewSummary(
+        product_id=getattr(product, "pk", product),
+        summary=summary or "",
+        pros=list(pros or []),
+        cons=list(cons or []),
+        sentiment=sentiment or "",
+        review_count=review_count,
+        average_rating=average_rating,
+        last_review_id=last_review_id or 0,
+    )
+    ReviewSummary.objects.bulk_create(
+        [row],
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=[
+            "summary", "pros", "cons", "sentiment",
+            "review_count", "average_rating", "last_review_id", "updated_at",
+        ],
+    )
+    return row
+
+
+def review_stats(product):
+    """(count, average rating, newest review id) from the product's stats row."""
+    stats = get_review_stats(product)
+    if stats is None:
+        return 0, None, 0
+    return stats.review_count, stats.average_rating, stats.last_review_id
+
+
+def rating_based_summary(product):
+    """
+    Instant placeholder shown while the AI summary is generated in the
+    background: review count, average rating and a rating-derived sentiment.
+    Returns None when the product has no reviews.
+    """
+    count, avg, _ = review_stats(product)
+    if not count:
         return None
-    return OpenAI(api_key=api_key)
 
+    noun = "review" if count == 1 else "reviews"
+    return {
+        "summary": f"Rated {avg:.1f} out of 5 from {count} {noun}.",
+        "pros": [],
+        "cons": [],
+        "sentiment": sentiment_from_rating(avg),
+        "review_count": count,
+        "average_rating": avg,
+        "pending": True,
+    }
 
-def get_or_generate_review_summary(product):
+
+def get_or_generate_review_summary(product, force=False):
     """
-    Generates or retrieves cached AI summary for product reviews.
-    Falls back to a simple heuristic summary when OPENAI_API_KEY is not set.
+    Generates or retrieves the stored AI summary for product reviews.
+    ``force`` rebuilds the summary from every review even when one is stored.
+    Falls back to a simple heuristic summary when no LLM backend is available.
     """
 
-    reviews = Review.objects.filter(product=product)
+    if not force:
+        cached = get_cached_review_summary(product)
+        if cached is not None:
+            return cached
+
+    return update_review_summary(product, full=force)
 
-    if not reviews.exists():
+
+def refresh_review_summary(product):
+    """
+    Fold reviews added since the stored summary into it (or rebuild it when
+    reviews were removed).  Returns True when the summary changed.
+    """
+    stored = (
+        ReviewSummary.objects
+        .filter(product=product)
+        .values_list("review_count", "last_review_id")
+        .first()
+    )
+    count, _, last_review_id = review_stats(product)
+    if stored == (count, last_review_id):
+        return False
+    update_review_summary(product)
+    return True
+
+
+def update_review_summary(product, full=False):
+    """
+    Incremental map-reduce summarization.
+
+    Only reviews newer than the stored ``last_review_id`` watermark are read.
+    They are split into bounded chunks, each chunk is summarized on its own
+    (map, in parallel), and the chunk summaries are merged with the stored
+    summary (reduce).  Every prompt is therefore bounded by the chunk size,
+    however many reviews the product has.  ``full`` (or reviews having been
+    deleted since the last run) rebuilds from the first review.
+    """
+    count, avg, last_review_id = review_stats(product)
+    if not count:
+        ReviewSummary.objects.filter(product=product).delete()
         return None
 
-    # Check cache (use first review as storage anchor)
-    cached_review = reviews.filter(ai_summary_cache__isnull=False).first()
-
-    if cached_review and cached_review.last_summarized_at:
-        content = cached_review.ai_summary_cache or ""
-        return {
-            "summary": extract_summary_only(content) if content else None,
-            "sentiment": cached_review.sentiment_label,
-            "pros": extract_bullets(content, "Pros"),
-            "cons": extract_bullets(content, "Cons"),
-        }
-
-    # Build review text bundle
-    review_texts = "\n".join(
-        [f"- {r.review_text}" for r in reviews]
+    stored = None if full else ReviewSummary.objects.filter(product=product).first()
+    if stored is not None:
+        if (stored.review_count, stored.last_review_id) == (count, last_review_id):
+            return _summary_dict(stored)
+        new_count = (
+            Review.objects
+            .filter(product=product, id__gt=stored.last_review_id, id__lte=last_review_id)
+            .count()
+        )
+        if stored.review_count + new_count != count:
+            # Reviews were deleted: their content can't be subtracted from the summary
+            stored = None
+
+    watermark = stored.last_review_id if stored is not None else 0
+    new_reviews = (
+        Review.objects
+        .filter(product=product, id__gt=watermark, id__lte=last_review_id)
+        .order_by("id")
+        .values_list("review_text", flat=True)
     )
 
     # Try to get an OpenAI client; if not present, return a simple fallback summary
     client = _get_openai_client()
     if client is None:
         # Fallback: create a concise summary without calling the API
-        excerpt = " ".join([r.review_text for r in reviews][:3])
+        excerpt = " ".join(
+            Review.objects.filter(product=product).order_by("id").values_list("review_text", flat=True)[:3]
+        )
         summary_text = excerpt[:300] + ("..." if len(excerpt) > 300 else "")
-        sentiment = extract_sentiment(summary_text, reviews)
-
-        # Cache fallback summary into the first review so future calls are faster
-        first_review = reviews.first()
-        first_review.ai_summary_cache = summary_text
-        first_review.sentiment_label = sentiment
-        first_review.last_summarized_at = timezone.now()
-        first_review.save()
-
-        return {
-            "summary": summary_text,
-            "pros": [],
-            "cons": [],
-            "sentiment": sentiment,
-        }
-
-    # Prepare prompt for the model
-    prompt = f"""
-    You are an AI assistant summarizing customer reviews for an e-commerce product.
-
-    Customer reviews:
-    {review_texts}
-
-    Your task:
-    1. Write a concise 2–3 sentence summary.
-    2. List clear Pros as bullet points.
-    3. List clear Cons as bullet points.
-    4. Classify overall sentiment strictly as one of:
-    Positive, Neutral, or Negative.
-
+        pros, cons = [], []
+        sentiment = extract_sentiment(summary_text, average_rating=avg)
+    else:
+        config = _config()
+        chunks = list(_chunk_reviews(new_reviews.iterator(chunk_size=1000), config))
+        partials = _map_chunks(client, chunks, config)
+        if stored is not None:
+            partials.insert(0, _format_summary(stored))
+        content = _reduce_summaries(client, partials, config)
+
+        summary_text = extract_summary_only(content)
+        pros = extract_bullets(content, "Pros")
+        cons = extract_bullets(content, "Cons")
+        sentiment = extract_sentiment(content, average_rating=avg) or "Unknown"
+
+    row = save_review_summary(product, summary_text, pros, cons, sentiment, count, avg, last_review_id)
+    return _summary_dict(row)
+
+
+# -----------------------------
+#   Map-reduce helpers
+# -----------------------------
+
+_OUTPUT_FORMAT = """
     IMPORTANT:
     - Pros and Cons MUST be bullet points starting with "-"
     - Sentiment MUST be on its own line
@@ -93,39 +212,122 @@ def get_or_generate_review_summary(product):
 
     Sentiment:
     <Positive | Neutral | Negative>
-    """
+"""
+
 
+def _config():
+    return {**REVIEW_SUMMARY_DEFAULTS, **getattr(settings, "REVIEW_SUMMARY", {})}
+
+
+def _chunk_reviews(texts, config):
+    """Group review texts into chunks bounded by review count and characters."""
+    max_chars = config["CHUNK_MAX_CHARS"]
+    max_reviews = config["CHUNK_MAX_REVIEWS"]
+    chunk, size = [], 0
+    for text in texts:
+        text = (text or "").strip()[:config["MAX_REVIEW_CHARS"]]
+        if not text:
+            continue
+        if chunk and (size + len(text) > max_chars or len(chunk) >= max_reviews):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text)
+    if chunk:
+        yield chunk
+
+
+def _complete(client, prompt):
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2
     )
+    return response.choices[0].message.content.strip()
 
-    content = response.choices[0].message.content.strip()
 
-    summary_text = extract_summary_only(content)
-    pros = extract_bullets(content, "Pros")
-    cons = extract_bullets(content, "Cons")
-    sentiment = extract_sentiment(content, reviews) or "Unknown"
+def _summarize_chunk(client, review_texts):
+    bundle = "\n".join(f"- {text}" for text in review_texts)
 
-    # Cache full model output so we can re-extract Pros/Cons later
-    for r in reviews:
-        r.ai_summary_cache = content
-        r.sentiment_label = sentiment
-        r.last_summarized_at = timezone.now()
-        r.save()
+    # Prepare prompt for the model
+    prompt = f"""
+    You are an AI assistant summarizing customer reviews for an e-commerce product.
 
-    return {
-        "summary": summary_text,
-        "pros": pros,
-        "cons": cons,
-        "sentiment": sentiment,
-    }
+    Customer reviews:
+    {bundle}
+
+    Your task:
+    1. Write a concise 2–3 sentence summary.
+    2. List clear Pros as bullet points.
+    3. List clear Cons as bullet points.
+    4. Classify overall sentiment strictly as one of:
+    Positive, Neutral, or Negative.
+    {_OUTPUT_FORMAT}"""
 
+    return _complete(client, prompt)
+
+
+def _map_chunks(client, chunks, config):
+    """Summarize each chunk, several at a time. Results keep chunk order."""
+    workers = min(config["MAX_PARALLEL_CHUNKS"], len(chunks))
+    if workers <= 1:
+        return [_summarize_chunk(client, chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="review-summary") as pool:
+        return list(pool.map(lambda chunk: _summarize_chunk(client, chunk), chunks))
+
+
+def _merge_summaries(client, summaries):
+    blocks = "\n\n".join(f"Partial summary {i}:\n{text}" for i, text in enumerate(summaries, 1))
+
+    prompt = f"""
+    You are an AI assistant maintaining the customer review summary of an e-commerce product.
+
+    Below are summaries of different batches of reviews for the same product
+    (the first one may already cover all earlier reviews).
+
+    {blocks}
+
+    Your task:
+    1. Merge them into ONE concise 2–3 sentence summary of all reviews.
+    2. Combine the Pros and Cons, dropping duplicates (at most 5 of each).
+    3. Classify overall sentiment strictly as one of:
+    Positive, Neutral, or Negative.
+    {_OUTPUT_FORMAT}"""
+
+    return _complete(client, prompt)
+
+
+def _reduce_summaries(client, summaries, config):
+    """Merge summaries ``REDUCE_FAN_IN`` at a time until one is left."""
+    if not summaries:
+        return ""
+    fan_in = max(2, config["REDUCE_FAN_IN"])
+    while len(summaries) > 1:
+        summaries = [
+            _merge_summaries(client, summaries[i:i + fan_in]) if len(summaries[i:i + fan_in]) > 1
+            else summaries[i]
+            for i in range(0, len(summaries), fan_in)
+        ]
+    return summaries[0]
+
+
+def _format_summary(row):
+    """Stored summary rendered in the model's output format, for the reduce step."""
+    pros = "\n".join(f"- {p}" for p in row.pros or [])
+    cons = "\n".join(f"- {c}" for c in row.cons or [])
+    return f"Summary:\n{row.summary}\n\nPros:\n{pros}\n\nCons:\n{cons}\n\nSentiment:\n{row.sentiment}"
+
+
+def sentiment_from_rating(avg):
+    if avg is None:
+        return None
+    if avg >= 4.0:
+        return "Positive"
+    if avg <= 2.5:
+        return "Negative"
+    return "Neutral"
 
-from django.db.models import Avg
 
-def extract_sentiment(text, reviews=None):
+def extract_sentiment(text, product=None, average_rating=None):
     # 1) If model provided a direct Sentiment: line, use it
     for line in text.splitlines():
         if line.strip().lower().startswith("sentiment:"):
@@ -135,14 +337,10 @@ def extract_sentiment(text, reviews=None):
             # Empty Sentiment: line -> ignore and fall back to other heuristics
 
     # 2) If we have reviews, use average rating as a strong signal (primary)
-    if reviews is not None:
-        avg = reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        if avg is not None:
-            if avg >= 4.0:
-                return "Positive"
-            if avg <= 2.5:
-                return "Negative"
-            return "Neutral"
+    if average_rating is None and product is not None:
+        average_rating = review_stats(product)[1]
+    if average_rating is not None:
+        return sentiment_from_rating(average_rating)
 
     # 3) Fallback: keyword counting heuristic
     lowered = text.lower()
@@ -193,7 +391,9 @@ def extract_summary_only(text):
     for line in lines:
         if line.strip().startswith("Summary:"):
             capture = True
-            summary_lines.append(line.replace("Summary:", "").strip())
+            first = line.replace("Summary:", "").strip()
+            if first:
+                summary_lines.append(first)
             continue
 
         if capture:
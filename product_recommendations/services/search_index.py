@@ -0,0 +1,410 @@
+"""
+Process-local inverted index over the active product catalogue.
+
+Smart search used to evaluate every step of its fallback ladder as a set of
+``icontains`` clauses, i.e. ``LIKE '%kw%'`` scans over several text columns
+plus a join to Category.  This module keeps the same searchable text in
+memory instead:
+
+- a posting list per token: token -> {product_id: {field: term_frequency}}
+- the lowercased text of every searchable field, the price and the category
+  of every indexed product
+
+Keyword lookups keep the substring semantics of ``icontains``: a keyword is
+tokenised, each token is expanded to every vocabulary entry that contains it,
+the posting lists are intersected and the surviving candidates are verified
+against the stored field text.
+
+The index is built lazily from the database on first use and kept current by
+the ``post_save``/``post_delete`` handlers in ``product_recommendations.signals``.
+Writes made by other processes are picked up when the catalogue generation
+moves past the one the index reflects: the active catalogue is re-read and
+only products whose searchable data differs are re-indexed.
+"""
+
+import re
+import threading
+
+from product_recommendations.services.catalogue_version import CatalogueSync, get_catalogue_version
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Fields searched by keyword filters (mirrors the Q() built in smart search)
+KEYWORD_FIELDS = ("name", "base_description", "brand", "use_case", "category")
+
+# Fields searched by the final "contains full query" fallback
+FULL_QUERY_FIELDS = KEYWORD_FIELDS + ("material",)
+
+# Product model fields the index (and the stores derived from it) reads;
+# saves whose update_fields touch none of them leave the index alone
+INDEXED_FIELDS = frozenset(FULL_QUERY_FIELDS + ("category_id", "price", "is_active"))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class ProductSearchIndex:
+    """
+    In-memory inverted index for active products.
+
+    All public methods are thread-safe; readers and writers share one lock
+    because updates are rare (catalogue edits) and lookups are short.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._postings = {}      # token -> {product_id: {field: tf}}
+        self._docs = {}          # product_id -> {field: lowercased text}
+        self._prices = {}        # product_id -> float
+        self._product_category = {}  # product_id -> category_id
+        self._categories = {}    # category_id -> category name
+        self._expansions = {}    # query token -> frozenset of vocabulary tokens
+        # Bumped on every change so derived structures (e.g. the scoring
+        # column store) know when to refresh
+        self.generation = 0
+        self.catalogue = CatalogueSync()
+        # product_id -> generation of its last change, oldest first and
+        # complete back to _changes_from (the last full rebuild); lets derived
+        # structures patch just the products changed since they were built
+        self._changed = {}
+        self._changes_from = 0
+
+    # ------------------------------------------------------------------
+    # Building & maintenance
+    # ------------------------------------------------------------------
+
+    def ensure_built(self):
+        """Build on first use; catch up when another process wrote the catalogue."""
+        catalogue_generation = self.catalogue.behind()
+        if catalogue_generation is None:
+            return
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+            elif self.catalogue.generation != catalogue_generation:
+                self.resync(catalogue_generation)
+
+    def rebuild(self):
+        """(Re)build the whole index from the database."""
+        from product_recommendations.models import Category
+
+        with self._lock:
+            catalogue_generation = get_catalogue_version()[0]
+            self._postings = {}
+            self._docs = {}
+            self._prices = {}
+            self._product_category = {}
+            self._expansions = {}
+            self._categories = dict(Category.objects.values_list("id", "name"))
+
+            for row in self._rows():
+                self._add(row)
+            self._built = True
+            self.generation += 1
+            self._changed = {}
+            self._changes_from = self.generation
+            self.catalogue.synced(catalogue_generation)
+
+    def resync(self, catalogue_generation):
+        """
+        Apply writes made by other processes: re-read the active catalogue and
+        re-index the products whose searchable text, price or category differ.
+        """
+        from product_recommendations.models import Category
+
+        with self._lock:
+            self._categories = dict(Category.objects.values_list("id", "name"))
+            seen = set()
+            changed = set()
+            for row in self._rows():
+                pid = row["id"]
+                seen.add(pid)
+                if (
+                    self._docs.get(pid) != self._fields(row)
+                    or self._prices.get(pid) != float(row["price"])
+                    or self._product_category.get(pid) != row["category_id"]
+                ):
+                    self._remove(pid)
+                    self._add(row)
+                    changed.add(pid)
+            for pid in set(self._docs) - seen:
+                self._remove(pid)
+                changed.add(pid)
+            if changed:
+                self.generation += 1
+                self._mark_changed(changed)
+            self.catalogue.synced(catalogue_generation)
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt from the database on next use."""
+        with self._lock:
+            self._built = False
+            self.generation += 1
+            self._postings = {}
+            self._docs = {}
+            self._prices = {}
+            self._product_category = {}
+            self._categories = {}
+            self._expansions = {}
+            self._changed = {}
+            self._changes_from = self.generation
+            self.catalogue.reset()
+
+    def update_product(self, product):
+        """Re-index a single product instance (removes it when inactive)."""
+        if not self._built:
+            return
+        with self._lock:
+            self.generation += 1
+            self._mark_changed([product.pk])
+            self._remove(product.pk)
+            if product.is_active:
+                if product.category_id not in self._categories:
+                    self._categories[product.category_id] = product.category.name
+                self._add({
+                    "id": product.pk,
+                    "name": product.name,
+                    "base_description": product.base_description,
+                    "brand": product.brand,
+                    "use_case": product.use_case,
+                    "material": product.material,
+                    "price": product.price,
+                    "category_id": product.category_id,
+                })
+
+    def remove_product(self, product_id):
+        if not self._built:
+            return
+        with self._lock:
+            self.generation += 1
+            self._mark_changed([product_id])
+            self._remove(product_id)
+
+    def update_category(self, category):
+        """Rename a category and re-index the category field of its products."""
+        if not self._built:
+            return
+        with self._lock:
+            self.generation += 1
+            self._categories[category.pk] = category.name
+            new_text = (category.name or "").lower()
+            for pid, cid in self._product_category.items():
+                if cid != category.pk:
+                    continue
+                self._mark_changed([pid])
+                old_text = self._docs[pid]["category"]
+                self._unpost(pid, "category", old_text)
+                self._docs[pid]["category"] = new_text
+                self._post(pid, "category", new_text)
+
+    def remove_category(self, category_id):
+        if not self._built:
+            return
+        with self._lock:
+            self.generation += 1
+            self._categories.pop(category_id, None)
+            for pid in [p for p, c in self._product_category.items() if c == category_id]:
+                self._mark_changed([pid])
+                self._remove(pid)
+
+    def _mark_changed(self, product_ids):
+        for pid in product_ids:
+            self._changed.pop(pid, None)
+            self._changed[pid] = self.generation
+
+    def _rows(self):
+        from product_recommendations.models import Product
+
+        return Product.objects.filter(is_active=True).values(
+            "id", "name", "base_description", "brand", "use_case",
+            "material", "price", "category_id",
+        ).iterator(chunk_size=2000)
+
+    def _fields(self, row):
+        category_name = self._categories.get(row["category_id"], "")
+        return {
+            "name": (row["name"] or "").lower(),
+            "base_description": (row["base_description"] or "").lower(),
+            "brand": (row["brand"] or "").lower(),
+            "use_case": (row["use_case"] or "").lower(),
+            "material": (row["material"] or "").lower(),
+            "category": (category_name or "").lower(),
+        }
+
+    def _add(self, row):
+        pid = row["id"]
+        fields = self._fields(row)
+        self._docs[pid] = fields
+        self._prices[pid] = float(row["price"])
+        self._product_category[pid] = row["category_id"]
+        for field, text in fields.items():
+            self._post(pid, field, text)
+
+    def _remove(self, pid):
+        fields = self._docs.pop(pid, None)
+        if fields is None:
+            return
+        for field, text in fields.items():
+            self._unpost(pid, field, text)
+        self._prices.pop(pid, None)
+        self._product_category.pop(pid, None)
+
+    def _post(self, pid, field, text):
+        for token in tokenize(text):
+            if token not in self._postings:
+                self._postings[token] = {}
+                self._expansions = {}
+            tfs = self._postings[token].setdefault(pid, {})
+            tfs[field] = tfs.get(field, 0) + 1
+
+    def _unpost(self, pid, field, text):
+        for token in set(tokenize(text)):
+            posting = self._postings.get(token)
+            if not posting or pid not in posting:
+                continue
+            posting[pid].pop(field, None)
+            if not posting[pid]:
+                del posting[pid]
+            if not posting:
+                del self._postings[token]
+                self._expansions = {}
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def all_ids(self):
+        self.ensure_built()
+        with self._lock:
+            return set(self._docs)
+
+    def category_names(self):
+        self.ensure_built()
+        with self._lock:
+            return [self._categories[cid] for cid in sorted(self._categories)]
+
+    def ids_in_category(self, category_fragment):
+        """Products whose category name contains ``category_fragment``
+        (equivalent of ``category__name__icontains``)."""
+        self.ensure_built()
+        fragment = (category_fragment or "").lower()
+        with self._lock:
+            return {pid for pid, fields in self._docs.items() if fragment in fields["category"]}
+
+    def ids_under_price(self, max_price):
+        self.ensure_built()
+        with self._lock:
+            return {pid for pid, price in self._prices.items() if price <= max_price}
+
+    def match_keywords(self, keywords):
+        """Union of products matching any keyword in any keyword field."""
+        self.ensure_built()
+        matched = set()
+        with self._lock:
+            for kw in keywords or []:
+                matched |= self._match_text(kw, KEYWORD_FIELDS)
+        return matched
+
+    def match_full_query(self, query):
+        """Products containing the whole query string in any searchable field."""
+        self.ensure_built()
+        with self._lock:
+            return self._match_text(query, FULL_QUERY_FIELDS)
+
+    def term_frequencies(self, token):
+        """Per-field term frequencies for an exact vocabulary token."""
+        self.ensure_built()
+        with self._lock:
+            return {pid: dict(tfs) for pid, tfs in self._postings.get(token, {}).items()}
+
+    def expand(self, token):
+        """All vocabulary tokens containing ``token`` as a substring."""
+        self.ensure_built()
+        with self._lock:
+            return self._expand(token)
+
+    def field_texts(self, product_id):
+        """Lowercased searchable text per field for an indexed product."""
+        self.ensure_built()
+        with self._lock:
+            fields = self._docs.get(product_id)
+            return dict(fields) if fields is not None else None
+
+    def price(self, product_id):
+        """Price of an indexed product, or None."""
+        self.ensure_built()
+        with self._lock:
+            return self._prices.get(product_id)
+
+    def changed_since(self, generation):
+        """
+        Ids of products added, changed or removed after index ``generation``,
+        or None when that generation predates the last full rebuild.
+        """
+        self.ensure_built()
+        with self._lock:
+            if generation < self._changes_from:
+                return None
+            changed = set()
+            for pid in reversed(self._changed):
+                if self._changed[pid] <= generation:
+                    break
+                changed.add(pid)
+            return changed
+
+    def snapshot(self):
+        """
+        Consistent copy of the index contents for building derived structures.
+        Returns (generation, {product_id: price}, {token: {product_id: {field: tf}}}).
+        """
+        self.ensure_built()
+        with self._lock:
+            postings = {
+                token: {pid: dict(tfs) for pid, tfs in posting.items()}
+                for token, posting in self._postings.items()
+            }
+            return self.generation, dict(self._prices), postings
+
+    def _expand(self, token):
+        """All vocabulary tokens containing ``token`` as a substring."""
+        expanded = self._expansions.get(token)
+        if expanded is None:
+            expanded = frozenset(v for v in self._postings if token in v)
+            self._expansions[token] = expanded
+        return expanded
+
+    def _match_text(self, text, fields):
+        needle = (text or "").lower().strip()
+        if not needle:
+            return set()
+
+        candidates = None
+        for token in set(tokenize(needle)):
+            ids = set()
+            for vocab_token in self._expand(token):
+                for pid, tfs in self._postings[vocab_token].items():
+                    if any(f in tfs for f in fields):
+                        ids.add(pid)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+
+        if candidates is None:
+            # No alphanumeric token (e.g. "$$"): verify against every document
+            candidates = self._docs.keys()
+
+        return {
+            pid for pid in candidates
+            if any(needle in self._docs[pid][f] for f in fields)
+        }
+
+
+_index = ProductSearchIndex()
+
+
+def get_search_index():
+    """Return the process-wide product search index."""
+    return _index
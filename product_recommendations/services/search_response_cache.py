@@ -0,0 +1,182 @@
+"""
+Full-response cache for ``smart_search_view``.
+
+A search response is a pure function of the query text and the catalogue
+(no personalization), so whole responses are kept in a bounded in-process
+LRU keyed by the normalized query.  Each entry records the catalogue
+generation (see ``catalogue_version``) it was computed at:
+
+- same generation and younger than ``TTL``: served as is (a hit)
+- zero-result responses are cached too, for the shorter ``NEGATIVE_TTL``,
+  so repeated misspellings don't re-run the AI parse and fallback ladder
+- older generation or expired: recomputed, unless ``STALE_WHILE_REVALIDATE``
+  is on and the entry is younger than ``MAX_STALE`` -- then the stale
+  response is served immediately and refreshed in a background thread
+
+Every result carries the catalogue version its payload was computed at, so
+the view can stamp a stale response with that version's validators instead
+of the current ones.
+
+``stats()`` reports hit, stale and negative-hit rates for tuning (also shown
+by the staff-only ``search_cache_stats`` view).  Configured via
+``settings.SMART_SEARCH_RESPONSE_CACHE``.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from product_recommendations.services.caching import TTLLRUCache
+from product_recommendations.services.catalogue_version import get_catalogue_version
+from product_recommendations.services.query_intent_cache import normalize_query
+
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 2048,
+    "TTL": 600,                      # seconds a response stays fresh
+    "NEGATIVE_TTL": 60,              # seconds for responses without results
+    "STALE_WHILE_REVALIDATE": True,
+    "MAX_STALE": 3600,               # oldest response that may be served stale
+    "REFRESH_WORKERS": 2,
+}
+
+_Entry = namedtuple("_Entry", "version created_at payload empty")
+
+# ``version`` is the (generation, updated_at) the payload was computed at
+CachedResponse = namedtuple("CachedResponse", "payload status version")
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "SMART_SEARCH_RESPONSE_CACHE", {})}
+
+
+class SearchResponseCache:
+    """
+    ``get_or_compute(query, compute)`` returns a ``CachedResponse`` where
+    ``compute(query)`` built the payload dict (with a ``results`` list) and
+    status is "hit", "negative_hit", "stale", "miss" or "bypass".
+    """
+
+    def __init__(self, config=None):
+        self._config = config
+        self.entries = TTLLRUCache(max_entries=self.config["MAX_ENTRIES"], ttl=self.config["MAX_STALE"])
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._executor = None
+        self.hits = 0
+        self.negative_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @property
+    def config(self):
+        return self._config or _config()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _store(self, key, version, payload):
+        self.entries.set(key, _Entry(version, time.monotonic(), payload, not payload.get("results")))
+        return payload
+
+    def get_or_compute(self, query, compute):
+        config = self.config
+        key = normalize_query(query)
+        version = get_catalogue_version()
+        if not config["ENABLED"] or not key:
+            return CachedResponse(compute(query), "bypass", version)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.created_at
+            ttl = config["NEGATIVE_TTL"] if entry.empty else config["TTL"]
+            if entry.version[0] == version[0] and age < ttl:
+                self._count("negative_hits" if entry.empty else "hits")
+                return CachedResponse(entry.payload, "negative_hit" if entry.empty else "hit", entry.version)
+            if config["STALE_WHILE_REVALIDATE"] and age < config["MAX_STALE"]:
+                self._count("stale_hits")
+                self._schedule_refresh(key, query, compute)
+                return CachedResponse(entry.payload, "stale", entry.version)
+
+        self._count("misses")
+        return CachedResponse(self._store(key, version, compute(query)), "miss", version)
+
+    # -----------------------------
+    #   Background refresh
+    # -----------------------------
+
+    def _schedule_refresh(self, key, query, compute):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        try:
+            self._submit(self._refresh, key, query, compute)
+        except Exception:
+            with self._lock:
+                self._refreshing.discard(key)
+            raise
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.config["REFRESH_WORKERS"], thread_name_prefix="search-refresh"
+                )
+        return self._executor.submit(fn, *args)
+
+    def _refresh(self, key, query, compute):
+        try:
+            self._store(key, get_catalogue_version(), compute(query))
+            self._count("refreshes")
+        except Exception as e:
+            self._count("refresh_errors")
+            print(f"[search-cache] refresh of {key!r} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+            close_old_connections()
+
+    def clear(self):
+        self.entries.clear()
+        with self._lock:
+            self.hits = self.negative_hits = self.stale_hits = self.misses = 0
+            self.refreshes = self.refresh_errors = 0
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.negative_hits + self.stale_hits
+            lookups = served + self.misses
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "evictions": self.entries.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_response_cache():
+    """Return the process-wide search response cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchResponseCache()
+    return _cache
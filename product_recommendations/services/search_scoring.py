@@ -0,0 +1,227 @@
+"""
+Vectorised keyword scoring for smart search.
+
+The column store is a NumPy snapshot of the product search index:
+
+- one row per indexed product (``row_of`` maps product id -> row)
+- a price column
+- a compressed sparse column (CSC) term-frequency matrix per field, all
+  fields sharing one sparsity structure (``indptr``/``indices``) over the
+  index vocabulary, plus the field-weighted sum used for ranking
+
+Scoring a query is then a single sparse mat-vec: the query becomes a vector
+over the vocabulary and only the columns it touches are visited.  Since
+keywords are matched as substrings (like ``str.count`` on the field text),
+an alphanumeric keyword contributes ``vocab_token.count(keyword)`` to every
+vocabulary token containing it.  Keywords spanning several tokens
+(``"power bank"``) cannot be expressed over single-token columns and are
+counted directly on the stored field text of the candidates.
+
+The snapshot is built on first use.  Products the index changed since then
+are scored the same way from their stored field text, and a fresh snapshot is
+built in a background thread while requests keep using the current one.
+"""
+
+import threading
+
+import numpy as np
+from django.db import close_old_connections
+
+from product_recommendations.services.search_index import get_search_index, tokenize
+
+
+# Field weights used by _score_and_sort_products (name > brand > the rest)
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "brand": 2.0,
+    "base_description": 1.0,
+    "use_case": 1.0,
+    "category": 1.0,
+}
+
+
+class ScoringColumnStore:
+    """NumPy column store derived from a ``ProductSearchIndex`` snapshot."""
+
+    def __init__(self, index):
+        generation, prices, postings = index.snapshot()
+        self.generation = generation
+
+        product_ids = sorted(prices)
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.row_of = {pid: row for row, pid in enumerate(product_ids)}
+        self.prices = np.asarray([prices[pid] for pid in product_ids], dtype=np.float64)
+
+        vocab = sorted(postings)
+        self.column_of = {token: col for col, token in enumerate(vocab)}
+
+        indptr = [0]
+        indices = []
+        field_data = {field: [] for field in FIELD_WEIGHTS}
+        for token in vocab:
+            for pid, tfs in sorted(postings[token].items()):
+                indices.append(self.row_of[pid])
+                for field in FIELD_WEIGHTS:
+                    field_data[field].append(tfs.get(field, 0))
+            indptr.append(len(indices))
+
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.field_tf = {
+            field: np.asarray(values, dtype=np.float32)
+            for field, values in field_data.items()
+        }
+        self.weighted = np.zeros(len(indices), dtype=np.float32)
+        for field, weight in FIELD_WEIGHTS.items():
+            self.weighted += weight * self.field_tf[field]
+
+    def keyword_scores(self, query_vector):
+        """Sparse mat-vec: ``query_vector`` maps column -> coefficient."""
+        scores = np.zeros(len(self.product_ids), dtype=np.float64)
+        for col, coef in query_vector.items():
+            start, end = self.indptr[col], self.indptr[col + 1]
+            scores[self.indices[start:end]] += coef * self.weighted[start:end]
+        return scores
+
+
+_store = None
+_store_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+
+def get_column_store():
+    """
+    Return (store, changed): the current column store and the ids of products
+    the search index changed since it was built, which the store must not be
+    used for.  Only the first build (or one after a full index rebuild) runs
+    inline; otherwise the store is refreshed in the background.
+    """
+    global _store
+    index = get_search_index()
+    index.ensure_built()
+    store = _store
+    changed = index.changed_since(store.generation) if store is not None else None
+    if changed is None:
+        with _store_lock:
+            store = _store
+            changed = index.changed_since(store.generation) if store is not None else None
+            if changed is None:
+                store = _store = ScoringColumnStore(index)
+                changed = set()
+    elif changed and _rebuild_lock.acquire(blocking=False):
+        # Released by the rebuild thread
+        try:
+            _submit(_background_rebuild)
+        except Exception:
+            _rebuild_lock.release()
+            raise
+    return store, changed
+
+
+def _submit(fn):
+    threading.Thread(target=fn, name="column-store-rebuild", daemon=True).start()
+
+
+def _background_rebuild():
+    global _store
+    try:
+        store = ScoringColumnStore(get_search_index())
+        with _store_lock:
+            if _store is None or store.generation > _store.generation:
+                _store = store
+    except Exception as e:
+        print("Column store rebuild error:", e)
+    finally:
+        _rebuild_lock.release()
+        close_old_connections()
+
+
+def _is_single_token(kw):
+    return tokenize(kw) == [kw]
+
+
+def score_product_ids(product_ids, keywords, max_price=None):
+    """
+    Score indexed products by weighted keyword density and price closeness.
+    Returns a float64 array aligned with ``product_ids``; ids missing from the
+    index get NaN so callers can score them another way.
+    """
+    index = get_search_index()
+    store, changed = get_column_store()
+
+    rows = np.fromiter(
+        (-1 if pid in changed else store.row_of.get(pid, -1) for pid in product_ids),
+        dtype=np.int64,
+        count=len(product_ids),
+    )
+    known = rows >= 0
+
+    query_vector = {}
+    phrase_keywords = []
+    text_keywords = []
+    for kw in keywords or []:
+        kw = kw.lower()
+        if not kw:
+            continue
+        text_keywords.append(kw)
+        if _is_single_token(kw):
+            for vocab_token in index.expand(kw):
+                col = store.column_of.get(vocab_token)
+                if col is not None:
+                    query_vector[col] = query_vector.get(col, 0.0) + vocab_token.count(kw)
+        else:
+            phrase_keywords.append(kw)
+
+    scores = np.full(len(product_ids), np.nan, dtype=np.float64)
+    prices = np.full(len(product_ids), np.nan, dtype=np.float64)
+    scores[known] = store.keyword_scores(query_vector)[rows[known]]
+    prices[known] = store.prices[rows[known]]
+
+    if phrase_keywords:
+        for i in np.flatnonzero(known):
+            fields = index.field_texts(product_ids[i]) or {}
+            scores[i] += _text_score(fields, phrase_keywords)
+
+    # Changed since the store was built: every keyword is counted on the text
+    if changed:
+        for i, pid in enumerate(product_ids):
+            if pid not in changed:
+                continue
+            fields = index.field_texts(pid)
+            if fields is not None:
+                scores[i] = _text_score(fields, text_keywords)
+                prices[i] = index.price(pid)
+
+    # small price-based adjustment: prefer items <= max_price, but don't dominate keyword score
+    if max_price:
+        scored = ~np.isnan(scores)
+        scores[scored] += np.where(
+            prices[scored] > max_price,
+            -(prices[scored] - max_price) / (max_price + 1.0),      # small penalty
+            (max_price - prices[scored]) / (max_price + 1.0) * 0.5,  # small bonus
+        )
+
+    return scores
+
+
+def _text_score(fields, keywords):
+    return sum(
+        fields.get(field, "").count(kw) * weight
+        for kw in keywords
+        for field, weight in FIELD_WEIGHTS.items()
+    )
+
+
+def rank_order(scores, top_k=None):
+    """
+    Positions of ``scores`` sorted by descending score; ties keep input order.
+    With ``top_k`` only the best ``top_k`` positions are selected (via
+    ``argpartition``) before sorting.
+    """
+    n = len(scores)
+    positions = np.arange(n)
+    if top_k is not None and top_k < n:
+        if top_k <= 0:
+            return positions[:0]
+        positions = np.argpartition(-scores, top_k - 1)[:top_k]
+    return positions[np.lexsort((positions, -scores[positions]))]
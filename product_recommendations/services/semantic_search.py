@@ -0,0 +1,386 @@
+"""
+Offline semantic retrieval for smart search.
+
+Keyword matching only finds literal words, so "something to charge my phone"
+never reaches a "Power Bank ... portable charging for smartphone users"
+without the AI parse.  This module embeds every active product locally, with
+no network:
+
+- features: the words of name / base_description / use_case / category plus
+  the character 3- and 4-grams of each word (so "charge" meets "charging"
+  and "phone" meets "smartphone"), name features counted twice
+- the hashing trick maps features to ``DIMENSIONS`` signed buckets; counts
+  are damped (1 + log tf) and weighted by an IDF learned over the catalogue
+- query features the catalogue never uses are dropped before hashing, so
+  they cannot collide with unrelated product features
+- rows are L2-normalized and kept in one float32 matrix, so cosine top-k is
+  a single mat-vec plus ``argpartition`` (brute force is fast enough for a
+  catalogue that fits in memory)
+
+Products changed through the ORM are marked dirty by the signal handlers and
+re-embedded in one query the next time the index is used; when another
+process wrote the catalogue (its generation moved on), the products whose
+embedded data differs are found by one more query and re-embedded the same
+way.  The IDF is only relearned by a full rebuild, which happens once more
+than ``REBUILD_RATIO`` of the catalogue changed.  ``hybrid_order`` fuses keyword and semantic
+rankings with reciprocal rank fusion.  Configured via
+``settings.SMART_SEARCH_SEMANTIC``.
+"""
+
+import math
+import threading
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from product_recommendations.services.catalogue_version import CatalogueSync, get_catalogue_version
+from product_recommendations.services.search_index import tokenize
+from product_recommendations.services.search_scoring import rank_order
+
+
+DEFAULTS = {
+    "ENABLED": True,
+    "DIMENSIONS": 1024,       # hashed feature buckets (a power of two); 4 KB per product
+    "TOP_K": 50,              # results of the semantic fallback step
+    "MIN_SIMILARITY": 0.15,   # cosine below which a product is not a semantic match
+    "KEYWORD_WEIGHT": 1.0,    # reciprocal rank fusion weights
+    "SEMANTIC_WEIGHT": 1.0,
+    "RRF_K": 60,
+    "REBUILD_RATIO": 0.25,    # changed share of the catalogue that triggers a full rebuild
+}
+
+# Embedded fields and how often their features are counted
+FIELD_WEIGHTS = {"name": 2, "base_description": 1, "use_case": 1, "category": 1}
+
+NGRAM_SIZES = (3, 4)
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "SMART_SEARCH_SEMANTIC", {})}
+
+
+def semantic_search_enabled():
+    return _config()["ENABLED"]
+
+
+def _features(text):
+    """Words and padded character n-grams of ``text``."""
+    features = []
+    for token in tokenize(text):
+        features.append(token)
+        padded = f"<{token}>"
+        for n in NGRAM_SIZES:
+            features.extend("#" + padded[i:i + n] for i in range(len(padded) - n + 1))
+    return features
+
+
+@lru_cache(maxsize=1 << 18)
+def _bucket(feature, dimensions):
+    """(bucket, sign) of a feature; crc32 is stable across processes."""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h & (dimensions - 1), 1.0 if h & 0x80000000 else -1.0
+
+
+def _feature_counts(fields, field_weights=FIELD_WEIGHTS):
+    counts = defaultdict(int)
+    for field, repeat in field_weights.items():
+        for feature in _features(fields.get(field)):
+            counts[feature] += repeat
+    return counts
+
+
+def _hashed_counts(counts, dimensions):
+    """Signed, damped feature counts of one document: {bucket: weight}."""
+    vector = defaultdict(float)
+    for feature, tf in counts.items():
+        bucket, sign = _bucket(feature, dimensions)
+        vector[bucket] += sign * (1.0 + math.log(tf))
+    return vector
+
+
+def _dense(vector, dimensions, idf):
+    row = np.zeros(dimensions, dtype=np.float32)
+    if vector:
+        buckets = np.fromiter(vector.keys(), dtype=np.int64, count=len(vector))
+        row[buckets] = np.fromiter(vector.values(), dtype=np.float32, count=len(vector))
+    row *= idf
+    norm = np.linalg.norm(row)
+    return row / norm if norm else row
+
+
+def _signature(fields, price, category_id):
+    """What a product's row was embedded from, to spot changes made elsewhere."""
+    return hash((tuple(fields[field] for field in FIELD_WEIGHTS), price, category_id))
+
+
+def embed_documents(documents, field_weights=FIELD_WEIGHTS, dimensions=None):
+    """
+    Embed a list of field dicts the way the index embeds products, with an
+    IDF fitted on ``documents``.  Returns an (n, dimensions) float32 matrix
+    of L2-normalized rows.
+    """
+    dimensions = dimensions or _config()["DIMENSIONS"]
+    vectors = [_hashed_counts(_feature_counts(fields, field_weights), dimensions) for fields in documents]
+    df = np.zeros(dimensions, dtype=np.float64)
+    for vector in vectors:
+        df[list(vector)] += 1
+    idf = (np.log((1.0 + len(vectors)) / (1.0 + df)) + 1.0).astype(np.float32)
+    matrix = np.zeros((len(vectors), dimensions), dtype=np.float32)
+    for row, vector in enumerate(vectors):
+        matrix[row] = _dense(vector, dimensions, idf)
+    return matrix
+
+
+class SemanticIndex:
+    """
+    Normalized float32 embedding matrix of the active catalogue.
+
+    Rows of removed products are zeroed and reused; all public methods are
+    thread-safe (one lock, updates are rare and a search is one mat-vec).
+    """
+
+    def __init__(self, config=None):
+        self._config = config
+        self._lock = threading.RLock()
+        self._built = False
+        self._dirty = set()         # product ids to re-embed
+        self._dirty_categories = set()
+        self._init_storage(0)
+        self.idf = None
+        self.vocabulary = set()   # every feature of the catalogue
+        self.catalogue = CatalogueSync()
+
+    @property
+    def config(self):
+        return self._config or _config()
+
+    def _init_storage(self, capacity):
+        dimensions = self.config["DIMENSIONS"]
+        self.matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.category_ids = np.full(capacity, -1, dtype=np.int64)
+        self.row_of = {}
+        self._signatures = {}   # product id -> _signature() of its embedded row
+        self._free = list(range(capacity - 1, -1, -1))
+
+    # ------------------------------------------------------------------
+    # Building & maintenance
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _documents(product_ids=None):
+        from product_recommendations.models import Product
+
+        products = Product.objects.filter(is_active=True)
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        rows = products.values_list(
+            "id", "name", "base_description", "use_case", "category__name", "price", "category_id"
+        )
+        for pid, name, description, use_case, category, price, category_id in rows.iterator(chunk_size=2000):
+            fields = {"name": name, "base_description": description, "use_case": use_case, "category": category}
+            yield pid, fields, float(price), category_id
+
+    def rebuild(self):
+        """Embed the whole active catalogue and relearn the IDF."""
+        dimensions = self.config["DIMENSIONS"]
+        catalogue_generation = get_catalogue_version()[0]
+        vocabulary = set()
+        documents = []
+        signatures = {}
+        for pid, fields, price, category_id in self._documents():
+            counts = _feature_counts(fields)
+            vocabulary.update(counts)
+            documents.append((pid, _hashed_counts(counts, dimensions), price, category_id))
+            signatures[pid] = _signature(fields, price, category_id)
+        df = np.zeros(dimensions, dtype=np.float64)
+        for _, vector, _, _ in documents:
+            df[list(vector)] += 1
+        idf = (np.log((1.0 + len(documents)) / (1.0 + df)) + 1.0).astype(np.float32)
+
+        with self._lock:
+            self.idf = idf
+            self.vocabulary = vocabulary
+            self._init_storage(len(documents))
+            self._free = []
+            for row, (pid, vector, price, category_id) in enumerate(documents):
+                self.matrix[row] = _dense(vector, dimensions, idf)
+                self.ids[row] = pid
+                self.prices[row] = price
+                self.category_ids[row] = category_id
+                self.row_of[pid] = row
+            self._signatures = signatures
+            self._dirty = set()
+            self._dirty_categories = set()
+            self._built = True
+            self.catalogue.synced(catalogue_generation)
+
+    def invalidate(self):
+        """Drop everything; rebuilt from the database on next use."""
+        with self._lock:
+            self._built = False
+            self._dirty = set()
+            self._dirty_categories = set()
+            self._init_storage(0)
+            self.idf = None
+            self.vocabulary = set()
+            self.catalogue.reset()
+
+    def mark_dirty(self, product_id):
+        """Re-embed (or drop, when inactive or deleted) a product on next use."""
+        with self._lock:
+            if self._built:
+                self._dirty.add(product_id)
+
+    def mark_category_dirty(self, category_id):
+        with self._lock:
+            if self._built:
+                self._dirty_categories.add(category_id)
+
+    def ensure_current(self):
+        """Build the index, or apply pending product changes in one query."""
+        catalogue_generation = self.catalogue.behind()
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+                return
+            if catalogue_generation is not None and catalogue_generation != self.catalogue.generation:
+                self._dirty.update(self._catalogue_changes())
+                self.catalogue.synced(catalogue_generation)
+            if not (self._dirty or self._dirty_categories):
+                return
+            dirty = set(self._dirty)
+            if self._dirty_categories:
+                in_categories = np.isin(self.category_ids, list(self._dirty_categories))
+                dirty.update(int(pid) for pid in self.ids[in_categories & (self.ids >= 0)])
+            if len(dirty) > self.config["REBUILD_RATIO"] * max(len(self.row_of), 1):
+                self.rebuild()
+                return
+            self._dirty = set()
+            self._dirty_categories = set()
+            self._apply(dirty)
+
+    def _catalogue_changes(self):
+        """Ids whose embedded data no longer matches the database."""
+        seen = set()
+        changed = set()
+        for pid, fields, price, category_id in self._documents():
+            seen.add(pid)
+            if self._signatures.get(pid) != _signature(fields, price, category_id):
+                changed.add(pid)
+        changed.update(set(self.row_of) - seen)
+        return changed
+
+    def _apply(self, product_ids):
+        dimensions = self.config["DIMENSIONS"]
+        seen = set()
+        for pid, fields, price, category_id in self._documents(product_ids):
+            seen.add(pid)
+            row = self.row_of.get(pid)
+            if row is None:
+                row = self._allocate()
+                self.row_of[pid] = row
+                self.ids[row] = pid
+            counts = _feature_counts(fields)
+            self.vocabulary.update(counts)
+            self.matrix[row] = _dense(_hashed_counts(counts, dimensions), dimensions, self.idf)
+            self.prices[row] = price
+            self.category_ids[row] = category_id
+            self._signatures[pid] = _signature(fields, price, category_id)
+        for pid in set(product_ids) - seen:
+            self._signatures.pop(pid, None)
+            row = self.row_of.pop(pid, None)
+            if row is not None:
+                self.matrix[row] = 0.0
+                self.ids[row] = -1
+                self.category_ids[row] = -1
+                self._free.append(row)
+
+    def _allocate(self):
+        if not self._free:
+            capacity = len(self.ids)
+            grow = max(capacity, 64)
+            self.matrix = np.vstack([self.matrix, np.zeros((grow, self.matrix.shape[1]), dtype=np.float32)])
+            self.ids = np.concatenate([self.ids, np.full(grow, -1, dtype=np.int64)])
+            self.prices = np.concatenate([self.prices, np.zeros(grow, dtype=np.float64)])
+            self.category_ids = np.concatenate([self.category_ids, np.full(grow, -1, dtype=np.int64)])
+            self._free = list(range(capacity + grow - 1, capacity - 1, -1))
+        return self._free.pop()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def embed_query(self, text):
+        """Normalized query vector (all zeros when nothing is embeddable)."""
+        self.ensure_current()
+        dimensions = self.config["DIMENSIONS"]
+        counts = defaultdict(float)
+        for feature in _features(text):
+            if feature not in self.vocabulary:
+                continue   # would only meet unrelated features in its bucket
+            bucket, sign = _bucket(feature, dimensions)
+            counts[bucket] += sign
+        return _dense(counts, dimensions, self.idf)
+
+    def similarities(self, product_ids, query_vector):
+        """Cosine similarity of each product to a vector from ``embed_query``
+        (0 for products that are not indexed)."""
+        with self._lock:
+            rows = np.fromiter(
+                (self.row_of.get(pid, -1) for pid in product_ids), dtype=np.int64, count=len(product_ids)
+            )
+            known = rows >= 0
+            scores = np.zeros(len(product_ids), dtype=np.float32)
+            scores[known] = self.matrix[rows[known]] @ query_vector
+        return scores
+
+    def search(self, query_vector, top_k=None, min_similarity=None, max_price=None):
+        """
+        ``[(product_id, similarity)]`` of the best matches, best first, with
+        similarity >= ``min_similarity`` and, when given, price <= ``max_price``.
+        """
+        config = self.config
+        top_k = config["TOP_K"] if top_k is None else top_k
+        min_similarity = config["MIN_SIMILARITY"] if min_similarity is None else min_similarity
+        with self._lock:
+            scores = self.matrix @ query_vector
+            eligible = (self.ids >= 0) & (scores >= min_similarity)
+            if max_price is not None:
+                eligible &= self.prices <= max_price
+            positions = np.flatnonzero(eligible)
+            order = rank_order(scores[positions], top_k)
+            return [(int(self.ids[positions[i]]), float(scores[positions[i]])) for i in order]
+
+    def __len__(self):
+        return len(self.row_of)
+
+
+def hybrid_order(product_ids, keyword_scores, semantic_scores, top_k=None, config=None):
+    """
+    ``product_ids`` ordered by reciprocal rank fusion of their keyword and
+    semantic rankings: ``w / (RRF_K + rank)`` summed over both lists, so the
+    two score scales never have to be compared.  Ties keep input order.
+    """
+    config = config or _config()
+    n = len(product_ids)
+    if not n:
+        return []
+    fused = np.zeros(n, dtype=np.float64)
+    for scores, weight in ((keyword_scores, config["KEYWORD_WEIGHT"]), (semantic_scores, config["SEMANTIC_WEIGHT"])):
+        ranks = np.empty(n, dtype=np.float64)
+        ranks[rank_order(np.asarray(scores, dtype=np.float64))] = np.arange(n)
+        fused += weight / (config["RRF_K"] + ranks)
+    return [product_ids[i] for i in rank_order(fused, top_k)]
+
+
+_index = SemanticIndex()
+
+
+def get_semantic_index():
+    """Return the process-wide semantic product index."""
+    return _index
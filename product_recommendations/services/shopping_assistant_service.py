@@ -11,13 +11,11 @@ This file is retained for reference only and is not used
 by the current application flow.
 """
 
-from openai import OpenAI
 from product_recommendations.models import Product
+from product_recommendations.services.llm_gateway import get_llm_client
 from product_recommendations.services.smart_search_service import smart_search_products
 
 
-client = OpenAI()
-
 def handle_chat_message(user, message):
     print("🔥 NEW CHATBOT LOGIC EXECUTED 🔥")
     
@@ -84,8 +82,11 @@ Matching products:
 Respond concisely and helpfully.
 """
 
+    client = get_llm_client("chat")
+    if client is None:
+        return "\n".join(product_lines)
+
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a helpful shopping assistant."},
             {"role": "user", "content": prompt}
@@ -0,0 +1,260 @@
+"""
+Precomputed "similar products" for the product detail page.
+
+Similarity is content-based and symmetric, a weighted sum of:
+
+- text: cosine of hashed n-gram embeddings of base_description + use_case
+  (the same embedding as ``semantic_search``, IDF fitted per run)
+- category: 1 when both products share a category
+- brand: 1 when both have the same (non-empty) brand
+- price band: 1 in the same log-price band (bands grow by
+  ``PRICE_BAND_RATIO``), 0.5 in an adjacent one, ~0.07 two bands apart
+
+Neighbours are found with blocked matrix multiplication: ``BLOCK_SIZE`` query
+rows at a time are scored against the whole catalogue (one float32 GEMM over
+the concatenated features, plus the brand matches) and the best ``TOP_K`` per row
+are picked with ``argpartition``, so memory stays at BLOCK_SIZE x catalogue
+and 100k products take minutes.  Results are stored as ``SimilarProduct``
+rows, one per (product, rank).
+
+``refresh_similar_products`` updates the lists after products changed: the
+changed products get new lists, and so does every product whose list held a
+changed product or whose current k-th score a changed product now beats
+(scores are symmetric, so that is read off the changed products' own
+scores).  Product saves queue it through the job queue; the
+``build_similar_products`` command runs a full build.  Configured via
+``settings.SIMILAR_PRODUCTS``.
+"""
+
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from product_recommendations.models import Product, SimilarProduct
+from product_recommendations.services.job_queue import enqueue_job
+from product_recommendations.services.semantic_search import embed_documents
+
+
+DEFAULTS = {
+    "TOP_K": 8,
+    "BLOCK_SIZE": 256,         # query rows scored per matrix multiplication
+    "DIMENSIONS": 256,         # text embedding width
+    "PRICE_BAND_RATIO": 1.5,   # upper / lower price of one band
+    "WEIGHTS": {"text": 0.5, "category": 0.25, "brand": 0.1, "price": 0.15},
+    "REFRESH_DELAY": 60,       # seconds a queued refresh waits, so bursts of edits coalesce
+}
+
+TEXT_FIELDS = {"base_description": 1, "use_case": 1}
+
+# Price-band encoding weight of the two adjacent bands: products one band
+# apart score 0.5 (2a / (1 + 2a^2) with a = 1 - sqrt(1/2)), two apart ~0.07
+PRICE_NEIGHBOUR = 1.0 - math.sqrt(0.5)
+
+# Product fields that feed the features (saves touching none of them are ignored)
+FEATURE_FIELDS = {"base_description", "use_case", "category", "category_id", "brand", "price", "is_active"}
+
+
+def _config():
+    config = {**DEFAULTS, **getattr(settings, "SIMILAR_PRODUCTS", {})}
+    config["WEIGHTS"] = {**DEFAULTS["WEIGHTS"], **config["WEIGHTS"]}
+    return config
+
+
+def _codes(values):
+    """Integer code per value; empty values get -1 and never match."""
+    codes = {}
+    return np.fromiter(
+        (codes.setdefault(v, len(codes)) if v else -1 for v in values), dtype=np.int32, count=len(values)
+    )
+
+
+class ContentFeatures:
+    """
+    Feature matrix of the active catalogue, one row per product in id order.
+
+    Text, category and price band are concatenated into one float32 matrix,
+    each part scaled by the square root of its weight, so a single dot
+    product yields their weighted sum; brand matches are added per row from
+    the (short) member list of the row's brand.
+    """
+
+    def __init__(self, rows, config=None):
+        self.config = config or _config()
+        weights = self.config["WEIGHTS"]
+        n = len(rows)
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        self.row_of = {int(pid): i for i, pid in enumerate(self.ids)}
+
+        text = embed_documents(
+            [{"base_description": r[1], "use_case": r[2]} for r in rows],
+            TEXT_FIELDS,
+            self.config["DIMENSIONS"],
+        )
+        categories = _codes([r[3] for r in rows])
+        category = np.zeros((n, int(categories.max(initial=-1)) + 1), dtype=np.float32)
+        category[np.arange(n), categories] = 1.0
+
+        log_ratio = math.log(self.config["PRICE_BAND_RATIO"])
+        bands = np.fromiter(
+            (math.floor(math.log(max(float(r[5]), 0.01)) / log_ratio) for r in rows), dtype=np.int64, count=n
+        )
+        bands -= bands.min(initial=0) - 1   # leave room for the lower neighbour band
+        price = np.zeros((n, int(bands.max(initial=0)) + 2), dtype=np.float32)
+        rows_n = np.arange(n)
+        price[rows_n, bands] = 1.0
+        price[rows_n, bands - 1] = PRICE_NEIGHBOUR
+        price[rows_n, bands + 1] = PRICE_NEIGHBOUR
+        price /= np.linalg.norm(price, axis=1, keepdims=True)
+
+        self.matrix = np.hstack([
+            text * np.float32(math.sqrt(weights["text"])),
+            category * np.float32(math.sqrt(weights["category"])),
+            price * np.float32(math.sqrt(weights["price"])),
+        ])
+        self.brand_weight = np.float32(weights["brand"])
+        self.brands = _codes([(r[4] or "").strip().lower() for r in rows])
+        order = np.argsort(self.brands, kind="stable")
+        starts = np.searchsorted(self.brands[order], np.arange(int(self.brands.max(initial=-1)) + 1))
+        self.brand_members = np.split(order, starts)[1:]   # drop the products without a brand
+
+    @classmethod
+    def load(cls, config=None):
+        rows = list(
+            Product.objects.filter(is_active=True).order_by("id")
+            .values_list("id", "base_description", "use_case", "category_id", "brand", "price")
+        )
+        return cls(rows, config)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, rows):
+        """(len(rows), catalogue) float32 similarities; a product's own column is -inf."""
+        scores = self.matrix[rows] @ self.matrix.T
+        for i, row in enumerate(rows):
+            brand = self.brands[row]
+            if brand >= 0:
+                scores[i, self.brand_members[brand]] += self.brand_weight
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return scores
+
+    def blocks(self, rows):
+        """``(block_rows, scores)`` over ``rows`` in blocks of BLOCK_SIZE."""
+        rows = np.asarray(rows, dtype=np.int64)
+        size = self.config["BLOCK_SIZE"]
+        for start in range(0, len(rows), size):
+            block = rows[start:start + size]
+            yield block, self.scores(block)
+
+    def neighbours(self, block_scores, top_k):
+        """Best ``top_k`` columns per row of ``block_scores``: [(cols, scores)]."""
+        k = min(top_k, len(self) - 1)
+        if k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))] * len(block_scores)
+        best = np.argpartition(-block_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(block_scores, best, axis=1)
+        order = np.lexsort((best, -best_scores), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return list(zip(best, best_scores))
+
+
+def _store(features, block, neighbour_lists):
+    """Replace the stored lists of the products in ``block``."""
+    product_ids = [int(features.ids[row]) for row in block]
+    links = [
+        SimilarProduct(product_id=pid, similar_id=int(features.ids[col]), rank=rank, score=float(score))
+        for pid, (cols, scores) in zip(product_ids, neighbour_lists)
+        for rank, (col, score) in enumerate(zip(cols, scores))
+    ]
+    with transaction.atomic():
+        SimilarProduct.objects.filter(product_id__in=product_ids).delete()
+        SimilarProduct.objects.bulk_create(links, batch_size=2000)
+
+
+def _compute(features, rows, top_k, log=None):
+    done = 0
+    for block, scores in features.blocks(rows):
+        _store(features, block, features.neighbours(scores, top_k))
+        done += len(block)
+        if log:
+            log(done, len(rows))
+    return done
+
+
+def build_similar_products(log=None):
+    """Recompute every active product's neighbours. Returns the product count."""
+    config = _config()
+    features = ContentFeatures.load(config)
+    written = _compute(features, np.arange(len(features)), config["TOP_K"], log)
+    # Lists of products that are no longer active
+    SimilarProduct.objects.filter(product__is_active=False).delete()
+    return written
+
+
+def refresh_similar_products(product_ids=()):
+    """
+    Update the neighbour lists affected by changes to ``product_ids``
+    (saved, deactivated or deleted), and complete lists that lost entries to
+    deleted products.  Returns the number of lists rewritten.
+    """
+    config = _config()
+    top_k = config["TOP_K"]
+    product_ids = set(product_ids)
+    features = ContentFeatures.load(config)
+
+    changed = sorted(features.row_of[pid] for pid in product_ids if pid in features.row_of)
+    gone = [pid for pid in product_ids if pid not in features.row_of]
+    SimilarProduct.objects.filter(product_id__in=gone).delete()
+
+    # Lists that currently hold a changed product
+    affected = set(changed)
+    for pid in SimilarProduct.objects.filter(similar_id__in=product_ids).values_list("product_id", flat=True):
+        if pid in features.row_of:
+            affected.add(features.row_of[pid])
+
+    # Lists shortened by the cascade when a neighbour was deleted
+    expected = min(top_k, len(features) - 1)
+    short = (
+        SimilarProduct.objects.values("product_id").annotate(n=Count("id"))
+        .filter(n__lt=expected).values_list("product_id", flat=True)
+    )
+    affected.update(features.row_of[pid] for pid in short if pid in features.row_of)
+
+    # Lists a changed product now gets into: its score beats their k-th one
+    if changed:
+        kth = np.full(len(features), -np.inf, dtype=np.float32)
+        for pid, score in SimilarProduct.objects.filter(rank=top_k - 1).values_list("product_id", "score"):
+            if pid in features.row_of:
+                kth[features.row_of[pid]] = score
+        for block, scores in features.blocks(changed):
+            affected.update(np.flatnonzero(scores.max(axis=0) > kth).tolist())
+
+    return _compute(features, sorted(affected), top_k)
+
+
+def queue_similar_products_refresh(product=None, update_fields=None):
+    """
+    Queue a refresh after ``product`` was saved (skipped when
+    ``update_fields`` shows no feature changed) or, with no product, after
+    products were deleted.
+    """
+    if update_fields is not None and not FEATURE_FIELDS & set(update_fields):
+        return None
+    return enqueue_job("similar_products", product, delay=_config()["REFRESH_DELAY"])
+
+
+def similar_products_for(product, limit=None):
+    """Active neighbours of ``product``, best first (one query)."""
+    links = (
+        SimilarProduct.objects
+        .filter(product=product, similar__is_active=True)
+        .select_related("similar")
+        .order_by("rank")
+    )
+    if limit is not None:
+        links = links[:limit]
+    return [link.similar for link in links]
@@ -1,12 +1,18 @@
-import os
 import re
-from django.db.models import Q
-from product_recommendations.models import Product
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+from django.conf import settings
 
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+from product_recommendations.models import Product
+from product_recommendations.services.llm_gateway import get_llm_client
+from product_recommendations.services.fulltext_search import fulltext_search_backend
+from product_recommendations.services.query_intent_cache import get_intent_cache
+from product_recommendations.services.search_index import get_search_index
+from product_recommendations.services.search_scoring import rank_order, score_product_ids
+from product_recommendations.services.semantic_search import get_semantic_index, hybrid_order, semantic_search_enabled
 
 GENERIC_KEYWORDS = {
     "product", "products",
@@ -15,19 +21,27 @@ GENERIC_KEYWORDS = {
     "stuff"
 }
 
+# Known multi-word phrases to detect in queries (lowercase); also offered by autocomplete
+KNOWN_PHRASES = {"power bank", "hair dryer", "air fryer", "webcam", "vacuum", "sunscreen", "vitamin c", "water bottle", "resistance band", "protein shaker"}
+
 
 def _get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or OpenAI is None:
-        return None
-    return OpenAI(api_key=api_key)
+    return get_llm_client("smart_search")
 
 
 def _parse_query_with_ai(query):
     """Use OpenAI to parse a natural language query into structured params.
     Returns dict {category: str|None, max_price: float|None, keywords: [str]}
     If the API is not available or parsing fails, returns None to let fallback run.
+
+    Successful parses are cached per normalised query (see query_intent_cache),
+    so repeated queries skip the OpenAI round trip entirely.
     """
+    intent_cache = get_intent_cache()
+    cached = intent_cache.get(query)
+    if cached is not None:
+        return cached
+
     client = _get_openai_client()
     if client is None:
         return None
@@ -52,7 +66,6 @@ Notes:
 
     try:
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.0
         )
@@ -71,7 +84,7 @@ Notes:
     try:
         import json
         parsed = json.loads(m.group(0))
-        return {
+        intent = {
             "category": parsed.get("category") or None,
             "max_price": float(parsed.get("max_price")) if parsed.get("max_price") not in (None, "") else None,
             "keywords": parsed.get("keywords") or []
@@ -79,6 +92,9 @@ Notes:
     except Exception:
         return None
 
+    intent_cache.set(query, intent)
+    return intent
+
 
 def _parse_query_fallback(query):
     """Fallback heuristic parser: extract 'under $X' price and basic keywords/categories.
@@ -104,9 +120,6 @@ def _parse_query_fallback(query):
     tokens = re.findall(r"[a-z0-9]+", q)
     tokens = [t for t in tokens if t not in stop and not re.match(r"\d+", t)]
 
-    # Known multi-word phrases to detect in queries (lowercase)
-    KNOWN_PHRASES = {"power bank", "hair dryer", "air fryer", "webcam", "vacuum", "sunscreen", "vitamin c", "water bottle", "resistance band", "protein shaker"}
-
     keywords = []
     i = 0
     while i < len(tokens):
@@ -129,88 +142,209 @@ def _parse_query_fallback(query):
     return {"category": None, "max_price": max_price, "keywords": keywords}
 
 
-def _score_and_sort_products(products, keywords, max_price=None):
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+
+def _get_parse_executor():
+    global _parse_executor
+    if _parse_executor is None:
+        with _parse_executor_lock:
+            if _parse_executor is None:
+                _parse_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "SMART_SEARCH_PARSE_WORKERS", 8),
+                    thread_name_prefix="smart-search-parse",
+                )
+    return _parse_executor
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+
+def _parse_query(query):
+    """Parse a query according to settings.SMART_SEARCH_PARSE_MODE.
+
+    - "sequential": AI parse first, heuristic parse only if the AI call fails.
+    - "race": start the AI parse on a worker thread, run the heuristic parse
+      meanwhile and use the AI result only if it arrives within
+      SMART_SEARCH_AI_DEADLINE_MS. A late AI answer still lands in the intent
+      cache, so the next identical query gets it immediately.
+    - "local": no AI call. An intent the AI parsed earlier is still taken
+      from the intent cache; otherwise the heuristic parse is used and
+      vocabulary gaps are left to the semantic stage of smart_search_products.
+
+    Returns (params, used_ai, parse_info) where parse_info records which parser
+    won and how long each one took (None = did not run / still running).
+    """
+    mode = getattr(settings, "SMART_SEARCH_PARSE_MODE", "sequential")
+    info = {"mode": mode, "parser": None, "ai_ms": None, "heuristic_ms": None, "ai_status": None}
+
+    if mode == "local":
+        params = get_intent_cache().get(query)
+        if params is not None:
+            info["parser"] = "ai"
+            info["ai_status"] = "cached"
+            return params, True, info
+        params, info["heuristic_ms"] = _timed(_parse_query_fallback, query)
+        info["parser"] = "heuristic"
+        info["ai_status"] = "skipped"
+        return params, False, info
+
+    if mode != "race":
+        params, info["ai_ms"] = _timed(_parse_query_with_ai, query)
+        info["ai_status"] = "ok" if params is not None else "failed"
+        if params is not None:
+            info["parser"] = "ai"
+            return params, True, info
+        params, info["heuristic_ms"] = _timed(_parse_query_fallback, query)
+        info["parser"] = "heuristic"
+        return params, False, info
+
+    deadline = getattr(settings, "SMART_SEARCH_AI_DEADLINE_MS", 250) / 1000.0
+    started = time.perf_counter()
+    future = _get_parse_executor().submit(_timed, _parse_query_with_ai, query)
+
+    heuristic, info["heuristic_ms"] = _timed(_parse_query_fallback, query)
+
+    remaining = deadline - (time.perf_counter() - started)
+    try:
+        params, info["ai_ms"] = future.result(timeout=max(remaining, 0))
+    except FutureTimeoutError:
+        info["ai_status"] = "late"
+        params = None
+    except Exception:
+        info["ai_status"] = "failed"
+        params = None
+    else:
+        info["ai_status"] = "ok" if params is not None else "failed"
+
+    if params is not None:
+        info["parser"] = "ai"
+        return params, True, info
+
+    info["parser"] = "heuristic"
+    return heuristic, False, info
+
+
+def _score_product(p, keywords, max_price=None):
+    """Pure-Python scoring for a single product (used for products the
+    search index does not hold, e.g. inactive ones)."""
+    s = 0.0
+    name = (p.name or "").lower()
+    desc = (p.base_description or "").lower()
+    brand = (p.brand or "").lower()
+    use_case = (p.use_case or "").lower()
+    category = (getattr(p.category, 'name', '') or "").lower()
+
+    for kw in keywords or []:
+        kw = kw.lower()
+        s += name.count(kw) * 3.0
+        s += brand.count(kw) * 2.0
+        s += desc.count(kw) * 1.0
+        s += use_case.count(kw) * 1.0
+        s += category.count(kw) * 1.0
+
+    # small price-based adjustment: prefer items <= max_price, but don't dominate keyword score
+    if max_price:
+        try:
+            price = float(p.price)
+            if price > max_price:
+                s -= (price - max_price) / (max_price + 1.0)  # small penalty
+            else:
+                s += (max_price - price) / (max_price + 1.0) * 0.5  # small bonus
+        except Exception:
+            pass
+    return s
+
+
+def _score_and_sort_products(products, keywords, max_price=None, top_k=None):
     """Score products by keyword density (weighted by field) and slight price closeness.
 
     - Name matches are weighted highest, then brand, then description/use_case/category.
     - If max_price is provided, penalize products that exceed it slightly and give a
       small bonus to products comfortably below it.
+    - If top_k is provided, only the top_k best products are returned.
     Returns a list of product instances sorted by descending score.
-    """
-    def _score(p):
-        s = 0.0
-        name = (p.name or "").lower()
-        desc = (p.base_description or "").lower()
-        brand = (p.brand or "").lower()
-        use_case = (p.use_case or "").lower()
-        category = (getattr(p.category, 'name', '') or "").lower()
-
-        for kw in keywords or []:
-            kw = kw.lower()
-            s += name.count(kw) * 3.0
-            s += brand.count(kw) * 2.0
-            s += desc.count(kw) * 1.0
-            s += use_case.count(kw) * 1.0
-            s += category.count(kw) * 1.0
-
-        # small price-based adjustment: prefer items <= max_price, but don't dominate keyword score
-        if max_price:
-            try:
-                price = float(p.price)
-                if price > max_price:
-                    s -= (price - max_price) / (max_price + 1.0)  # small penalty
-                else:
-                    s += (max_price - price) / (max_price + 1.0) * 0.5  # small bonus
-            except Exception:
-                pass
-        return s
 
+    Scores come from the NumPy column store in ``search_scoring`` (one sparse
+    mat-vec per call); products missing from the search index fall back to
+    per-product Python scoring.
+    """
     prods = list(products)
-    scored = [(_score(p), p) for p in prods]
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [p for score, p in scored]
+    if not prods:
+        return []
+
+    scores = score_product_ids([p.id for p in prods], keywords, max_price)
+    for i in np.flatnonzero(np.isnan(scores)):
+        scores[i] = _score_product(prods[i], keywords, max_price)
+
+    return [prods[i] for i in rank_order(scores, top_k)]
+
 
+def _fetch_products(ids):
+    """Load products for ``ids`` with one ``in_bulk`` query, preserving order."""
+    ids = list(ids)
+    if not ids:
+        return []
+    by_id = Product.objects.select_related("category").in_bulk(ids)
+    return [by_id[pid] for pid in ids if pid in by_id]
 
-def smart_search_products(query, user=None, return_metadata=False):
+
+def _map_category(parsed_category, all_cats):
+    """Map an AI-parsed category onto an existing Category name (or None)."""
+    parsed_lc = parsed_category.lower()
+    # try contains match first
+    for name in all_cats:
+        if parsed_lc in name.lower():
+            return name
+    # fuzzy match against available category names
+    import difflib
+    matches = difflib.get_close_matches(parsed_category, all_cats, n=1, cutoff=0.6)
+    return matches[0] if matches else None
+
+
+def smart_search_products(query, user=None, return_metadata=False, limit=None):
     """
-    Smart search using AI extraction + database filters.
-    When return_metadata is True -> returns (qs_or_list, meta_dict) where meta_dict contains
+    Smart search using AI extraction + the product search index.
+    When return_metadata is True -> returns (products, meta_dict) where meta_dict contains
     parsed params and applied_filters to enable UI transparency.
+    When limit is given, at most that many products are returned (ranked steps
+    only select the top `limit` instead of sorting every candidate).
+
+    Every step of the fallback ladder is evaluated as set operations over the
+    in-memory index, or -- with ``settings.SMART_SEARCH_BACKEND = "fulltext"``
+    -- over the result of one full-text query that carries the category and
+    price flags (see ``fulltext_search``); the winning product ids are loaded
+    with a single ``in_bulk`` query.
+
+    With ``settings.SMART_SEARCH_SEMANTIC["ENABLED"]`` every returned step is
+    ordered by a hybrid of its keyword ranking and the cosine similarity of
+    the local product embeddings (see ``semantic_search``), and a query that
+    matches nothing literally falls back to the nearest products by meaning.
     """
     if not query:
-        return (Product.objects.filter(is_active=True), {"parsed": None, "applied_filters": {}}) if return_metadata else Product.objects.filter(is_active=True)
+        all_products = Product.objects.filter(is_active=True).select_related("category")
+        return (all_products, {"parsed": None, "applied_filters": {}}) if return_metadata else all_products
 
     query = query.strip()
+    backend = fulltext_search_backend()
+    index = get_search_index() if backend is None else backend
 
-    params = _parse_query_with_ai(query)
-    used_ai = True
-    if params is None:
-        params = _parse_query_fallback(query)
-        used_ai = False
+    params, used_ai, parse_info = _parse_query(query)
 
     parsed_category = params.get("category") if params else None
     max_price = params.get("max_price") if params else None
     keywords = params.get("keywords") if params else []
 
-    # Try to map the parsed category to an existing Category name in the DB
+    # Try to map the parsed category to an existing Category name
     mapped_category = None
     original_category = parsed_category
     if parsed_category:
         try:
-            from product_recommendations.models import Category
-            # try exact/contains match first
-            cat_qs = Category.objects.filter(name__icontains=parsed_category)
-            if cat_qs.exists():
-                mapped_category = cat_qs.first().name
-            else:
-                # fuzzy match against available category names
-                import difflib
-                all_cats = [c.name for c in Category.objects.all()]
-                matches = difflib.get_close_matches(parsed_category, all_cats, n=1, cutoff=0.6)
-                if matches:
-                    mapped_category = matches[0]
-                else:
-                    mapped_category = None
+            mapped_category = _map_category(parsed_category, index.category_names())
         except Exception:
             mapped_category = None
 
@@ -235,8 +369,6 @@ def smart_search_products(query, user=None, return_metadata=False):
                 if tk and tk not in keywords:
                     keywords.append(tk)
 
-    base_qs = Product.objects.filter(is_active=True)
-
     # Debug log
     try:
         print(f"[smart_search] query={query!r} used_ai={used_ai} parsed_category={parsed_category!r} mapped_category={mapped_category!r} max_price={max_price!r} keywords={keywords!r}")
@@ -249,127 +381,161 @@ def smart_search_products(query, user=None, return_metadata=False):
         if kw.lower() not in GENERIC_KEYWORDS
     ]
 
-
-    # Build keyword filter Q
-    keyword_q = None
-    if meaningful_keywords:
-        keyword_q = Q()
-        for kw in meaningful_keywords:
-            keyword_q |= Q(name__icontains=kw)
-            keyword_q |= Q(base_description__icontains=kw)
-            keyword_q |= Q(brand__icontains=kw)
-            keyword_q |= Q(use_case__icontains=kw)
-            keyword_q |= Q(category__name__icontains=kw)
+    if backend is not None:
+        # One indexed query: keyword matches (every active product when there
+        # are none) flagged with the category and price filters
+        candidates = backend.candidates(meaningful_keywords, mapped_category, max_price)
+        keyword_ids = candidates.keyword_ids()
+    else:
+        # Keyword filter: products matching any keyword in any searchable field
+        candidates = None
+        keyword_ids = index.match_keywords(meaningful_keywords) if meaningful_keywords else None
 
     applied = {
         "category_used": False,
         "max_price_used": False,
         "price_relaxed": False,
         "used_ai": used_ai,
+        "parser": parse_info["parser"],
+        "parse_timings_ms": {"ai": parse_info["ai_ms"], "heuristic": parse_info["heuristic_ms"]},
+        "ai_parse_status": parse_info["ai_status"],
     }
-    
+
     applied["keywords_used"] = bool(meaningful_keywords)
     applied["ignored_keywords"] = [
         kw for kw in keywords
         if kw.lower() not in {mk.lower() for mk in meaningful_keywords}
     ]
-       
+
+    semantic_index = get_semantic_index() if semantic_search_enabled() else None
+    query_vector = semantic_index.embed_query(query) if semantic_index is not None else None
+    if query_vector is not None and not query_vector.any():
+        query_vector = None   # nothing in the query the catalogue knows
+    applied["hybrid_ranking"] = query_vector is not None
+    applied["semantic_fallback"] = False
+
+    def _result(products):
+        if return_metadata:
+            return products, {"parsed": {"category": original_category, "mapped_category": mapped_category, "max_price": max_price, "keywords": keywords}, "applied_filters": applied}
+        return products
+
+    def _hybrid(ids, ranking=None):
+        ids = sorted(ids)
+        ranking = ranking or candidates
+        if ranking is not None:
+            keyword_scores = ranking.scores(ids, max_price)
+        else:
+            keyword_scores = np.nan_to_num(score_product_ids(ids, keywords, max_price), nan=0.0)
+        similarities = semantic_index.similarities(ids, query_vector)
+        return _fetch_products(hybrid_order(ids, keyword_scores, similarities, top_k=limit))
+
+    def _ranked(ids, ranking=None):
+        if query_vector is not None:
+            return _hybrid(ids, ranking)
+        ranking = ranking or candidates
+        if ranking is not None:
+            return _fetch_products(ranking.rank(ids, max_price, top_k=limit))
+        return _score_and_sort_products(_fetch_products(sorted(ids)), keywords, max_price, top_k=limit)
+
+    def _unranked(ids, ranking=None):
+        if query_vector is not None:
+            return _hybrid(ids, ranking)
+        return _fetch_products(sorted(ids)[:limit])
+
+    if candidates is not None:
+        # With keywords this is the keyword matches only, which is all any
+        # ladder step intersects it with
+        all_ids = candidates.all_ids()
+        price_ids = candidates.price_ids() if max_price is not None else None
+        category_ids = candidates.category_ids() if mapped_category else None
+    else:
+        all_ids = index.all_ids()
+        price_ids = index.ids_under_price(max_price) if max_price is not None else None
+        category_ids = index.ids_in_category(mapped_category) if mapped_category else None
 
     # 1) Try strict application: category + price + keywords
-    qs = base_qs
-    if mapped_category:
-        qs = qs.filter(category__name__icontains=mapped_category)
+    ids = all_ids
+    if category_ids is not None:
+        ids = ids & category_ids
         applied["category_used"] = True
 
-    if max_price is not None:
-        qs = qs.filter(price__lte=max_price)
+    if price_ids is not None:
+        ids = ids & price_ids
         applied["max_price_used"] = True
 
-    if keyword_q is not None:
-        qs = qs.filter(keyword_q)
+    if keyword_ids is not None:
+        ids = ids & keyword_ids
 
     try:
-        print(f"[smart_search] strict-check count={qs.count()}")
+        print(f"[smart_search] strict-check count={len(ids)}")
     except Exception:
         pass
 
-    if qs.exists():
-        if return_metadata:
-            return qs.distinct(), {"parsed": {"category": original_category, "mapped_category": mapped_category, "max_price": max_price, "keywords": keywords}, "applied_filters": applied}
-        return qs.distinct()
+    if ids:
+        return _result(_unranked(ids))
 
     # 2) If price was applied but no results, try keywords-only with price (ignore category)
-    if max_price is not None and keyword_q is not None:
-        qs_kw_price = base_qs.filter(price__lte=max_price).filter(keyword_q)
+    if price_ids is not None and keyword_ids is not None:
+        ids_kw_price = keyword_ids & price_ids
         try:
-            print(f"[smart_search] kw+price count={qs_kw_price.count()}")
+            print(f"[smart_search] kw+price count={len(ids_kw_price)}")
         except Exception:
             pass
-        if qs_kw_price.exists():
+        if ids_kw_price:
             applied["category_used"] = False
             # rank by keyword density & price closeness
-            ranked = _score_and_sort_products(qs_kw_price.distinct(), keywords, max_price)
-            if return_metadata:
-                return ranked, {"parsed": {"category": original_category, "mapped_category": mapped_category, "max_price": max_price, "keywords": keywords}, "applied_filters": applied}
-            return ranked
+            return _result(_ranked(ids_kw_price))
 
     # 3) If category filtering removed matches but keywords present, try keywords-only (no price)
-    if applied["category_used"] and keyword_q is not None:
-        qs_kw = base_qs.filter(keyword_q)
+    if applied["category_used"] and keyword_ids is not None:
         try:
-            print(f"[smart_search] kw-only count={qs_kw.count()}")
+            print(f"[smart_search] kw-only count={len(keyword_ids)}")
         except Exception:
             pass
-        if qs_kw.exists():
+        if keyword_ids:
             applied["category_used"] = False
             applied["max_price_used"] = False
             applied["price_relaxed"] = True if max_price is not None else False
-            ranked = _score_and_sort_products(qs_kw.distinct(), keywords, max_price)
-            if return_metadata:
-                return ranked, {"parsed": {"category": original_category, "mapped_category": mapped_category, "max_price": max_price, "keywords": keywords}, "applied_filters": applied}
-            return ranked
+            return _result(_ranked(keyword_ids))
 
     # 4) If price was specified but nothing matched, relax price and return best keyword/category matches
     if max_price is not None:
-        qs_relaxed = base_qs
-        if keyword_q is not None:
-            qs_relaxed = qs_relaxed.filter(keyword_q)
-        elif mapped_category:
-            qs_relaxed = qs_relaxed.filter(category__name__icontains=mapped_category)
+        ids_relaxed = all_ids
+        if keyword_ids is not None:
+            ids_relaxed = keyword_ids
+        elif category_ids is not None:
+            ids_relaxed = category_ids
         try:
-            print(f"[smart_search] relaxed count={qs_relaxed.count()}")
+            print(f"[smart_search] relaxed count={len(ids_relaxed)}")
         except Exception:
             pass
-        if qs_relaxed.exists():
+        if ids_relaxed:
             applied["price_relaxed"] = True
             applied["max_price_used"] = False
-            ranked = _score_and_sort_products(qs_relaxed.distinct(), keywords, max_price)
-            if return_metadata:
-                return ranked, {"parsed": {"category": original_category, "mapped_category": mapped_category, "max_price": max_price, "keywords": keywords}, "applied_filters": applied}
-            return ranked
+            return _result(_ranked(ids_relaxed))
 
     # 5) Final fallback: contains on full query
-    final_qs = base_qs.filter(
-        Q(name__icontains=query) |
-        Q(base_description__icontains=query) |
-        Q(brand__icontains=query) |
-        Q(material__icontains=query) |
-        Q(use_case__icontains=query) |
-        Q(category__name__icontains=query)
-    ).distinct()
-
-    if return_metadata:
-        # adjust applied fields
-        applied["category_used"] = applied["category_used"] or False
-        applied["max_price_used"] = applied["max_price_used"] or False
-        # If keywords present, prefer ranking here as well
-        if keywords:
-            ranked = _score_and_sort_products(final_qs, keywords, max_price)
-            return ranked, {"parsed": {"category": original_category, "mapped_category": mapped_category, "max_price": max_price, "keywords": keywords}, "applied_filters": applied}
-        return final_qs, {"parsed": {"category": original_category, "mapped_category": mapped_category, "max_price": max_price, "keywords": keywords}, "applied_filters": applied}
-
-    # If keywords known, return a ranked list, otherwise give the raw final_qs
-    if keywords:
-        return _score_and_sort_products(final_qs, keywords, max_price)
+    final = index.match_full_query(query)
+    final_ids = final.all_ids() if backend is not None else final
+    final_ranking = final if backend is not None else None
+
+    # 6) Nothing matched literally: nearest products by meaning
+    if not final_ids and query_vector is not None:
+        hits = semantic_index.search(query_vector, top_k=limit, max_price=max_price)
+        applied["max_price_used"] = bool(hits) and max_price is not None
+        if not hits and max_price is not None:
+            hits = semantic_index.search(query_vector, top_k=limit)
+            applied["price_relaxed"] = bool(hits)
+        try:
+            print(f"[smart_search] semantic count={len(hits)}")
+        except Exception:
+            pass
+        if hits:
+            applied["semantic_fallback"] = True
+            applied["category_used"] = False
+            return _result(_fetch_products([pid for pid, _ in hits]))
 
-    return final_qs
+    # If keywords known, return a ranked list, otherwise the plain matches
+    if keywords:
+        return _result(_ranked(final_ids, final_ranking))
+    return _result(_unranked(final_ids, final_ranking))
@@ -0,0 +1,363 @@
+"""
+Synthetic catalogue and workload generator (``seed_data --products N ...``).
+
+Produces products, users, interactions, reviews, orders and chat messages
+with Zipfian popularity: a few products (and a few very active users)
+account for most of the traffic, like a real shop.  Rows are generated and
+inserted batch by batch (``bulk_create`` inside one transaction per batch),
+so memory stays flat however large the dataset is; only the product and
+user id arrays are kept.
+
+The same ``seed`` always produces the same dataset, which makes it the
+standard fixture for benchmarks.
+"""
+
+import time
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from product_recommendations.models import (
+    Category, ChatMessage, Order, OrderItem, Product, Review, UserInteraction, UserProfile
+)
+from product_recommendations.services.review_stats import rebuild_review_stats
+
+
+CATALOGUE = {
+    "Electronics & Accessories": (
+        ["Wireless Earbuds", "Power Bank", "Wi-Fi Plug", "HD Webcam", "Bluetooth Speaker",
+         "Charging Cable", "Smart Watch", "Noise Cancelling Headphones", "USB-C Hub", "Keyboard"],
+        ["ABS plastic", "Aluminum alloy", "Silicone", "Tempered glass"],
+        ["Commuting", "Remote work", "Travel", "Gym", "Home automation"],
+    ),
+    "Home & Living": (
+        ["Air Fryer", "Desk Lamp", "Aroma Diffuser", "Robot Vacuum", "Blender",
+         "Coffee Grinder", "Throw Blanket", "Storage Box", "Kettle", "Wall Clock"],
+        ["Stainless steel", "Cotton", "Bamboo", "Ceramic", "BPA-free plastic"],
+        ["Home", "Kitchen", "Office", "Relaxation"],
+    ),
+    "Beauty & Personal Care": (
+        ["Facial Cleanser", "Sunscreen SPF50", "Hair Dryer", "Vitamin C Serum", "Lip Balm",
+         "Body Lotion", "Face Mask", "Shampoo", "Electric Toothbrush", "Hand Cream"],
+        ["Aloe vera", "Shea butter", "Ceramic", "Plant-based formula"],
+        ["Daily skincare", "Travel", "Hair styling", "Sensitive skin"],
+    ),
+    "Fashion & Wearables": (
+        ["Canvas Tote Bag", "Minimalist Watch", "Running Cap", "Leather Wallet", "Sunglasses",
+         "Rain Jacket", "Wool Scarf", "Backpack", "Sneakers", "Belt"],
+        ["Canvas", "Leather", "Recycled polyester", "Wool", "Stainless steel"],
+        ["Everyday", "Outdoor", "Office", "Travel"],
+    ),
+    "Fitness & Wellness": (
+        ["Yoga Mat", "Resistance Bands", "Adjustable Dumbbells", "Protein Shaker", "Running Shoes",
+         "Foam Roller", "Jump Rope", "Kettlebell", "Fitness Tracker", "Water Bottle"],
+        ["TPE foam", "Natural rubber", "Cast iron", "Tritan plastic", "Mesh"],
+        ["Gym", "Home workouts", "Running", "Yoga", "Outdoor"],
+    ),
+}
+
+BRANDS = ["Nova", "Pulse", "Aero", "Flex", "Iron", "Pure", "Volt", "Glow", "Urban", "Terra",
+          "Zen", "Swift", "Bright", "Silk", "Core", "Peak", "Luma", "Echo", "Vita", "Orbit"]
+ADJECTIVES = ["Pro", "Lite", "Max", "Mini", "Plus", "Air", "Prime", "Eco", "One", "X"]
+
+REVIEW_TEMPLATES = {
+    5: ["Excellent {noun}, exactly what I needed.", "Great quality and fast delivery.",
+        "Would recommend the {name} to anyone.", "Love it, works perfectly every day."],
+    4: ["Solid {noun} for the price.", "Good build quality, minor quirks.",
+        "Does the job well, happy with it."],
+    3: ["Average {noun}, nothing special.", "Works, but could be better.",
+        "Decent, though the finish feels cheap."],
+    2: ["Disappointed with the durability of the {noun}.", "Not impressed, stopped working properly.",
+        "Poor value for the price."],
+    1: ["Terrible, broke after a week.", "Does not work as described.", "Bad experience, returned it."],
+}
+RATING_WEIGHTS = [0.05, 0.07, 0.13, 0.30, 0.45]   # ratings 1..5
+
+# view > click > add_to_cart > like > purchase
+INTERACTION_MIX = [("view", 0.60), ("click", 0.25), ("add_to_cart", 0.08), ("like", 0.05), ("purchase", 0.02)]
+
+CHAT_TEMPLATES = [
+    "hi", "do you have {noun}?", "{noun} under ${price}", "is the {name} in stock?",
+    "reviews for {name}", "best {noun} for {use_case}", "cheap {noun}",
+]
+
+
+def zipf_probabilities(n, exponent):
+    """P(rank k) proportional to 1 / k**exponent for k = 1..n."""
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** exponent
+    return weights / weights.sum()
+
+
+class SyntheticDataGenerator:
+    def __init__(self, products, users, interactions=0, reviews_per_product=0, orders=0,
+                 chat_messages=0, seed=0, batch_size=5000, product_skew=1.1, user_skew=0.8,
+                 log=print):
+        self.counts = {
+            "products": products,
+            "users": users,
+            "interactions": interactions,
+            "reviews_per_product": reviews_per_product,
+            "orders": orders,
+            "chat_messages": chat_messages,
+        }
+        self.seed = seed
+        self.batch_size = batch_size
+        self.product_skew = product_skew
+        self.user_skew = user_skew
+        self.log = log
+        self.rng = np.random.default_rng(seed)
+        self.user_prefix = f"synth{seed}_"
+
+        self.product_ids = None       # popularity rank -> product id
+        self.product_prices = None    # aligned with product_ids
+        self.product_names = None
+        self.product_nouns = None
+        self.product_use_cases = None
+        self.user_ids = None          # activity rank -> user id
+        self._product_p = None
+        self._user_p = None
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield min(self.batch_size, total - start)
+
+    def _sample_products(self, size):
+        return self.rng.choice(len(self.product_ids), size=size, p=self._product_p)
+
+    def _sample_users(self, size):
+        return self.rng.choice(len(self.user_ids), size=size, p=self._user_p)
+
+    def _insert(self, model, objs):
+        """bulk_create one batch and return the new primary keys in order."""
+        if not objs:
+            return []
+        with transaction.atomic():
+            last_id = model.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+            created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+            if created[0].pk is None:
+                # Backends without RETURNING (MySQL): read the ids back
+                return list(
+                    model.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True)[:len(objs)]
+                )
+        return [obj.pk for obj in created]
+
+    def _timed(self, label, fn):
+        started = time.monotonic()
+        total = fn()
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.log(f"  {label}: {total} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+        return total
+
+    # ------------------------------------------------------------------
+    # Entities
+    # ------------------------------------------------------------------
+
+    def _create_products(self):
+        categories = {}
+        for name in CATALOGUE:
+            categories[name], _ = Category.objects.get_or_create(name=name)
+        category_names = list(CATALOGUE)
+
+        ids, prices, names, nouns, uses = [], [], [], [], []
+        created = 0
+        for size in self._batches(self.counts["products"]):
+            batch = []
+            for _ in range(size):
+                n = created + len(batch)
+                category_name = category_names[n % len(category_names)]
+                noun_list, materials, use_cases = CATALOGUE[category_name]
+                noun = noun_list[int(self.rng.integers(len(noun_list)))]
+                brand = BRANDS[int(self.rng.integers(len(BRANDS)))]
+                name = f"{brand} {noun} {ADJECTIVES[n // len(category_names) % len(ADJECTIVES)]} {n + 1}"
+                price = round(float(np.clip(self.rng.lognormal(3.8, 0.7), 5, 2000)), 2)
+                use_case = use_cases[int(self.rng.integers(len(use_cases)))]
+                batch.append(Product(
+                    name=name,
+                    category=categories[category_name],
+                    price=price,
+                    base_description=f"{name} by {brand}: a dependable {noun.lower()} for {use_case.lower()}.",
+                    brand=brand,
+                    material=materials[int(self.rng.integers(len(materials)))],
+                    use_case=use_case,
+                    stock=int(self.rng.integers(0, 200)),
+                ))
+                prices.append(price)
+                names.append(name)
+                nouns.append(noun.lower())
+                uses.append(use_case.lower())
+            ids.extend(self._insert(Product, batch))
+            created += size
+
+        # Popularity rank is independent of insertion order
+        order = self.rng.permutation(len(ids))
+        self.product_ids = np.asarray(ids, dtype=np.int64)[order]
+        self.product_prices = np.asarray(prices, dtype=np.float64)[order]
+        self.product_names = [names[i] for i in order]
+        self.product_nouns = [nouns[i] for i in order]
+        self.product_use_cases = [uses[i] for i in order]
+        self._product_p = zipf_probabilities(len(ids), self.product_skew)
+        return created
+
+    def _create_users(self):
+        password = make_password("password123")
+        category_names = list(CATALOGUE)
+        ids = []
+        created = 0
+        for size in self._batches(self.counts["users"]):
+            batch = [
+                User(username=f"{self.user_prefix}{created + i}", password=password)
+                for i in range(size)
+            ]
+            batch_ids = self._insert(User, batch)
+            profiles = [
+                UserProfile(
+                    user_id=user_id,
+                    preferred_categories=category_names[int(self.rng.integers(len(category_names)))],
+                    budget_level=["low", "medium", "high"][int(self.rng.integers(3))],
+                    tone_preference=["friendly", "practical", "stylish", "performance"][int(self.rng.integers(4))],
+                    usage_context=["gym", "home", "office", "travel"][int(self.rng.integers(4))],
+                )
+                for user_id in batch_ids
+            ]
+            UserProfile.objects.bulk_create(profiles, batch_size=self.batch_size)
+            ids.extend(batch_ids)
+            created += size
+
+        self.user_ids = np.asarray(ids, dtype=np.int64)[self.rng.permutation(len(ids))]
+        self._user_p = zipf_probabilities(len(ids), self.user_skew)
+        return created
+
+    def _create_interactions(self):
+        kinds = [kind for kind, _ in INTERACTION_MIX]
+        kind_p = np.asarray([p for _, p in INTERACTION_MIX])
+        for size in self._batches(self.counts["interactions"]):
+            users = self.user_ids[self._sample_users(size)]
+            products = self.product_ids[self._sample_products(size)]
+            types = self.rng.choice(len(kinds), size=size, p=kind_p)
+            with transaction.atomic():
+                UserInteraction.objects.bulk_create([
+                    UserInteraction(user_id=int(u), product_id=int(p), interaction_type=kinds[t])
+                    for u, p, t in zip(users.tolist(), products.tolist(), types.tolist())
+                ], batch_size=self.batch_size)
+        return self.counts["interactions"]
+
+    def _create_reviews(self):
+        total = self.counts["reviews_per_product"] * len(self.product_ids)
+        # Popular products get most of the reviews
+        per_product = self.rng.multinomial(total, self._product_p)
+        ratings = np.arange(1, 6)
+
+        batch = []
+        for rank in np.flatnonzero(per_product).tolist():
+            count = int(per_product[rank])
+            reviewers = self.user_ids[self._sample_users(count)]
+            stars = self.rng.choice(ratings, size=count, p=RATING_WEIGHTS)
+            for user_id, rating in zip(reviewers.tolist(), stars.tolist()):
+                templates = REVIEW_TEMPLATES[rating]
+                text = templates[int(self.rng.integers(len(templates)))].format(
+                    name=self.product_names[rank], noun=self.product_nouns[rank]
+                )
+                batch.append(Review(
+                    product_id=int(self.product_ids[rank]), user_id=user_id, rating=rating, review_text=text
+                ))
+                if len(batch) >= self.batch_size:
+                    with transaction.atomic():
+                        Review.objects.bulk_create(batch)
+                    batch = []
+        if batch:
+            with transaction.atomic():
+                Review.objects.bulk_create(batch)
+        # bulk_create skips the signal handlers that maintain review stats
+        rebuild_review_stats(self.product_ids.tolist(), batch_size=self.batch_size)
+        return total
+
+    def _create_orders(self):
+        for size in self._batches(self.counts["orders"]):
+            buyers = self.user_ids[self._sample_users(size)]
+            item_counts = self.rng.integers(1, 5, size=size)
+            picks = self._sample_products(int(item_counts.sum()))
+            quantities = self.rng.integers(1, 4, size=len(picks))
+
+            orders, lines, pos = [], [], 0
+            for buyer, n_items in zip(buyers.tolist(), item_counts.tolist()):
+                order_lines = [
+                    (int(self.product_ids[r]), int(q), float(self.product_prices[r]))
+                    for r, q in zip(picks[pos:pos + n_items].tolist(), quantities[pos:pos + n_items].tolist())
+                ]
+                pos += n_items
+                total = round(sum(q * price for _, q, price in order_lines), 2)
+                orders.append(Order(user_id=buyer, total_amount=total))
+                lines.append(order_lines)
+
+            with transaction.atomic():
+                order_ids = self._insert(Order, orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order_id, product_id=product_id, quantity=q, price=price)
+                    for order_id, order_lines in zip(order_ids, lines)
+                    for product_id, q, price in order_lines
+                ], batch_size=self.batch_size)
+        return self.counts["orders"]
+
+    def _create_chat_messages(self):
+        for size in self._batches(self.counts["chat_messages"]):
+            users = self.user_ids[self._sample_users(size)]
+            ranks = self._sample_products(size)
+            templates = self.rng.integers(len(CHAT_TEMPLATES), size=size)
+            messages = []
+            for user_id, rank, t in zip(users.tolist(), ranks.tolist(), templates.tolist()):
+                message = CHAT_TEMPLATES[t].format(
+                    noun=self.product_nouns[rank],
+                    name=self.product_names[rank],
+                    price=int(self.product_prices[rank] * 1.2) + 1,
+                    use_case=self.product_use_cases[rank],
+                )
+                messages.append(ChatMessage(user_id=user_id, message=message, response=""))
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create(messages)
+        return self.counts["chat_messages"]
+
+    # ------------------------------------------------------------------
+
+    def run(self):
+        """Generate everything; returns {entity: rows created}."""
+        if self.counts["products"] <= 0 or self.counts["users"] <= 0:
+            raise ValueError("--products and --users must both be positive")
+        if User.objects.filter(username__startswith=self.user_prefix).exists():
+            raise ValueError(
+                f"Synthetic users for seed {self.seed} already exist; use another --seed or a fresh database"
+            )
+
+        created = {}
+        created["products"] = self._timed("Products", self._create_products)
+        created["users"] = self._timed("Users", self._create_users)
+        created["interactions"] = self._timed("Interactions", self._create_interactions)
+        created["reviews"] = self._timed("Reviews", self._create_reviews)
+        created["orders"] = self._timed("Orders", self._create_orders)
+        created["chat_messages"] = self._timed("Chat messages", self._create_chat_messages)
+
+        # bulk_create skips the post_save handlers that maintain the search indexes
+        # and the catalogue generation
+        from product_recommendations.services.autocomplete_index import get_autocomplete_index
+        from product_recommendations.services.catalogue_version import bump_catalogue_version
+        from product_recommendations.services.fulltext_search import get_fulltext_backend
+        from product_recommendations.services.product_mentions import get_mention_index
+        from product_recommendations.services.search_index import get_search_index
+        from product_recommendations.services.semantic_search import get_semantic_index
+        from product_recommendations.services.similar_products import build_similar_products
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        get_autocomplete_index().invalidate()
+        get_mention_index().invalidate()
+        backend = get_fulltext_backend()
+        if backend is not None and backend.available():
+            self._timed("Full-text index", backend.rebuild)
+        self._timed("Similar products", build_similar_products)
+        bump_catalogue_version()
+        return created
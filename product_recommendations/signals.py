@@ -0,0 +1,126 @@
+"""
+Model signal handlers that keep process-local search structures and the
+database full-text index in sync with catalogue writes, bump the catalogue
+generation, keep per-product review stats current and queue AI generation
+and similar-product refreshes for changed products; buffered chat logs are
+written once a response has been sent.
+"""
+
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from product_recommendations.models import Category, Product, Review
+from product_recommendations.services.autocomplete_index import SUGGESTION_FIELDS, get_autocomplete_index
+from product_recommendations.services.catalogue_version import CATALOGUE_FIELDS, bump_catalogue_version
+from product_recommendations.services.conversation import flush_chat_log_if_due
+from product_recommendations.services.fulltext_search import get_fulltext_backend
+from product_recommendations.services.job_queue import enqueue_job
+from product_recommendations.services.product_mentions import get_mention_index
+from product_recommendations.services.review_stats import apply_review_change, review_deltas
+from product_recommendations.services.search_index import INDEXED_FIELDS, get_search_index
+from product_recommendations.services.semantic_search import get_semantic_index
+from product_recommendations.services.similar_products import queue_similar_products_refresh
+
+
+def _fulltext(method, *args):
+    # Written in the same transaction as the catalogue change
+    backend = get_fulltext_backend()
+    if backend is not None:
+        getattr(backend, method)(*args)
+
+
+def _touches(update_fields, fields):
+    """Whether a save with ``update_fields`` (None = every field) wrote any of ``fields``."""
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if _touches(update_fields, CATALOGUE_FIELDS):
+        bump_catalogue_version()
+    if _touches(update_fields, INDEXED_FIELDS):
+        get_search_index().update_product(instance)
+        _fulltext("index_products", [instance.pk])
+        get_semantic_index().mark_dirty(instance.pk)
+    if _touches(update_fields, SUGGESTION_FIELDS):
+        get_autocomplete_index().mark_stale()
+    get_mention_index().mark_stale()
+    if created and not raw and not instance.ai_description:
+        enqueue_job("product_description", instance)
+    if not raw:
+        queue_similar_products_refresh(instance, update_fields)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    bump_catalogue_version()
+    get_search_index().remove_product(instance.pk)
+    _fulltext("remove_products", [instance.pk])
+    get_semantic_index().mark_dirty(instance.pk)
+    # The job cannot point at the deleted row; it repairs the shortened lists
+    queue_similar_products_refresh()
+    get_autocomplete_index().mark_stale()
+    get_mention_index().mark_stale()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    bump_catalogue_version()
+    get_search_index().update_category(instance)
+    _fulltext("index_category", instance.pk)
+    get_semantic_index().mark_category_dirty(instance.pk)
+    get_autocomplete_index().mark_stale()
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    bump_catalogue_version()
+    get_search_index().remove_category(instance.pk)
+    get_autocomplete_index().mark_stale()
+
+
+@receiver(pre_save, sender=Review)
+def review_before_save(sender, instance, **kwargs):
+    # Edits move a review between histogram/sentiment buckets: remember where it was
+    instance._stats_previous = None
+    if instance.pk is not None and not instance._state.adding:
+        instance._stats_previous = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list("product_id", "rating", "sentiment_label").first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created=False, **kwargs):
+    bump_catalogue_version()
+    current = (instance.product_id, instance.rating, instance.sentiment_label)
+    previous = getattr(instance, "_stats_previous", None)
+    if created or previous is None:
+        apply_review_change(instance.product_id, review_deltas(instance.rating, instance.sentiment_label),
+                            last_review_id=instance.pk)
+    elif previous != current:
+        old_product_id, old_rating, old_label = previous
+        removed = review_deltas(old_rating, old_label, sign=-1)
+        added = review_deltas(instance.rating, instance.sentiment_label)
+        if old_product_id == instance.product_id:
+            added.update(removed)   # Counter.update adds, keeping negative deltas
+            apply_review_change(instance.product_id, added)
+        else:
+            apply_review_change(old_product_id, removed)
+            apply_review_change(instance.product_id, added, last_review_id=instance.pk)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    bump_catalogue_version()
+    apply_review_change(
+        instance.product_id,
+        review_deltas(instance.rating, instance.sentiment_label, sign=-1),
+        create_missing=False,
+    )
+
+
+@receiver(request_finished)
+def write_chat_log(sender, **kwargs):
+    flush_chat_log_if_due()
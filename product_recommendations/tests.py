@@ -1,10 +1,70 @@
-from django.test import TestCase
-from product_recommendations.services.smart_search_service import smart_search_products
-from product_recommendations.models import Category, Product
+import importlib
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from product_recommendations.services.smart_search_service import (
+    _parse_query_with_ai,
+    _score_and_sort_products,
+    _score_product,
+    smart_search_products,
+)
+from product_recommendations.services.llm_gateway import (
+    RateLimiter, get_async_llm_client, get_llm_client, get_llm_metrics, reset_llm_clients
+)
+from product_recommendations.services.job_queue import enqueue_job, run_pending
+from product_recommendations.services.query_intent_cache import get_intent_cache
+from product_recommendations.services.review_summary_service import (
+    get_or_generate_review_summary, refresh_review_summary, save_review_summary
+)
+from product_recommendations.services.review_summary_batch import BatchProgress
+from product_recommendations.services.search_index import get_search_index
+from product_recommendations.services.semantic_search import get_semantic_index, hybrid_order
+from product_recommendations.services.similar_products import (
+    build_similar_products, refresh_similar_products, similar_products_for
+)
+from product_recommendations.services.autocomplete_index import get_autocomplete_index
+from product_recommendations.services.product_mentions import MentionAutomaton, get_mention_index
+from product_recommendations.services.conversation import flush_chat_log, get_chat_log, get_conversation_state
+from product_recommendations.services.catalogue_version import bump_catalogue_version, get_catalogue_version
+from product_recommendations.services.fulltext_search import MySQLFulltextBackend, get_fulltext_backend
+from product_recommendations.services.search_response_cache import SearchResponseCache, get_search_response_cache
+from product_recommendations.services.review_stats import get_review_stats, rebuild_review_stats, verify_review_stats
+from product_recommendations.benchmarks.cases import CASES, BenchmarkContext
+from product_recommendations.benchmarks.runner import Benchmark, compare_reports, measure, run_suite
+from product_recommendations.services.synthetic_data import SyntheticDataGenerator
+from product_recommendations.models import BackgroundJob, Category, ChatMessage, Order, OrderItem, Product, ProductReviewStats, Recommendation, Review, ReviewSummary, SimilarProduct, UserInteraction
+from product_recommendations.services import ai_recommendation_service
+from product_recommendations.services import collaborative_filtering
+from product_recommendations.services.collaborative_filtering import ItemItemModel, build_cf_model, get_cf_model, reset_cf_model
+from product_recommendations.services.recommendation_pipeline import store_recommendations, users_needing_refresh
 
 
 class SmartSearchTests(TestCase):
     def setUp(self):
+        # The search index is process-wide; drop rows left by rolled-back tests
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+
         cat_shoes = Category.objects.create(name="Shoes")
         cat_beauty = Category.objects.create(name="Beauty & Personal Care")
 
@@ -69,3 +129,1881 @@ class SmartSearchTests(TestCase):
         names = [p.name for p in res]
         self.assertIn("FlexRun Lightweight Running Shoes", names)
 
+
+
+@override_settings(SMART_SEARCH_BACKEND="memory")
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        self.cat = Category.objects.create(name="Electronics & Accessories")
+        self.power_bank = Product.objects.create(
+            name="VoltMax 20000mAh Power Bank",
+            category=self.cat,
+            price=89.00,
+            base_description="Portable charging for smartphone users",
+            brand="VoltMax",
+            use_case="Travel",
+        )
+        self.bands = Product.objects.create(
+            name="PowerLoop Resistance Bands",
+            category=self.cat,
+            price=25.00,
+            base_description="Elastic bands for strength training",
+            brand="PowerLoop",
+        )
+
+    def test_substring_semantics_match_icontains(self):
+        index = get_search_index()
+        self.assertEqual(index.match_keywords(["power"]), {self.power_bank.id, self.bands.id})
+        self.assertEqual(index.match_keywords(["power bank"]), {self.power_bank.id})
+        self.assertEqual(index.match_keywords(["smartphone"]), {self.power_bank.id})
+        self.assertEqual(index.match_keywords(["electronics"]), {self.power_bank.id, self.bands.id})
+
+    def test_signals_keep_index_current(self):
+        index = get_search_index()
+        index.ensure_built()
+
+        self.bands.is_active = False
+        self.bands.save()
+        self.assertNotIn(self.bands.id, index.all_ids())
+
+        self.cat.name = "Gadgets"
+        self.cat.save()
+        self.assertEqual(index.ids_in_category("gadget"), {self.power_bank.id})
+
+        self.power_bank.delete()
+        self.assertEqual(index.all_ids(), set())
+
+    def test_saves_of_unsearched_fields_leave_the_index_alone(self):
+        index = get_search_index()
+        index.ensure_built()
+        generation = index.generation
+
+        self.power_bank.ai_description = "A generated description."
+        self.power_bank.save(update_fields=["ai_description"])
+        self.assertEqual(index.generation, generation)
+
+        self.power_bank.price = 45
+        self.power_bank.save(update_fields=["price"])
+        self.assertGreater(index.generation, generation)
+
+    def test_writes_from_other_processes_are_picked_up(self):
+        cache.clear()
+        index = get_search_index()
+        index.ensure_built()
+
+        # Another worker's writes: no signals in this process, only its bump
+        Product.objects.filter(pk=self.bands.pk).update(is_active=False)
+        Product.objects.filter(pk=self.power_bank.pk).update(name="VoltMax Solar Charger", price=45)
+        bump_catalogue_version()
+        cache.clear()   # its commit published the new generation
+        self.assertEqual(index.all_ids(), {self.power_bank.id})
+        self.assertEqual(index.match_keywords(["solar"]), {self.power_bank.id})
+        self.assertEqual(index.ids_under_price(50), {self.power_bank.id})
+
+    def test_local_commits_do_not_trigger_a_resync(self):
+        cache.clear()
+        index = get_search_index()
+        index.ensure_built()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.power_bank.name = "VoltMax Solar Charger"
+            self.power_bank.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(index.match_keywords(["solar"]), {self.power_bank.id})
+
+    def test_price_relaxed_ladder_uses_single_fetch(self):
+        get_search_index().ensure_built()
+        get_semantic_index().ensure_current()
+        with self.assertNumQueries(1):
+            res, meta = smart_search_products("power bank under $50", return_metadata=True)
+        self.assertEqual([p.name for p in res], ["VoltMax 20000mAh Power Bank"])
+        self.assertTrue(meta["applied_filters"]["price_relaxed"])
+
+
+class VectorizedScoringTests(TestCase):
+    def setUp(self):
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        cat = Category.objects.create(name="Home & Living")
+        specs = [
+            ("AirCrisp Air Fryer", 119.0, "Air fryer for crisp cooking with less oil", "AirCrisp"),
+            ("PureMist Aroma Diffuser", 45.0, "Quiet diffuser for the living room", "PureMist"),
+            ("RoboClean Compact Vacuum", 249.0, "Robotic vacuum for home cleaning, vacuum daily", "RoboClean"),
+            ("BrightLite Desk Lamp", 35.0, "Desk lamp for home office", "BrightLite"),
+        ]
+        self.products = [
+            Product.objects.create(
+                name=name, category=cat, price=price, base_description=desc,
+                brand=brand, use_case="Home",
+            )
+            for name, price, desc, brand in specs
+        ]
+
+    def test_matches_python_scoring(self):
+        keywords = ["home", "vacuum", "air fryer", "lamp"]
+        for max_price in (None, 100.0):
+            ranked = _score_and_sort_products(self.products, keywords, max_price)
+            expected = sorted(
+                self.products,
+                key=lambda p: _score_product(p, keywords, max_price),
+                reverse=True,
+            )
+            self.assertEqual([p.id for p in ranked], [p.id for p in expected])
+
+    def test_changed_products_are_scored_before_the_store_catches_up(self):
+        from product_recommendations.services import search_scoring
+
+        keywords = ["vacuum", "desk lamp"]
+        store, _ = search_scoring.get_column_store()
+        with mock.patch.object(search_scoring, "_submit") as submit:
+            lamp = self.products[3]
+            lamp.base_description = "Desk lamp with a vacuum-sealed base, vacuum tested"
+            lamp.price = 150.0
+            lamp.save()
+            self.products[1].delete()
+            products = [self.products[0], self.products[2], lamp]
+            ranked = _score_and_sort_products(products, keywords, 100.0)
+        submit.assert_called_once()
+        self.assertIs(search_scoring.get_column_store()[0], store)
+        expected = sorted(products, key=lambda p: _score_product(p, keywords, 100.0), reverse=True)
+        self.assertEqual([p.id for p in ranked], [p.id for p in expected])
+
+        search_scoring._background_rebuild()
+        fresh, changed = search_scoring.get_column_store()
+        self.assertIsNot(fresh, store)
+        self.assertEqual(changed, set())
+        self.assertEqual([p.id for p in _score_and_sort_products(products, keywords, 100.0)], [p.id for p in expected])
+
+    def test_top_k_selects_best(self):
+        ranked = _score_and_sort_products(self.products, ["vacuum"], top_k=1)
+        self.assertEqual([p.name for p in ranked], ["RoboClean Compact Vacuum"])
+
+
+class FakeCompletionsClient:
+    """Minimal stand-in for the OpenAI client returning a fixed completion."""
+
+    def __init__(self, content, delay=0.0, error=None):
+        self.calls = 0
+        self.content = content
+        self.delay = delay
+        self.error = error
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class QueryIntentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_intent_cache().clear_local()
+        self.client_stub = FakeCompletionsClient(
+            '{"category": "Kitchen", "max_price": 100, "keywords": ["air fryer"]}'
+        )
+        patcher = mock.patch(
+            "product_recommendations.services.smart_search_service._get_openai_client",
+            return_value=self.client_stub,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalized_query_hits_cache(self):
+        first = _parse_query_with_ai("Air fryer under $100")
+        second = _parse_query_with_ai("  air   FRYER under $100 ")
+        self.assertEqual(first, second)
+        self.assertEqual(self.client_stub.calls, 1)
+        self.assertEqual(get_intent_cache().stats()["local_hits"], 1)
+
+    def test_shared_tier_survives_local_eviction(self):
+        _parse_query_with_ai("air fryer under $100")
+        get_intent_cache().local.clear()
+        self.assertEqual(_parse_query_with_ai("air fryer under $100")["max_price"], 100.0)
+        self.assertEqual(self.client_stub.calls, 1)
+        self.assertEqual(get_intent_cache().stats()["shared_hits"], 1)
+
+    def test_cached_intent_is_not_shared_by_reference(self):
+        _parse_query_with_ai("air fryer under $100")["keywords"].append("mutated")
+        self.assertEqual(_parse_query_with_ai("air fryer under $100")["keywords"], ["air fryer"])
+
+
+@override_settings(SMART_SEARCH_PARSE_MODE="race", SMART_SEARCH_AI_DEADLINE_MS=50)
+class RaceQueryParseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_intent_cache().clear_local()
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        Product.objects.create(
+            name="AirCrisp Air Fryer",
+            category=Category.objects.create(name="Home & Living"),
+            price=89.00,
+            base_description="Air fryer for crisp cooking",
+        )
+
+    def _patch_client(self, client):
+        patcher = mock.patch(
+            "product_recommendations.services.smart_search_service._get_openai_client",
+            return_value=client,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_heuristic_wins_when_ai_is_late_and_late_answer_is_cached(self):
+        self._patch_client(FakeCompletionsClient(
+            '{"category": "", "max_price": 100, "keywords": ["air fryer"]}', delay=0.3
+        ))
+        res, meta = smart_search_products("air fryer under $100", return_metadata=True)
+        applied = meta["applied_filters"]
+        self.assertEqual(applied["parser"], "heuristic")
+        self.assertEqual(applied["ai_parse_status"], "late")
+        self.assertIsNone(applied["parse_timings_ms"]["ai"])
+        self.assertIsNotNone(applied["parse_timings_ms"]["heuristic"])
+        self.assertEqual([p.name for p in res], ["AirCrisp Air Fryer"])
+
+        # The late AI answer lands in the intent cache for the next identical query
+        deadline = time.monotonic() + 2
+        while not get_intent_cache().contains("air fryer under $100") and time.monotonic() < deadline:
+            time.sleep(0.02)
+        _, meta = smart_search_products("air fryer under $100", return_metadata=True)
+        self.assertEqual(meta["applied_filters"]["parser"], "ai")
+
+    def test_ai_wins_within_deadline(self):
+        self._patch_client(FakeCompletionsClient(
+            '{"category": "", "max_price": 100, "keywords": ["fryer"]}'
+        ))
+        _, meta = smart_search_products("air fryer under $100", return_metadata=True)
+        self.assertEqual(meta["applied_filters"]["parser"], "ai")
+        self.assertEqual(meta["parsed"]["keywords"], ["fryer"])
+
+
+class RecommendationPipelineTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Fitness & Wellness")
+        self.mat = Product.objects.create(name="FlexFlow Yoga Mat", category=cat, price=49.0, base_description="Yoga mat")
+        self.shaker = Product.objects.create(name="ShakeSmart Protein Shaker", category=cat, price=19.0, base_description="Shaker")
+        self.user = User.objects.create_user(username="alice", password="pw")
+        UserInteraction.objects.create(user=self.user, product=self.mat, interaction_type="view")
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(RECOMMENDATION_CF_MODEL_PATH=os.path.join(tmp.name, "cf_model.npz"))
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.engine = mock.Mock(return_value=[(self.shaker, 1.3), (self.mat, 0.95)])
+        patcher = mock.patch(
+            "product_recommendations.services.recommendation_pipeline.generate_recommendations_for_user",
+            self.engine,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_job_stores_scored_ranking(self):
+        self.assertIn(self.user, users_needing_refresh())
+        call_command("build_recommendations", stdout=mock.MagicMock())
+
+        stored = list(Recommendation.objects.filter(user=self.user).order_by("-score"))
+        self.assertEqual([(r.product, r.score) for r in stored], [(self.shaker, 1.3), (self.mat, 0.95)])
+        self.assertNotIn(self.user, users_needing_refresh())
+
+    def test_dashboard_reads_stored_ranking(self):
+        call_command("build_recommendations", stdout=mock.MagicMock())
+        self.engine.reset_mock()
+
+        self.client.force_login(self.user)
+        response = self.client.get("/recommendations/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.engine.called)
+        self.assertEqual(
+            [item["product"] for item in response.context["recommendations"]],
+            [self.shaker, self.mat],
+        )
+
+
+class CollaborativeFilteringTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.model_path = os.path.join(tmp.name, "cf_model.npz")
+        override = override_settings(
+            RECOMMENDATION_ENGINE="collaborative",
+            RECOMMENDATION_CF_MODEL_PATH=self.model_path,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        reset_cf_model()
+        self.addCleanup(reset_cf_model)
+
+        cat = Category.objects.create(name="Fitness & Wellness")
+        self.mat, self.bands, self.shaker, self.shoes = [
+            Product.objects.create(name=name, category=cat, price=30, base_description=name)
+            for name in ("Yoga Mat", "Resistance Bands", "Protein Shaker", "Running Shoes")
+        ]
+        self.alice = User.objects.create_user(username="alice")
+        self.bob = User.objects.create_user(username="bob")
+        self.carol = User.objects.create_user(username="carol")
+
+        # alice and bob both like mats and bands; bob also bought a shaker
+        for user in (self.alice, self.bob):
+            UserInteraction.objects.create(user=user, product=self.mat, interaction_type="like")
+            UserInteraction.objects.create(user=user, product=self.bands, interaction_type="view")
+        order = Order.objects.create(user=self.bob, total_amount=30)
+        OrderItem.objects.create(order=order, product=self.shaker, quantity=1, price=30)
+        UserInteraction.objects.create(user=self.carol, product=self.shoes, interaction_type="click")
+
+    def test_recommends_co_occurring_items_and_excludes_purchases(self):
+        ranked = [p for p, _ in ai_recommendation_service.generate_recommendations_for_user(self.alice, [], with_scores=True)]
+        # shaker co-occurs with alice's items; shoes only come from the popularity fallback
+        self.assertLess(ranked.index(self.shaker), ranked.index(self.shoes))
+
+        bob_items = [p for p, _ in ai_recommendation_service.generate_recommendations_for_user(self.bob, [], with_scores=True)]
+        self.assertNotIn(self.shaker, bob_items)
+
+    def test_incremental_update_matches_full_rebuild_and_persists(self):
+        model, applied = build_cf_model()
+        self.assertEqual(applied, 6)
+
+        UserInteraction.objects.create(user=self.carol, product=self.mat, interaction_type="purchase")
+        incremental, applied = build_cf_model()
+        self.assertEqual(applied, 1)
+
+        full = ItemItemModel()
+        full.update_from_db()
+        loaded = ItemItemModel.load(self.model_path)
+        for a in (self.mat.id, self.bands.id, self.shaker.id, self.shoes.id):
+            for b in (self.mat.id, self.bands.id, self.shaker.id, self.shoes.id):
+                if a != b:
+                    self.assertAlmostEqual(incremental.similarity(a, b), full.similarity(a, b), places=5)
+                    self.assertAlmostEqual(loaded.similarity(a, b), full.similarity(a, b), places=5)
+
+    @override_settings(RECOMMENDATION_CF_REFRESH_SECONDS=0)
+    def test_due_refresh_runs_in_the_background(self):
+        model = get_cf_model()
+        self.assertEqual(model.popularity(1), [(self.shaker.id, 5.0)])
+        UserInteraction.objects.create(user=self.carol, product=self.mat, interaction_type="purchase")
+
+        with mock.patch.object(collaborative_filtering, "_submit_refresh") as submit:
+            self.assertIs(get_cf_model(), model)
+            self.assertIs(get_cf_model(), model)
+        submit.assert_called_once_with(model)
+        self.assertEqual(model.similarity(self.mat.id, self.shoes.id), 0.0)
+
+        collaborative_filtering._refresh(model)
+        self.assertGreater(model.similarity(self.mat.id, self.shoes.id), 0.0)
+        self.assertEqual(model.popularity(1)[0][0], self.mat.id)
+
+    @override_settings(RECOMMENDATION_ENGINE="llm")
+    def test_llm_outage_falls_back_to_collaborative_filtering(self):
+        with mock.patch.object(
+            ai_recommendation_service, "_get_openai_client",
+            return_value=FakeCompletionsClient("", error=Exception("down")),
+        ):
+            products = ai_recommendation_service.generate_recommendations_for_user(self.alice, [])
+        self.assertIn(self.shaker, products)
+
+
+class ChatIsolationMixin:
+    """Chat turns leave state in the cache and rows in the write-behind log buffer."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        get_chat_log().clear()
+        self.addCleanup(get_chat_log().clear)
+
+
+class QueryBudgetMixin:
+    """Assert an upper bound on the number of SQL queries a block issues."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, label="block"):
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+        if len(ctx) > budget:
+            queries = "\n".join(f"  {q['sql']}" for q in ctx.captured_queries)
+            self.fail(f"{label} issued {len(ctx)} queries (budget {budget}):\n{queries}")
+
+
+@override_settings(SMART_SEARCH_BACKEND="memory")
+class EndpointQueryBudgetTests(ChatIsolationMixin, QueryBudgetMixin, TestCase):
+    """
+    Query budgets per endpoint under a 1k-product / 10k-interaction catalogue.
+    A failure here means an N+1 (or similar) regression crept in.  Search runs
+    on the in-memory index here; FullTextSearchTests budgets the full-text path.
+    """
+
+    PRODUCTS = 1000
+    USERS = 50
+    INTERACTIONS = 10000
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        categories = [Category.objects.create(name=f"Category {i}") for i in range(10)]
+        Product.objects.bulk_create([
+            Product(
+                name=f"Product {i} {'Wireless Earbuds' if i % 50 == 0 else 'Gadget'}",
+                category=categories[i % len(categories)],
+                price=5 + (i % 200),
+                base_description=f"Description for product {i}",
+                brand=f"Brand{i % 40}",
+                use_case="Home" if i % 2 else "Gym",
+                stock=i % 3,
+                ai_description=f"AI description {i}",
+            )
+            for i in range(cls.PRODUCTS)
+        ])
+        products = list(Product.objects.all())
+        users = User.objects.bulk_create([User(username=f"user{i}") for i in range(cls.USERS)])
+        users = list(User.objects.all())
+        kinds = [k for k, _ in UserInteraction.INTERACTION_CHOICES]
+        UserInteraction.objects.bulk_create([
+            UserInteraction(
+                user=rng.choice(users), product=rng.choice(products), interaction_type=rng.choice(kinds)
+            )
+            for _ in range(cls.INTERACTIONS)
+        ])
+
+        cls.user = users[0]
+        cls.product = products[0]
+        Review.objects.bulk_create([
+            Review(
+                product=cls.product, user=users[i], rating=1 + i % 5,
+                review_text=f"Review {i}",
+            )
+            for i in range(20)
+        ])
+        rebuild_review_stats([cls.product.pk])
+        save_review_summary(cls.product, "Fine.", [], [], "Positive", 20, 3.0, 20)
+        store_recommendations(cls.user, [(p, 1.0 - i * 0.05) for i, p in enumerate(products[:10])])
+
+    def setUp(self):
+        cache.clear()
+        get_intent_cache().clear_local()
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        get_search_index().ensure_built()
+        get_catalogue_version()   # steady state: the generation is cached
+        get_search_response_cache().clear()
+        self.client.force_login(self.user)
+
+    def test_search(self):
+        self.client.get("/search/", {"q": "wireless earbuds"})  # warm the scoring column store
+        get_search_response_cache().clear()
+        with self.assertMaxQueries(1, "search"):
+            response = self.client.get("/search/", {"q": "wireless earbuds"})
+        self.assertEqual(response.json()["count"], 20)
+        with self.assertMaxQueries(0, "search, cached response"):
+            self.assertEqual(self.client.get("/search/", {"q": "wireless earbuds"})["X-Search-Cache"], "hit")
+
+    def test_dashboard(self):
+        with self.assertMaxQueries(3, "dashboard"):
+            response = self.client.get("/recommendations/dashboard/")
+        self.assertEqual(len(response.context["recommendations"]), 10)
+
+    def test_product_detail(self):
+        with self.assertMaxQueries(6, "product detail"):
+            response = self.client.get(f"/products/{self.product.id}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_chatbot(self):
+        with self.assertMaxQueries(4, "chatbot"):
+            response = self.client.post(
+                "/chatbot/", data={"message": "wireless earbuds"}, content_type="application/json"
+            )
+        self.assertIn("Wireless Earbuds", response.json()["reply"])
+
+    def test_products_page(self):
+        with self.assertMaxQueries(3, "products page"):
+            response = self.client.get("/products/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list_api(self):
+        with self.assertMaxQueries(3, "product list API"):
+            response = self.client.get("/api/recommendations/products/")
+        self.assertEqual(len(response.json()["results"]), 100)
+        with self.assertMaxQueries(3, "product list API, last page"):
+            response = self.client.get("/api/recommendations/products/", {"cursor": 900, "limit": 1000})
+        self.assertEqual(len(response.json()["results"]), self.PRODUCTS - 900)
+
+
+class StreamingChatbotTests(ChatIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_intent_cache().clear_local()
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        self.user = User.objects.create_user(username="alice", first_name="Alice")
+        self.client.force_login(self.user)
+        self.earbuds = Product.objects.create(
+            name="PulseSound Wireless Earbuds",
+            category=Category.objects.create(name="Electronics & Accessories"),
+            price=129.00,
+            base_description="Wireless earbuds for the gym",
+            stock=4,
+        )
+
+    @staticmethod
+    async def _collect(response):
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    def _events(self, message):
+        response = self.client.post(
+            "/chatbot/stream/", data={"message": message}, content_type="application/json"
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = async_to_sync(self._collect)(response).decode("utf-8")
+        events = []
+        for raw in body.split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in raw.splitlines() if not line.startswith(":"))
+            if lines:
+                events.append((lines["event"], json.loads(lines["data"])))
+        return events
+
+    def test_streams_product_card_then_tokens_then_done(self):
+        with mock.patch("product_recommendations.services.chat_service._get_async_openai_client", return_value=None):
+            events = self._events("wireless earbuds")
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], "product")
+        self.assertEqual(events[0][1]["id"], self.earbuds.id)
+        self.assertEqual(names[-1], "done")
+        self.assertTrue(all(name == "token" for name in names[1:-1]))
+
+        reply = "".join(data["text"] for name, data in events if name == "token")
+        self.assertEqual(events[-1][1]["reply"], reply)
+        self.assertIn("PulseSound Wireless Earbuds", reply)
+        flush_chat_log()
+        self.assertEqual(ChatMessage.objects.get(user=self.user).response, reply)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.post("/chatbot/stream/", data={"message": "hi"}, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+
+class LLMGatewayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_intent_cache().clear_local()
+        get_llm_metrics().reset()
+        reset_llm_clients()
+        self.addCleanup(reset_llm_clients)
+
+    @mock.patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+    def test_services_share_one_pooled_client(self):
+        search = get_llm_client("smart_search")
+        reviews = get_llm_client("review_summary")
+        self.assertIsNotNone(search)
+        self.assertIs(search.raw, reviews.raw)
+
+    def test_no_backend_without_api_key(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(get_llm_client("smart_search"))
+            self.assertIsNone(_parse_query_with_ai("headphones under $50"))
+
+    @override_settings(LLM_GATEWAY={"BACKEND": "stub"})
+    def test_stub_backend_answers_offline_and_records_metrics(self):
+        intent = _parse_query_with_ai("wireless headphones under $50")
+        self.assertEqual(intent["max_price"], 50.0)
+        self.assertIn("headphones", intent["keywords"])
+
+        stats = get_llm_metrics().stats()["smart_search"]
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["errors"], 0)
+        self.assertGreater(stats["prompt_tokens"], 0)
+        self.assertGreater(stats["completion_tokens"], 0)
+
+    @override_settings(LLM_GATEWAY={"BACKEND": "stub"})
+    def test_stub_streaming_records_usage_once_stream_finishes(self):
+        async def stream():
+            client = get_async_llm_client("chat")
+            chunks = await client.chat.completions.create(
+                messages=[{"role": "user", "content": "Draft answer:\nWe have **Trail Shoes** in stock.\n"}],
+                stream=True,
+            )
+            return "".join([c.choices[0].delta.content async for c in chunks if c.choices])
+
+        self.assertEqual(async_to_sync(stream)(), "We have **Trail Shoes** in stock.")
+        stats = get_llm_metrics().stats()["chat"]
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["completion_tokens"], 6)
+
+    @override_settings(LLM_GATEWAY={"BACKEND": "stub"})
+    def test_failed_calls_are_counted_as_errors(self):
+        with mock.patch(
+            "product_recommendations.services.llm_gateway.StubCompletions.create",
+            side_effect=Exception("down"),
+        ):
+            self.assertIsNone(ai_recommendation_service._ask_llm_for_ranking([], ["Mat"]))
+        self.assertEqual(get_llm_metrics().stats()["recommendations"]["errors"], 1)
+
+
+@override_settings(LLM_GATEWAY={"BACKEND": "stub"}, JOB_QUEUE={"MAX_ATTEMPTS": 2, "RETRY_BACKOFF_SECONDS": 0})
+class JobQueueTests(TestCase):
+    def setUp(self):
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        self.user = User.objects.create_user(username="alice")
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(
+            name="TrailRunner Shoes",
+            category=Category.objects.create(name="Sports & Fitness"),
+            price=95.00,
+            base_description="Lightweight trail running shoes.",
+        )
+        Review.objects.create(product=self.product, user=self.user, rating=5, review_text="Great grip on mud.")
+        Review.objects.create(product=self.product, user=self.user, rating=4, review_text="Comfortable fit.")
+
+    def _pending(self, task):
+        return BackgroundJob.objects.filter(task=task, product=self.product, status=BackgroundJob.STATUS_PENDING)
+
+    def test_product_creation_enqueues_description_once(self):
+        self.assertEqual(self._pending("product_description").count(), 1)
+        enqueue_job("product_description", self.product)
+        self.assertEqual(self._pending("product_description").count(), 1)
+
+    def test_cold_detail_page_renders_placeholders_without_calling_the_llm(self):
+        with mock.patch("product_recommendations.services.llm_gateway.StubCompletions.create") as create:
+            response = self.client.get(f"/products/{self.product.id}/")
+        create.assert_not_called()
+
+        self.assertEqual(response.context["ai_description"], "Lightweight trail running shoes.")
+        summary = response.context["review_summary"]
+        self.assertTrue(summary["pending"])
+        self.assertEqual(summary["summary"], "Rated 4.5 out of 5 from 2 reviews.")
+        self.assertEqual(summary["sentiment"], "Positive")
+        self.assertEqual(self._pending("review_summary").count(), 1)
+
+        self.assertEqual(run_pending(), (2, 0))
+        response = self.client.get(f"/products/{self.product.id}/")
+        self.assertNotIn("pending", response.context["review_summary"])
+        self.assertIn("Great grip on mud.", response.context["review_summary"]["summary"])
+        self.assertTrue(Product.objects.get(pk=self.product.pk).ai_description)
+
+    def test_submit_review_enqueues_summary_refresh(self):
+        get_or_generate_review_summary(self.product)
+        self.client.post(f"/products/{self.product.id}/submit_review/", {"rating": 2, "review_text": "Soles wore out."})
+        self.assertEqual(self._pending("review_summary").count(), 1)
+        # The previous summary stays visible until the job has run
+        self.assertEqual(ReviewSummary.objects.get(product=self.product).review_count, 2)
+
+        run_pending()
+        self.assertEqual(ReviewSummary.objects.get(product=self.product).review_count, 3)
+
+    def test_failing_job_is_retried_then_marked_failed(self):
+        BackgroundJob.objects.all().delete()
+        job = enqueue_job("review_summary", self.product)
+        with mock.patch.dict(
+            "product_recommendations.services.job_queue.TASKS",
+            {"review_summary": mock.Mock(side_effect=RuntimeError("boom"))},
+        ):
+            self.assertEqual(run_pending(), (0, 2))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("boom", job.last_error)
+
+
+@override_settings(LLM_GATEWAY={"BACKEND": "stub"})
+class ReviewSummaryStoreTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"reviewer{i}") for i in range(3)]
+        self.product = Product.objects.create(
+            name="AeroBlend Blender",
+            category=Category.objects.create(name="Home & Living"),
+            price=79.00,
+            base_description="Compact blender.",
+        )
+        for i, user in enumerate(self.users):
+            Review.objects.create(product=self.product, user=user, rating=3 + i % 3, review_text=f"Smoothie review {i}")
+
+    def test_generation_is_a_single_upsert_regardless_of_review_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            summary = get_or_generate_review_summary(self.product)
+
+        writes = [q["sql"] for q in ctx.captured_queries if not q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(writes), 1)
+        self.assertIn("product_recommendations_reviewsummary", writes[0])
+
+        row = ReviewSummary.objects.get(product=self.product)
+        self.assertEqual(row.review_count, 3)
+        self.assertAlmostEqual(row.average_rating, 4.0)
+        self.assertEqual(row.last_review_id, Review.objects.latest("id").id)
+        self.assertEqual(summary["sentiment"], "Positive")
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_or_generate_review_summary(self.product)["summary"], summary["summary"])
+
+    def test_refresh_only_regenerates_when_reviews_changed(self):
+        get_or_generate_review_summary(self.product)
+        self.assertFalse(refresh_review_summary(self.product))
+
+        Review.objects.create(product=self.product, user=self.users[0], rating=1, review_text="Motor died.")
+        self.assertTrue(refresh_review_summary(self.product))
+        self.assertEqual(ReviewSummary.objects.filter(product=self.product).count(), 1)
+        self.assertEqual(ReviewSummary.objects.get(product=self.product).review_count, 4)
+
+    def test_data_migration_copies_cached_review_text(self):
+        from django.apps import apps
+
+        Review.objects.filter(product=self.product).update(
+            ai_summary_cache="Summary:\nSmooth results.\n\nPros:\n- Quiet\n\nCons:\n- Small jar\n\nSentiment:\n",
+            sentiment_label="Positive",
+            last_summarized_at="2026-01-01T00:00:00Z",
+        )
+        migration = importlib.import_module("product_recommendations.migrations.0007_backfill_reviewsummary")
+        migration.copy_cached_summaries(apps, None)
+
+        row = ReviewSummary.objects.get(product=self.product)
+        self.assertEqual(row.summary, "Smooth results.")
+        self.assertEqual(row.pros, ["Quiet"])
+        self.assertEqual(row.cons, ["Small jar"])
+        self.assertEqual(row.sentiment, "Positive")
+        self.assertEqual(row.review_count, 3)
+
+
+@override_settings(
+    LLM_GATEWAY={"BACKEND": "stub"},
+    REVIEW_SUMMARY={"CHUNK_MAX_REVIEWS": 2, "REDUCE_FAN_IN": 2, "MAX_PARALLEL_CHUNKS": 2},
+)
+class IncrementalReviewSummaryTests(TestCase):
+    def setUp(self):
+        get_llm_metrics().reset()
+        self.user = User.objects.create_user(username="reviewer")
+        self.product = Product.objects.create(
+            name="FlexiGrip Yoga Mat",
+            category=Category.objects.create(name="Sports & Fitness"),
+            price=39.00,
+            base_description="Non-slip yoga mat.",
+        )
+        for i in range(5):
+            self._review(f"Mat review {i}")
+
+    def _review(self, text, rating=5):
+        return Review.objects.create(product=self.product, user=self.user, rating=rating, review_text=text)
+
+    def _summarize_chunk_spy(self):
+        from product_recommendations.services import review_summary_service
+
+        spy = mock.patch.object(
+            review_summary_service, "_summarize_chunk", wraps=review_summary_service._summarize_chunk
+        )
+        self.addCleanup(spy.stop)
+        return spy.start()
+
+    def test_first_summary_maps_bounded_chunks_then_reduces(self):
+        chunk_spy = self._summarize_chunk_spy()
+        get_or_generate_review_summary(self.product)
+
+        chunks = [call.args[1] for call in chunk_spy.call_args_list]
+        self.assertEqual(chunks, [["Mat review 0", "Mat review 1"], ["Mat review 2", "Mat review 3"], ["Mat review 4"]])
+        # 3 map prompts + 2 merge rounds (fan-in 2: 3 -> 2 -> 1)
+        self.assertEqual(get_llm_metrics().stats()["review_summary"]["calls"], 5)
+        self.assertIn("Mat review 0", ReviewSummary.objects.get(product=self.product).summary)
+
+    def test_new_reviews_are_folded_into_the_stored_summary(self):
+        get_or_generate_review_summary(self.product)
+        get_llm_metrics().reset()
+        chunk_spy = self._summarize_chunk_spy()
+
+        newest = self._review("Mat review 5", rating=1)
+        self.assertTrue(refresh_review_summary(self.product))
+
+        self.assertEqual([call.args[1] for call in chunk_spy.call_args_list], [["Mat review 5"]])
+        self.assertEqual(get_llm_metrics().stats()["review_summary"]["calls"], 2)  # one map + one merge
+        row = ReviewSummary.objects.get(product=self.product)
+        self.assertEqual((row.review_count, row.last_review_id), (6, newest.id))
+
+    def test_deleted_review_triggers_full_rebuild(self):
+        get_or_generate_review_summary(self.product)
+        Review.objects.filter(review_text="Mat review 0").delete()
+        chunk_spy = self._summarize_chunk_spy()
+
+        self.assertTrue(refresh_review_summary(self.product))
+        reviewed = [text for call in chunk_spy.call_args_list for text in call.args[1]]
+        self.assertEqual(reviewed, [f"Mat review {i}" for i in range(1, 5)])
+        self.assertEqual(ReviewSummary.objects.get(product=self.product).review_count, 4)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class RateLimiterTests(TestCase):
+    def test_requests_per_minute_spaces_out_calls_after_the_burst(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=60, clock=clock, sleep=clock.sleep)
+        for _ in range(61):
+            limiter.acquire()
+        self.assertEqual(len(clock.slept), 1)
+        self.assertAlmostEqual(clock.now, 1.0)
+
+    def test_token_budget_is_corrected_with_actual_usage(self):
+        clock = FakeClock()
+        limiter = RateLimiter(tokens_per_minute=600, clock=clock, sleep=clock.sleep)
+        limiter.acquire(100)
+        limiter.settle(100, 600)     # the call really used 600 tokens
+        limiter.acquire(60)
+        self.assertAlmostEqual(clock.now, 6.0)   # bucket emptied by the real usage; 60 tokens at 10/s
+
+    def test_progress_reports_throughput_and_eta(self):
+        clock = FakeClock()
+        progress = BatchProgress(10, clock=clock)
+        clock.now = 30.0
+        for _ in range(4):
+            progress.record(True)
+        snap = progress.snapshot()
+        self.assertAlmostEqual(snap["rate"] * 60, 8.0)
+        self.assertAlmostEqual(snap["eta"], 45.0)
+        self.assertEqual(progress.format(), "[ 4/10] 8.0 products/min, elapsed 30s, ETA 45s")
+
+
+@override_settings(LLM_GATEWAY={"BACKEND": "stub"})
+class RegenReviewSummariesCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reviewer")
+        category = Category.objects.create(name="Home & Living")
+        self.products = [
+            Product.objects.create(name=f"Lamp {i}", category=category, price=20 + i, base_description="Desk lamp.")
+            for i in range(3)
+        ]
+        for product in self.products:
+            Review.objects.create(product=product, user=self.user, rating=4, review_text=f"Bright {product.name}")
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), "regen.checkpoint")
+
+    def _run(self, *args):
+        out = StringIO()
+        call_command("regen_review_summaries", "--checkpoint", self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_resume_skips_products_finished_by_an_interrupted_run(self):
+        from product_recommendations.services import review_summary_batch
+
+        real = review_summary_batch._summarize
+        calls = []
+        outage = {"active": True}
+
+        def flaky(product_id, incremental):
+            calls.append(product_id)
+            if product_id == self.products[1].id and outage["active"]:
+                raise RuntimeError("rate limited")
+            return real(product_id, incremental)
+
+        with mock.patch.object(review_summary_batch, "_summarize", side_effect=flaky):
+            output = self._run()
+            self.assertIn("2 succeeded, 1 failed", output)
+            self.assertIn("ETA", output)
+
+            calls.clear()
+            outage["active"] = False
+            output = self._run("--resume")
+        self.assertIn("Resuming: 2 products already done", output)
+        self.assertEqual(calls, [self.products[1].id])
+        self.assertEqual(ReviewSummary.objects.count(), 3)
+
+    def test_since_limits_run_to_products_with_new_reviews(self):
+        Review.objects.update(created_at=timezone.now() - timedelta(days=30))
+        Review.objects.create(product=self.products[2], user=self.user, rating=2, review_text="Flickers.")
+
+        output = self._run("--since", "7d", "--incremental")
+        self.assertIn("Regenerating summaries for 1 products", output)
+        self.assertEqual(list(ReviewSummary.objects.values_list("product_id", flat=True)), [self.products[2].id])
+
+
+class SyntheticSeedDataTests(TestCase):
+    def _seed(self, seed=7):
+        out = StringIO()
+        call_command(
+            "seed_data", products=30, users=12, interactions=400, reviews_per_product=3,
+            orders=20, chat_messages=15, seed=seed, batch_size=50, stdout=out,
+        )
+        return out.getvalue()
+
+    def _snapshot(self):
+        return (
+            list(Product.objects.order_by("id").values_list("name", "price", "brand")),
+            list(UserInteraction.objects.order_by("id").values_list("user__username", "product__name", "interaction_type")),
+            list(Review.objects.order_by("id").values_list("product__name", "rating", "review_text")),
+        )
+
+    def test_generates_requested_volumes_without_queueing_jobs(self):
+        output = self._seed()
+
+        self.assertIn("Synthetic data generated", output)
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(User.objects.filter(username__startswith="synth7_").count(), 12)
+        self.assertEqual(UserInteraction.objects.count(), 400)
+        self.assertEqual(Review.objects.count(), 90)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertTrue(20 <= OrderItem.objects.count() <= 80)
+        self.assertEqual(ChatMessage.objects.count(), 15)
+        self.assertEqual(BackgroundJob.objects.count(), 0)
+
+        # Zipfian popularity: the busiest product sees far more than its fair share
+        top = UserInteraction.objects.values("product_id").annotate(n=Count("id")).order_by("-n")[0]["n"]
+        self.assertGreater(top, 3 * 400 / 30)
+
+    def test_same_seed_reproduces_dataset(self):
+        self._seed(seed=3)
+        first = self._snapshot()
+        for model in (Review, UserInteraction, OrderItem, Order, ChatMessage, Product):
+            model.objects.all().delete()
+        User.objects.all().delete()
+
+        self._seed(seed=3)
+        self.assertEqual(self._snapshot(), first)
+
+    def test_rerunning_a_seed_is_refused(self):
+        self._seed(seed=5)
+        with self.assertRaisesMessage(CommandError, "already exist"):
+            self._seed(seed=5)
+
+
+class BenchmarkRunnerTests(ChatIsolationMixin, TestCase):
+    def test_measure_counts_queries_and_silences_prints(self):
+        def two_queries():
+            print("noisy debug line")
+            list(Product.objects.all())
+            list(Category.objects.all())
+
+        out = StringIO()
+        with mock.patch("sys.stdout", out):
+            result = measure(Benchmark("two", two_queries), repeat=3)
+        self.assertEqual(result["queries"], 2)
+        self.assertEqual(result["iterations"], 3)
+        self.assertGreater(result["peak_kb"], 0)
+        self.assertNotIn("noisy", out.getvalue())
+
+    def test_compare_flags_slowdowns_and_extra_queries(self):
+        def report(*rows):
+            return {"results": [
+                {"name": name, "wall_ms": {"median": ms}, "queries": queries, "peak_kb": 100.0}
+                for name, ms, queries in rows
+            ]}
+
+        baseline = report(("steady", 10.0, 1), ("slower", 10.0, 1), ("chattier", 10.0, 1), ("faster", 10.0, 1))
+        current = report(("steady", 11.0, 1), ("slower", 20.0, 1), ("chattier", 10.0, 3), ("faster", 2.0, 1), ("added", 1.0, 0))
+        status = {row["name"]: row["status"] for row in compare_reports(current, baseline, threshold=0.25)}
+
+        self.assertEqual(status, {
+            "steady": "ok", "slower": "regression", "chattier": "regression", "faster": "faster", "added": "new",
+        })
+
+    def test_suite_runs_every_case_on_a_small_dataset(self):
+        with mock.patch("builtins.print"):
+            SyntheticDataGenerator(products=200, users=10, interactions=300, reviews_per_product=1, seed=1).run()
+
+        with override_settings(LLM_GATEWAY={"BACKEND": "stub"}):
+            reset_llm_clients()
+            try:
+                with BenchmarkContext() as ctx:
+                    results = run_suite(CASES, ctx, repeat=1, log=lambda line: None)
+            finally:
+                reset_llm_clients()
+                reset_cf_model()
+                get_intent_cache().clear_local()
+
+        by_name = {r["name"]: r for r in results}
+        self.assertIn("score_and_sort.10k", by_name)
+        self.assertIn("skipped", by_name["score_and_sort.10k"])
+        for stage in ("strict", "keywords_price", "keywords_only", "price_relaxed", "full_query"):
+            self.assertEqual(by_name[f"smart_search.{stage}"]["info"]["stage"], stage)
+        self.assertEqual(by_name["chatbot_api.greeting"]["queries"], 2)
+        self.assertFalse(os.path.exists(ctx.cf_model_path))
+
+
+class AutocompleteIndexTests(TestCase):
+    def setUp(self):
+        get_autocomplete_index().invalidate()
+        self.addCleanup(get_autocomplete_index().invalidate)
+        self.user = User.objects.create_user(username="shopper", password="pw")
+        self.cat = Category.objects.create(name="Electronics & Accessories")
+        self.quiet = self._product("VoltMax Power Bank", brand="VoltMax")
+        self.popular = self._product("PowerLoop Resistance Bands", brand="PowerLoop")
+        self.earbuds = self._product("Nova Wireless Earbuds", brand="Nova")
+        for _ in range(3):
+            UserInteraction.objects.create(user=self.user, product=self.popular, interaction_type="purchase")
+
+    def _product(self, name, brand):
+        return Product.objects.create(name=name, category=self.cat, price=20, base_description=name, brand=brand)
+
+    def test_ranks_by_match_position_then_popularity(self):
+        suggestions = get_autocomplete_index().suggest("pow")
+        # Text prefix before word-start matches; popular product before the quiet one
+        self.assertEqual(suggestions[:3], ["PowerLoop", "PowerLoop Resistance Bands", "power bank"])
+        self.assertLess(suggestions.index("power bank"), suggestions.index("VoltMax Power Bank"))
+
+    def test_word_start_and_infix_matches(self):
+        index = get_autocomplete_index()
+        self.assertEqual(index.suggest("earb"), ["Nova Wireless Earbuds"])
+        self.assertEqual(index.suggest("ireless"), ["Nova Wireless Earbuds"])
+        # Infix matching needs 3+ characters
+        self.assertEqual(index.suggest("ir"), [])
+        self.assertIn("Electronics & Accessories", index.suggest("accessories"))
+        self.assertEqual(index.suggest("p"), [])
+
+    def test_catalogue_changes_rebuild_the_index_in_the_background(self):
+        index = get_autocomplete_index()
+        self.assertEqual(index.suggest("yoga"), [])
+        self._product("Zen Yoga Mat", brand="Zen")
+        with mock.patch.object(index, "_submit") as submit, self.assertNumQueries(0):
+            self.assertEqual(index.suggest("yoga"), [])   # previous snapshot meanwhile
+            self.assertEqual(index.suggest("yoga"), [])
+        submit.assert_called_once()
+
+        submit.call_args.args[0]()   # the rebuild thread's work
+        self.assertEqual(index.suggest("yoga"), ["Zen Yoga Mat"])
+
+    def test_saves_of_other_fields_keep_the_index(self):
+        index = get_autocomplete_index()
+        index.suggest("nova")
+        self.earbuds.ai_description = "Wireless earbuds with a long battery life."
+        self.earbuds.save(update_fields=["ai_description"])
+        with mock.patch.object(index, "_submit") as submit:
+            self.assertEqual(index.suggest("wireless"), ["Nova Wireless Earbuds"])
+        submit.assert_not_called()
+
+    def test_endpoint_answers_without_queries_and_sets_cache_headers(self):
+        self.client.get("/search/autocomplete/", {"q": "nova"})   # builds the index
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/search/autocomplete/", {"q": "wireless"})
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response.json(), {"suggestions": ["Nova Wireless Earbuds"]})
+        self.assertIn("max-age=60", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+
+
+class ProductMentionTests(ChatIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_mention_index().invalidate()
+        self.addCleanup(get_mention_index().invalidate)
+        self.user = User.objects.create_user(username="chatter", password="pw")
+        self.client.force_login(self.user)
+        cat = Category.objects.create(name="Fitness & Wellness")
+        self.mat = Product.objects.create(name="Zen Yoga Mat", category=cat, price=30, base_description="Mat", brand="Zen", stock=4)
+        self.mat_pro = Product.objects.create(name="Zen Yoga Mat Pro", category=cat, price=60, base_description="Mat", brand="Zen", stock=0)
+        self.bottle = Product.objects.create(name="HydroPeak Water Bottle", category=cat, price=15, base_description="Bottle", brand="HydroPeak", stock=9)
+
+    def test_automaton_finds_mentions_leftmost_longest(self):
+        automaton = MentionAutomaton([("Zen Yoga Mat", 1), ("Zen Yoga Mat Pro", 2), ("Mat", 3), ("Water Bottle", 4)])
+        self.assertEqual(automaton.find("Try the **Zen Yoga Mat Pro** or a water-bottle"), [2, 4])
+        self.assertEqual(automaton.find("zen yoga mat, then a mat"), [1, 3])
+        # Matches fall on word boundaries only
+        self.assertEqual(automaton.find("Zen Yoga Matte finish"), [])
+
+    def test_index_uses_names_and_single_product_brands(self):
+        index = get_mention_index()
+        self.assertEqual(index.find_products("Here's what I found: HydroPeak ($15.00)"), [self.bottle.id])
+        # "Zen" belongs to two products, so it is not an alias
+        self.assertEqual(index.find_products("Zen makes mats"), [])
+        self.bottle.name = "HydroPeak Flask"
+        self.bottle.save()
+        self.assertEqual(index.find_products("a HydroPeak Flask"), [self.bottle.id])
+
+    def test_index_follows_renames_made_by_other_processes(self):
+        cache.clear()
+        index = get_mention_index()
+        self.assertEqual(index.find_products("the Summit Flask"), [])
+        # Another worker's write: no signal here, only its generation bump
+        Product.objects.filter(pk=self.bottle.pk).update(name="Summit Flask")
+        bump_catalogue_version()
+        cache.clear()
+        self.assertEqual(index.find_products("the Summit Flask"), [self.bottle.id])
+
+    def _chat(self, message):
+        response = self.client.post("/chatbot/", data={"message": message}, content_type="application/json")
+        return response.json()["reply"]
+
+    def test_reply_records_referenced_product_for_follow_ups(self):
+        self._chat("hydropeak water bottle")
+        flush_chat_log()
+        last = ChatMessage.objects.get(user=self.user)
+        self.assertEqual(last.referenced_product, self.bottle)
+        # The stored reference wins even when the text names another product
+        last.response = "Unlike the Zen Yoga Mat Pro, this one ..."
+        last.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            reply = self._chat("is it in stock?")
+        self.assertIn("HydroPeak Water Bottle** is currently in stock", reply)
+        # No name matching against the catalogue
+        self.assertFalse(any("LIKE" in q["sql"] for q in ctx.captured_queries))
+
+    def test_follow_up_falls_back_to_mentions_in_reply_text(self):
+        ChatMessage.objects.create(user=self.user, message="mats?", response="How about the Zen Yoga Mat?")
+        self.assertIn("Zen Yoga Mat** is currently in stock", self._chat("is it available?"))
+
+
+class ConversationStateTests(ChatIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        self.user = User.objects.create_user(username="returning", password="pw")
+        self.client.force_login(self.user)
+        self.lamp = Product.objects.create(
+            name="Lumen Desk Lamp", category=Category.objects.create(name="Home & Living"),
+            price=35, base_description="LED desk lamp", stock=2,
+        )
+
+    def _chat(self, message):
+        response = self.client.post("/chatbot/", data={"message": message}, content_type="application/json")
+        return response.json()["reply"]
+
+    def test_follow_up_resolves_from_cached_state_without_reading_chat_log(self):
+        self._chat("desk lamp")
+        state = get_conversation_state(self.user)
+        self.assertEqual(state["product_id"], self.lamp.id)
+        self.assertEqual(state["intent"], "search")
+        self.assertEqual(state["product_ids"], [self.lamp.id])
+
+        with CaptureQueriesContext(connection) as ctx:
+            reply = self._chat("is it in stock?")
+        self.assertIn("Lumen Desk Lamp** is currently in stock", reply)
+        self.assertFalse(any("product_recommendations_chatmessage" in q["sql"] for q in ctx.captured_queries))
+
+    def test_chat_log_is_written_in_batches(self):
+        with override_settings(CHAT_CONVERSATION={"LOG_BATCH_SIZE": 3, "LOG_FLUSH_INTERVAL": 60}):
+            self._chat("hi")
+            self._chat("desk lamp")
+            self.assertEqual(ChatMessage.objects.count(), 0)
+            self.assertEqual(len(get_chat_log()), 2)
+
+            self._chat("is it available?")   # third turn completes the batch
+        messages = list(ChatMessage.objects.order_by("created_at").values_list("message", "referenced_product_id"))
+        self.assertEqual(messages, [("hi", None), ("desk lamp", self.lamp.id), ("is it available?", self.lamp.id)])
+        self.assertEqual(len(get_chat_log()), 0)
+
+    def test_messages_waiting_past_the_flush_interval_are_written_without_a_request(self):
+        with override_settings(CHAT_CONVERSATION={"LOG_BATCH_SIZE": 50, "LOG_FLUSH_INTERVAL": 60}):
+            self._chat("hi")
+            self.assertEqual(len(get_chat_log()), 1)
+            delay = get_chat_log().flush_overdue()
+            self.assertGreater(delay, 50)
+            self.assertEqual(ChatMessage.objects.count(), 0)
+
+        with override_settings(CHAT_CONVERSATION={"LOG_FLUSH_INTERVAL": 0}):
+            self.assertIsNone(get_chat_log().flush_overdue())
+        self.assertEqual(ChatMessage.objects.get().message, "hi")
+
+    def test_failed_flush_keeps_messages_for_retry(self):
+        self._chat("hi")
+        with mock.patch.object(ChatMessage.objects, "bulk_create", side_effect=RuntimeError("db down")), \
+                mock.patch("builtins.print"):
+            self.assertEqual(flush_chat_log(), 0)
+        self.assertEqual(len(get_chat_log()), 1)
+        self.assertEqual(flush_chat_log(), 1)
+        self.assertEqual(ChatMessage.objects.get().message, "hi")
+
+
+class ReviewStatsTests(ChatIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="rater")
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(
+            name="SteamPro Garment Steamer",
+            category=Category.objects.create(name="Home & Living"),
+            price=59.00,
+            base_description="Handheld steamer.",
+            stock=2,
+        )
+
+    def _review(self, rating, label=None, product=None):
+        return Review.objects.create(
+            product=product or self.product, user=self.user, rating=rating,
+            review_text=f"{rating} stars", sentiment_label=label,
+        )
+
+    def _stats(self):
+        return ProductReviewStats.objects.get(product=self.product)
+
+    def test_signals_keep_counts_histogram_and_sentiment_current(self):
+        self._review(5, "Positive")
+        self._review(4, "positive")
+        low = self._review(1, "Negative")
+        self._review(3)
+
+        stats = self._stats()
+        self.assertEqual((stats.review_count, stats.rating_sum), (4, 13))
+        self.assertAlmostEqual(stats.average_rating, 3.25)
+        self.assertEqual(stats.histogram, {1: 1, 2: 0, 3: 1, 4: 1, 5: 1})
+        self.assertEqual(stats.sentiment_distribution, {"positive": 2, "neutral": 0, "negative": 1, "unlabeled": 1})
+        self.assertEqual(stats.last_review_id, Review.objects.latest("id").id)
+
+        low.rating, low.sentiment_label = 2, "Neutral"
+        low.save()
+        stats = self._stats()
+        self.assertEqual(stats.histogram, {1: 0, 2: 1, 3: 1, 4: 1, 5: 1})
+        self.assertEqual(stats.sentiment_distribution, {"positive": 2, "neutral": 1, "negative": 0, "unlabeled": 1})
+
+        low.delete()
+        self.assertEqual((self._stats().review_count, self._stats().rating_sum), (3, 12))
+        self.assertEqual(verify_review_stats(), [])
+
+    def test_review_writes_increment_in_a_single_update(self):
+        self._review(5)
+        with CaptureQueriesContext(connection) as ctx:
+            self._review(4)
+        stats_sql = [q["sql"] for q in ctx.captured_queries if "productreviewstats" in q["sql"]]
+        self.assertEqual(len(stats_sql), 1)
+        self.assertTrue(stats_sql[0].startswith("UPDATE"))
+
+    def test_verify_reports_drift_and_backfill_repairs_it(self):
+        self._review(5)
+        Review.objects.bulk_create([
+            Review(product=self.product, user=self.user, rating=2, review_text="Leaks.") for _ in range(2)
+        ])
+        (product_id, diff), = verify_review_stats()
+        self.assertEqual(product_id, self.product.pk)
+        self.assertEqual(diff["review_count"], (1, 3))
+
+        with self.assertRaises(CommandError):
+            call_command("verify_review_stats", stdout=StringIO())
+        call_command("backfill_review_stats", stdout=StringIO())
+        self.assertEqual(verify_review_stats(), [])
+        self.assertEqual(self._stats().histogram[2], 2)
+
+        ProductReviewStats.objects.filter(product=self.product).update(review_count=9)
+        call_command("verify_review_stats", "--fix", stdout=StringIO())
+        self.assertEqual(self._stats().review_count, 3)
+
+    def test_deleting_a_product_with_reviews(self):
+        self._review(4)
+        self.product.delete()
+        self.assertFalse(ProductReviewStats.objects.exists())
+
+    def test_review_follow_up_reads_the_stats_row(self):
+        for rating in (5, 4, 3):
+            self._review(rating)
+        self.client.post("/chatbot/", data={"message": "garment steamer"}, content_type="application/json")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                "/chatbot/", data={"message": "what do the reviews say?"}, content_type="application/json"
+            )
+        self.assertIn("3 reviews with an average rating of 4.0/5", response.json()["reply"])
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn('FROM "product_recommendations_review"', sql)
+
+    def test_product_detail_lists_recent_reviews_with_totals_from_stats(self):
+        for i in range(25):
+            self._review(1 + i % 5)
+        response = self.client.get(f"/products/{self.product.id}/")
+
+        self.assertEqual(len(response.context["reviews"]), 20)
+        self.assertEqual(response.context["reviews"][0], Review.objects.latest("id"))
+        self.assertEqual(response.context["review_summary"]["review_count"], 25)
+        self.assertContains(response, "Showing the 20 most recent of 25 reviews.")
+        self.assertIsNone(get_review_stats(Product.objects.create(
+            name="Unreviewed", category=self.product.category, price=1, base_description="x",
+        )))
+
+
+class ProductListAPITests(TestCase):
+    URL = "/api/recommendations/products/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.audio = Category.objects.create(name="Audio")
+        cls.kitchen = Category.objects.create(name="Kitchen")
+        Product.objects.bulk_create([
+            Product(
+                name=f"Item {i}",
+                category=cls.audio if i % 2 else cls.kitchen,
+                price=10 + i,
+                base_description="x",
+                stock=i,
+                is_active=i != 3,
+            )
+            for i in range(12)
+        ])
+        cls.active_ids = list(Product.objects.filter(is_active=True).order_by("id").values_list("id", flat=True))
+
+    def test_keyset_pages_cover_the_catalogue_in_id_order(self):
+        seen, params = [], {"limit": 5}
+        while True:
+            page = self.client.get(self.URL, params).json()
+            seen += [row["id"] for row in page["results"]]
+            if page["next_cursor"] is None:
+                self.assertIsNone(page["next"])
+                break
+            self.assertIn(f"cursor={page['next_cursor']}", page["next"])
+            params["cursor"] = page["next_cursor"]
+        self.assertEqual(seen, self.active_ids)
+
+    def test_default_objects_match_the_serializer_layout(self):
+        first = self.client.get(self.URL, {"limit": 1}).json()["results"][0]
+        product = Product.objects.get(pk=self.active_ids[0])
+        self.assertEqual(first, {
+            "id": product.id, "name": "Item 0", "category": self.kitchen.id, "description": "",
+            "price": "10.00", "stock": 0, "is_active": True,
+        })
+
+    def test_fields_projection_and_filters(self):
+        response = self.client.get(self.URL, {
+            "fields": "name,category_name,price", "category": self.audio.id, "min_price": 13, "max_price": 18,
+        })
+        self.assertEqual(response.json()["results"], [
+            {"name": f"Item {i}", "category_name": "Audio", "price": f"{10 + i}.00"} for i in (5, 7)
+        ])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({"fields": "name,password"}, {"cursor": "abc"}, {"limit": 0}, {"max_price": "cheap"}):
+            response = self.client.get(self.URL, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+    def test_ndjson_export_streams_every_match_in_chunks(self):
+        with override_settings(PRODUCT_LIST={"STREAM_CHUNK_SIZE": 4}), CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.URL, {"stream": "1", "fields": "id"})
+            body = b"".join(response.streaming_content)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line)["id"] for line in body.splitlines()], self.active_ids)
+        self.assertEqual(len(ctx.captured_queries), 4)   # 11 rows in chunks of 4, then an empty read
+
+
+class CatalogueVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_search_response_cache().clear()
+        # Rebuild autocomplete and refresh stale searches inline: a thread
+        # would not see this test's rows
+        for patcher in (
+            mock.patch.object(get_autocomplete_index(), "_submit", side_effect=lambda fn: fn()),
+            mock.patch.object(get_search_response_cache(), "_submit", side_effect=lambda fn, *args: fn(*args)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.category = Category.objects.create(name="Outdoor")
+        self.product = Product.objects.create(
+            name="TrailLite Headlamp", category=self.category, price=25.00, base_description="Headlamp.",
+        )
+        self.user = User.objects.create_user(username="hiker")
+
+    def _commit(self, write):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        return get_catalogue_version()[0]
+
+    def test_catalogue_writes_bump_the_generation_after_commit(self):
+        start = get_catalogue_version()[0]
+        self.assertEqual(self._commit(self.product.save), start + 1)
+        self.assertEqual(self._commit(lambda: Category.objects.create(name="Garden")), start + 2)
+        review = Review(product=self.product, user=self.user, rating=4, review_text="Bright.")
+        self.assertEqual(self._commit(review.save), start + 3)
+        self.assertEqual(self._commit(review.delete), start + 4)
+
+    def test_saves_of_fields_no_catalogue_view_shows_do_not_bump(self):
+        start = get_catalogue_version()[0]
+        self.product.ai_description = "A bright, lightweight headlamp."
+        self.assertEqual(self._commit(lambda: self.product.save(update_fields=["ai_description"])), start)
+        self.product.stock = 3
+        self.assertEqual(self._commit(lambda: self.product.save(update_fields=["stock"])), start + 1)
+
+    def test_rolled_back_writes_do_not_bump(self):
+        from django.db import transaction
+
+        start = get_catalogue_version()[0]
+        with self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.product.save()
+                raise RuntimeError("abort")
+        cache.clear()
+        self.assertEqual(get_catalogue_version()[0], start)
+
+    def test_matching_if_none_match_is_answered_without_queries(self):
+        for url, params in (
+            ("/api/recommendations/products/", {}),
+            ("/search/", {"q": "headlamp"}),
+            ("/search/autocomplete/", {"q": "tra"}),
+            ("/products/", {}),
+        ):
+            first = self.client.get(url, params)
+            self.assertEqual(first.status_code, 200, url)
+            self.assertTrue(first.has_header("ETag"), url)
+
+            with self.assertNumQueries(0):
+                again = self.client.get(url, params, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(again.status_code, 304, url)
+
+            self._commit(self.product.save)
+            self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200, url)
+
+    def test_product_list_sends_last_modified_and_personal_pages_vary_by_visitor(self):
+        response = self.client.get("/api/recommendations/products/")
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        anonymous = self.client.get("/products/")["ETag"]
+        self.client.force_login(self.user)
+        signed_in = self.client.get("/products/")
+        self.assertNotEqual(signed_in["ETag"], anonymous)
+        self.assertIn("private", signed_in["Cache-Control"])
+
+
+class SearchResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_intent_cache().clear_local()
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        get_search_response_cache().clear()
+        self.category = Category.objects.create(name="Electronics & Accessories")
+        self.earbuds = Product.objects.create(
+            name="PulseSound Wireless Earbuds", category=self.category, price=129.00,
+            base_description="Wireless earbuds for the gym", stock=4,
+        )
+
+    def _search(self, q):
+        response = self.client.get("/search/", {"q": q})
+        return response.json(), response["X-Search-Cache"]
+
+    def test_repeated_queries_are_served_from_the_cache(self):
+        first, status = self._search("wireless earbuds")
+        self.assertEqual((first["count"], status), (1, "miss"))
+
+        with self.assertNumQueries(0), mock.patch(
+            "product_recommendations.services.smart_search_service._parse_query"
+        ) as parse:
+            again, status = self._search("  Wireless   EARBUDS ")
+        parse.assert_not_called()
+        self.assertEqual(status, "hit")
+        self.assertEqual(again["results"], first["results"])
+        self.assertEqual(again["query"], "Wireless   EARBUDS")
+        self.assertEqual(get_search_response_cache().stats()["hit_rate"], 0.5)
+
+    def test_zero_result_queries_are_cached_briefly(self):
+        self.assertEqual(self._search("xyzzy plugh")[1], "miss")
+        self.assertEqual(self._search("xyzzy plugh")[1], "negative_hit")
+        with override_settings(SMART_SEARCH_RESPONSE_CACHE={"NEGATIVE_TTL": 0, "STALE_WHILE_REVALIDATE": False}):
+            self.assertEqual(self._search("xyzzy plugh")[1], "miss")
+        self.assertEqual(get_search_response_cache().stats()["negative_hits"], 1)
+
+    def _new_generation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name="PulseSound Wireless Earbuds Pro", category=self.category, price=149.00,
+                base_description="Noise cancelling earbuds", stock=2,
+            )
+
+    def test_catalogue_change_serves_stale_response_and_refreshes_it(self):
+        response_cache = get_search_response_cache()
+        self._search("wireless earbuds")
+        self._new_generation()
+
+        with mock.patch.object(response_cache, "_submit", side_effect=lambda fn, *args: fn(*args)) as submit:
+            stale, status = self._search("wireless earbuds")
+        self.assertEqual((stale["count"], status), (1, "stale"))
+        submit.assert_called_once()
+
+        fresh, status = self._search("wireless earbuds")
+        self.assertEqual((fresh["count"], status), (2, "hit"))
+        self.assertEqual(response_cache.stats()["refreshes"], 1)
+
+    def test_stale_response_keeps_the_validators_of_its_own_generation(self):
+        url, params = "/search/", {"q": "wireless earbuds"}
+        first = self.client.get(url, params)
+        self._new_generation()
+
+        response_cache = get_search_response_cache()
+        with mock.patch.object(response_cache, "_submit") as submit:
+            stale = self.client.get(url, params, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((stale.status_code, stale["X-Search-Cache"]), (200, "stale"))
+        self.assertEqual(stale["ETag"], first["ETag"])
+        self.assertEqual(stale["Last-Modified"], first["Last-Modified"])
+        self.assertIn("no-cache", stale["Cache-Control"])
+
+        fn, *args = submit.call_args.args
+        fn(*args)   # the background refresh
+        fresh = self.client.get(url, params, HTTP_IF_NONE_MATCH=stale["ETag"])
+        self.assertEqual((fresh.status_code, fresh["X-Search-Cache"]), (200, "hit"))
+        self.assertEqual(fresh.json()["count"], 2)
+        self.assertNotEqual(fresh["ETag"], stale["ETag"])
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=fresh["ETag"]).status_code, 304)
+
+    def test_without_stale_while_revalidate_a_catalogue_change_recomputes(self):
+        self._search("wireless earbuds")
+        self._new_generation()
+        with override_settings(SMART_SEARCH_RESPONSE_CACHE={"STALE_WHILE_REVALIDATE": False}):
+            fresh, status = self._search("wireless earbuds")
+        self.assertEqual((fresh["count"], status), (2, "miss"))
+
+    def test_entries_are_bounded(self):
+        response_cache = SearchResponseCache(config={**SearchResponseCache().config, "MAX_ENTRIES": 2})
+        for q in ("a b", "c d", "e f", "a b"):
+            response_cache.get_or_compute(q, lambda query: {"query": query, "results": [1]})
+        self.assertEqual(response_cache.stats()["entries"], 2)
+        self.assertEqual(response_cache.stats()["misses"], 4)
+
+    def test_stats_view_is_staff_only(self):
+        self.assertEqual(self.client.get("/search/cache-stats/").status_code, 302)
+        self.client.force_login(User.objects.create_user(username="ops", is_staff=True))
+        stats = self.client.get("/search/cache-stats/").json()
+        self.assertIn("hit_rate", stats["response_cache"])
+        self.assertIn("hit_rate", stats["intent_cache"])
+
+
+@override_settings(SMART_SEARCH_BACKEND="fulltext")
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        get_intent_cache().clear_local()
+        get_semantic_index().invalidate()
+        self.backend = get_fulltext_backend()
+        self.audio = Category.objects.create(name="Audio")
+        self.fitness = Category.objects.create(name="Sports & Fitness")
+        self.earbuds = Product.objects.create(
+            name="PulseSound Wireless Earbuds", category=self.audio, price=79.00,
+            base_description="Noise cancelling earbuds with a charging case", brand="PulseSound",
+        )
+        self.speaker = Product.objects.create(
+            name="BoomBox Portable Speaker", category=self.audio, price=45.00,
+            base_description="Pairs with wireless earbuds and phones", brand="BoomBox",
+        )
+        self.bands = Product.objects.create(
+            name="PowerLoop Resistance Bands", category=self.fitness, price=25.00,
+            base_description="Elastic bands for strength training", brand="PowerLoop", material="Latex",
+        )
+
+    def _search(self, query, **kwargs):
+        with mock.patch(
+            "product_recommendations.services.smart_search_service._parse_query_with_ai", return_value=None
+        ):
+            return smart_search_products(query, return_metadata=True, **kwargs)
+
+    def test_backend_matches_the_database(self):
+        self.assertEqual(self.backend.vendor, connection.vendor)
+        self.assertTrue(self.backend.available())
+
+    def test_word_prefix_matches_ranked_by_field_weights(self):
+        candidates = self.backend.candidates(["earbud"])
+        self.assertEqual(candidates.all_ids(), {self.earbuds.id, self.speaker.id})
+        # Name + description beats a description-only match
+        self.assertEqual(candidates.rank(candidates.all_ids()), [self.earbuds.id, self.speaker.id])
+        self.assertEqual(self.backend.candidates(["power bank"]).all_ids(), set())
+
+    def test_one_query_carries_category_and_price_flags(self):
+        with self.assertNumQueries(1):
+            candidates = self.backend.candidates(["wireless"], mapped_category="audio", max_price=50)
+        self.assertEqual(candidates.category_ids(), {self.earbuds.id, self.speaker.id})
+        self.assertEqual(candidates.price_ids(), {self.speaker.id})
+
+        everything = self.backend.candidates([], mapped_category="fitness")
+        self.assertIsNone(everything.keyword_ids())
+        self.assertEqual(everything.category_ids(), {self.bands.id})
+
+    def test_ladder_is_one_search_query_and_one_fetch(self):
+        get_semantic_index().ensure_current()
+        with self.assertNumQueries(2):
+            res, meta = self._search("wireless earbuds under $50")
+        self.assertEqual([p.name for p in res], ["BoomBox Portable Speaker"])
+        self.assertTrue(meta["applied_filters"]["max_price_used"])
+
+        # Nothing under $10: price is relaxed, keyword matches are ranked
+        res, meta = self._search("wireless earbuds under $10")
+        self.assertEqual({p.id for p in res}, {self.earbuds.id, self.speaker.id})
+        self.assertTrue(meta["applied_filters"]["price_relaxed"])
+
+    def test_signals_keep_index_current(self):
+        self.bands.is_active = False
+        self.bands.save()
+        self.assertEqual(self.backend.candidates(["resistance"]).all_ids(), set())
+
+        self.audio.name = "Headphones"
+        self.audio.save()
+        self.assertEqual(self.backend.candidates(["headphones"]).all_ids(), {self.earbuds.id, self.speaker.id})
+
+        self.earbuds.delete()
+        self.assertEqual(self.backend.candidates(["pulsesound"]).all_ids(), set())
+
+    def test_full_query_fallback_searches_material(self):
+        self.assertEqual(self.backend.match_full_query("latex").all_ids(), {self.bands.id})
+
+    def test_rebuild_command_indexes_bulk_created_products(self):
+        Product.objects.bulk_create([
+            Product(name="TrailPeak Hiking Boots", category=self.fitness, price=120, base_description="Boots"),
+        ])
+        self.assertEqual(self.backend.candidates(["trailpeak"]).all_ids(), set())
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 4 products", out.getvalue())
+        self.assertEqual(len(self.backend.candidates(["trailpeak"]).all_ids()), 1)
+
+    def test_memory_backend_setting_bypasses_the_database_index(self):
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        with override_settings(SMART_SEARCH_BACKEND="memory"), \
+                mock.patch.object(self.backend, "candidates") as candidates:
+            res, _ = self._search("resistance bands")
+        candidates.assert_not_called()
+        self.assertEqual([p.id for p in res], [self.bands.id])
+
+
+class MySQLFulltextSQLTests(TestCase):
+    """MySQL statements checked without a server: placeholders line up with their parameters."""
+
+    def setUp(self):
+        self.backend = MySQLFulltextBackend()
+        self.cursor = mock.MagicMock()
+        self.cursor.fetchall.return_value = []
+        fake = mock.MagicMock(vendor="mysql", settings_dict={"NAME": "smartshop_db"})
+        fake.ops.quote_name = lambda name: f"`{name}`"
+        fake.introspection.table_names.return_value = [self.backend.table]
+        fake.cursor.return_value.__enter__.return_value = self.cursor
+        patcher = mock.patch("product_recommendations.services.fulltext_search.connection", fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _bound(self, call=-1):
+        """(SQL before the placeholder, parameter) pairs of an executed statement."""
+        sql, params = self.cursor.execute.call_args_list[call].args
+        segments = sql.split("%s")
+        self.assertEqual(len(segments) - 1, len(params), sql)
+        return list(zip(segments, params)), sql
+
+    def test_candidates_binds_relevance_filters_and_match_in_order(self):
+        self.backend.candidates(["wireless", "noise cancelling"], mapped_category="audio_50%", max_price=50)
+        bound, sql = self._bound()
+        against = 'wireless* "noise cancelling"'
+        self.assertEqual([param for _, param in bound], [against] * 5 + ["%audio\\_50\\%%", 50, against])
+        for before, param in bound:
+            if param == against:
+                self.assertTrue(before.endswith("AGAINST ("), before)
+        self.assertTrue(bound[5][0].endswith("c.name LIKE "))
+        self.assertTrue(bound[6][0].endswith("p.price <= "))
+        self.assertIn("FROM `product_search_document` d", sql)
+
+        self.backend.candidates(["earbud"])
+        bound, _ = self._bound()
+        self.assertEqual([param for _, param in bound], ["earbud*"] * 6)
+
+    def test_every_match_uses_a_fulltext_index(self):
+        schema_editor = mock.MagicMock()
+        self.backend.create_schema(schema_editor)
+        ddl = schema_editor.execute.call_args.args[0]
+        indexes = {tuple(cols.split(", ")) for cols in re.findall(r"FULLTEXT KEY \w+ \(([^)]*)\)", ddl)}
+
+        self.backend.candidates(["wireless"])
+        self.backend.match_full_query("latex gloves")
+        for _, statement in (self._bound(0), self._bound(1)):
+            matches = re.findall(r"MATCH\(([^)]*)\)", statement)
+            self.assertEqual(len(matches), 6)   # five relevance terms and the filter
+            for cols in matches:
+                self.assertIn(tuple(col.removeprefix("d.") for col in cols.split(", ")), indexes)
+
+    def test_index_maintenance_binds_product_ids(self):
+        self.backend.index_products([7, 9])
+        delete, insert = (call.args for call in self.cursor.execute.call_args_list)
+        self.assertEqual(delete, ("DELETE FROM `product_search_document` WHERE product_id IN (%s, %s)", [7, 9]))
+        self.assertTrue(insert[0].startswith("INSERT INTO `product_search_document` (product_id, name, "))
+        self.assertTrue(insert[0].endswith("WHERE p.is_active AND p.id IN (%s, %s)"))
+        self.assertEqual(insert[1], [7, 9])
+
+
+@override_settings(SMART_SEARCH_PARSE_MODE="local")
+class SemanticSearchTests(TestCase):
+    def setUp(self):
+        get_intent_cache().clear_local()
+        get_search_index().invalidate()
+        get_semantic_index().invalidate()
+        self.electronics = Category.objects.create(name="Electronics")
+        self.power_bank = Product.objects.create(
+            name="VoltMax 20000mAh Power Bank", category=self.electronics, price=39.00,
+            base_description="Portable charging for smartphone users", use_case="Travel",
+        )
+        self.vacuum = Product.objects.create(
+            name="RoboClean Compact Vacuum", category=Category.objects.create(name="Home & Living"), price=249.00,
+            base_description="Robotic vacuum for home cleaning", use_case="Cleaning",
+        )
+        self.sunscreen = Product.objects.create(
+            name="SunGuard SPF50 Sunscreen", category=Category.objects.create(name="Beauty"), price=15.99,
+            base_description="Sunscreen for sensitive skin", use_case="Outdoor",
+        )
+
+    def _search(self, query):
+        with mock.patch(
+            "product_recommendations.services.smart_search_service._parse_query_with_ai"
+        ) as ai_parse:
+            res, meta = smart_search_products(query, return_metadata=True)
+        ai_parse.assert_not_called()
+        return [p.id for p in res], meta["applied_filters"]
+
+    def test_vocabulary_gap_is_bridged_without_the_ai_parse(self):
+        ids, applied = self._search("something to charge my phone")
+        self.assertEqual(ids[0], self.power_bank.id)
+        self.assertEqual((applied["parser"], applied["ai_parse_status"]), ("heuristic", "skipped"))
+
+    def test_no_literal_match_falls_back_to_nearest_products(self):
+        ids, applied = self._search("chargers")
+        self.assertEqual(ids, [self.power_bank.id])
+        self.assertTrue(applied["semantic_fallback"])
+
+        ids, applied = self._search("xyzzy plugh")
+        self.assertEqual(ids, [])
+        self.assertFalse(applied["hybrid_ranking"])
+
+    def test_writes_from_other_processes_are_re_embedded(self):
+        cache.clear()
+        index = get_semantic_index()
+        index.ensure_current()
+        before = index.matrix[index.row_of[self.vacuum.id]].copy()
+
+        # Another worker's writes: no signals here, only its generation bump
+        Product.objects.filter(pk=self.vacuum.pk).update(base_description="Cordless stick vacuum for pet hair")
+        Product.objects.filter(pk=self.sunscreen.pk).update(is_active=False)
+        bump_catalogue_version()
+        cache.clear()
+        index.ensure_current()
+        self.assertFalse(np.allclose(index.matrix[index.row_of[self.vacuum.id]], before))
+        self.assertNotIn(self.sunscreen.id, index.row_of)
+        self.assertEqual(len(index), 2)
+
+    def test_changed_products_are_re_embedded_in_one_query(self):
+        index = get_semantic_index()
+        index.ensure_current()
+        before = index.matrix[index.row_of[self.vacuum.id]].copy()
+
+        self.vacuum.base_description = "Cordless stick vacuum for pet hair"
+        self.vacuum.save()
+        self.sunscreen.is_active = False
+        self.sunscreen.save()
+        with self.assertNumQueries(1):
+            index.ensure_current()
+        row = index.row_of[self.vacuum.id]
+        self.assertFalse(np.allclose(index.matrix[row], before))
+        self.assertAlmostEqual(float(np.linalg.norm(index.matrix[row])), 1.0, places=5)
+        self.assertNotIn(self.sunscreen.id, index.row_of)
+        self.assertEqual(len(index), 2)
+
+        # The freed row is reused
+        self.sunscreen.is_active = True
+        self.sunscreen.save()
+        index.ensure_current()
+        self.assertEqual(index.matrix.shape[0], 3)
+
+    def test_search_respects_price_and_similarity(self):
+        index = get_semantic_index()
+        query = index.embed_query("portable charging")
+        self.assertEqual([pid for pid, _ in index.search(query)], [self.power_bank.id])
+        self.assertEqual(index.search(query, max_price=20), [])
+        self.assertEqual(index.matrix.dtype, np.float32)
+
+    def test_hybrid_order_fuses_rankings(self):
+        ids = [1, 2, 3]
+        config = {"KEYWORD_WEIGHT": 1.0, "SEMANTIC_WEIGHT": 1.0, "RRF_K": 1}
+        # 2 is second by keywords but first by meaning: it wins overall
+        self.assertEqual(hybrid_order(ids, [3.0, 2.0, 1.0], [0.0, 0.9, 0.8], config=config), [2, 1, 3])
+        self.assertEqual(hybrid_order(ids, [3.0, 2.0, 1.0], [0.0, 0.9, 0.8], top_k=1, config=config), [2])
+
+
+@override_settings(SIMILAR_PRODUCTS={"TOP_K": 2, "REFRESH_DELAY": 0})
+class SimilarProductsTests(TestCase):
+    def setUp(self):
+        audio = Category.objects.create(name="Audio")
+        kitchen = Category.objects.create(name="Kitchen")
+
+        def product(name, category, price, description, brand=""):
+            return Product.objects.create(
+                name=name, category=category, price=price, base_description=description, brand=brand,
+            )
+
+        self.earbuds = product("Earbuds", audio, 79, "Wireless earbuds with noise cancelling", "PulseSound")
+        self.headphones = product("Headphones", audio, 89, "Wireless over-ear headphones with noise cancelling", "PulseSound")
+        self.speaker = product("Speaker", audio, 45, "Portable bluetooth speaker")
+        self.kettle = product("Kettle", kitchen, 35, "Electric kettle for boiling water")
+        self.teapot = product("Teapot", kitchen, 30, "Glass teapot for brewing tea with boiling water")
+        self.toaster = product("Toaster", kitchen, 60, "Two slice toaster")
+        BackgroundJob.objects.all().delete()
+
+    def _neighbours(self, product):
+        return [p.name for p in similar_products_for(product)]
+
+    def test_build_ranks_neighbours_by_content(self):
+        self.assertEqual(build_similar_products(), 6)
+        self.assertEqual(SimilarProduct.objects.count(), 12)
+        self.assertEqual(self._neighbours(self.earbuds), ["Headphones", "Speaker"])
+        self.assertEqual(self._neighbours(self.kettle), ["Teapot", "Toaster"])
+        scores = list(SimilarProduct.objects.filter(product=self.earbuds).order_by("rank").values_list("score", flat=True))
+        self.assertGreater(scores[0], scores[1])
+
+    def test_blocks_give_the_same_lists(self):
+        build_similar_products()
+        full = list(SimilarProduct.objects.order_by("product_id", "rank").values_list("product_id", "similar_id"))
+        with override_settings(SIMILAR_PRODUCTS={"TOP_K": 2, "BLOCK_SIZE": 4}):
+            build_similar_products()
+        self.assertEqual(
+            list(SimilarProduct.objects.order_by("product_id", "rank").values_list("product_id", "similar_id")), full
+        )
+
+    def test_refresh_updates_only_affected_lists(self):
+        build_similar_products()
+        buds = Product.objects.create(
+            name="Earbuds Pro", category=self.earbuds.category, price=85,
+            base_description="Wireless earbuds with noise cancelling", brand="PulseSound",
+        )
+        refresh_similar_products([buds.id])
+        self.assertEqual(self._neighbours(buds), ["Earbuds", "Headphones"])
+        self.assertEqual(self._neighbours(self.earbuds), ["Earbuds Pro", "Headphones"])
+        self.assertEqual(self._neighbours(self.kettle), ["Teapot", "Toaster"])
+
+        self.teapot.is_active = False
+        self.teapot.save()
+        refresh_similar_products([self.teapot.id])
+        self.assertFalse(SimilarProduct.objects.filter(product=self.teapot).exists())
+        self.assertFalse(SimilarProduct.objects.filter(similar=self.teapot).exists())
+        self.assertEqual(len(self._neighbours(self.kettle)), 2)
+
+    def test_deleted_neighbours_are_backfilled(self):
+        build_similar_products()
+        self.teapot.delete()
+        self.assertEqual(len(self._neighbours(self.kettle)), 1)
+        refresh_similar_products()
+        self.assertEqual(self._neighbours(self.kettle), ["Toaster", "Speaker"])
+
+    @override_settings(LLM_GATEWAY={"BACKEND": "stub"})
+    def test_product_changes_queue_one_coalesced_refresh(self):
+        build_similar_products()
+        self.toaster.base_description = "Electric toaster, boiling water not included"
+        self.toaster.save()
+        self.kettle.save(update_fields=["stock"])   # no feature changed
+        with override_settings(SIMILAR_PRODUCTS={"REFRESH_DELAY": 3600}):
+            self.speaker.save()
+        queued = BackgroundJob.objects.filter(task="similar_products", status=BackgroundJob.STATUS_PENDING)
+        self.assertEqual(set(queued.values_list("product_id", flat=True)), {self.toaster.id, self.speaker.id})
+
+        # The due refresh also covers the one still waiting out its delay
+
+        with mock.patch(
+            "product_recommendations.services.similar_products.refresh_similar_products"
+        ) as refresh:
+            self.assertEqual(run_pending(), (1, 0))
+        refresh.assert_called_once_with({self.toaster.id, self.speaker.id})
+        self.assertFalse(queued.exists())
+
+    def test_detail_page_reads_neighbours_in_one_query(self):
+        build_similar_products()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(similar_products_for(self.kettle)), 2)
+        self.client.force_login(User.objects.create_user(username="shopper"))
+        response = self.client.get(f"/products/{self.kettle.id}/")
+        self.assertEqual([p.name for p in response.context["similar_products"]], ["Teapot", "Toaster"])
+        self.assertContains(response, "Similar Products")
@@ -36,6 +36,7 @@ urlpatterns = [
     
     # existing urls here
     path("search/", smart_search_view, name="smart_search"),
+    path("search/cache-stats/", views.search_cache_stats, name="search_cache_stats"),
     
     # Product detail and review submission
     path("products/", products_page, name="products_page"),
@@ -45,6 +46,9 @@ urlpatterns = [
     # Chatbot API endpoint
     path("chatbot/",views.chatbot_api,name="chatbot_api"),
     
+    # Streaming chatbot endpoint (server-sent events)
+    path("chatbot/stream/", views.chatbot_stream, name="chatbot_stream"),
+
     # Chatbot greeting endpoint
     path("chatbot/greeting/", views.chatbot_greeting, name="chatbot_greeting"),
     
@@ -1,39 +1,85 @@
 
 from rest_framework.decorators import api_view
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
 from product_recommendations.models import Review, UserInteraction, Recommendation, Product, ChatMessage, Category
 from product_recommendations.services.smart_search_service import smart_search_products
-from product_recommendations.serializers import RecommendationSerializer, ProductSerializer
-from product_recommendations.services.ai_recommendation_service import (
-    generate_recommendations_for_user
+from product_recommendations.services.autocomplete_index import get_autocomplete_index
+from product_recommendations.services.catalogue_version import (
+    catalogue_etag, catalogue_last_modified, generation_etag, personal_catalogue_etag
 )
+from product_recommendations.services.query_intent_cache import get_intent_cache
+from product_recommendations.services.search_response_cache import get_search_response_cache
+from product_recommendations.services.product_listing import (
+    ListingError, dumps, iter_ndjson, list_products, parse_listing_params
+)
+from product_recommendations.serializers import RecommendationSerializer
+from product_recommendations.services.recommendation_pipeline import (
+    get_or_refresh_recommendations
+)
+from product_recommendations.services.review_stats import get_review_stats
+from product_recommendations.services.similar_products import similar_products_for
 from product_recommendations.services.review_summary_service import (
-    get_or_generate_review_summary
+    get_cached_review_summary,
+    rating_based_summary,
 )
 
 import json
-from product_recommendations.services.ai_recommendation_service import client
+import time
 from django.contrib.auth import logout
-from product_recommendations.services.product_description_service import get_or_generate_product_description
+from product_recommendations.services.job_queue import enqueue_job
+from product_recommendations.services.chat_service import answer_chat_message, stream_chat_reply
+from product_recommendations.services.conversation import record_chat_turn
 from .models import ChatMessage
 
 
+# Reviews listed on the product page; totals come from the product's review stats
+PRODUCT_DETAIL_REVIEWS = 20
+PRODUCT_DETAIL_SIMILAR = 8
+
+
 def index(request):
     return HttpResponse("SmartShop Recommendation API is running")
 
 
+@condition(etag_func=catalogue_etag, last_modified_func=catalogue_last_modified)
 @api_view(["GET"])
 def product_list(request):
-    products = Product.objects.filter(is_active=True)
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    """
+    Active products, one keyset page at a time: ``?cursor=`` (from
+    ``next_cursor``), ``?limit=``, ``?fields=id,name,...``, ``?category=``
+    (ids, repeatable), ``?min_price=`` / ``?max_price=``.  ``?stream=1``
+    returns every matching product as NDJSON instead.
+    """
+    try:
+        options = parse_listing_params(request.query_params)
+    except ListingError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if request.query_params.get("stream") in ("1", "true", "ndjson"):
+        response = StreamingHttpResponse(iter_ndjson(options), content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="products.ndjson"'
+        return response
+
+    page = list_products(options)
+    page["next"] = None
+    if page["next_cursor"] is not None:
+        params = request.query_params.copy()
+        params["cursor"] = page["next_cursor"]
+        page["next"] = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    return HttpResponse(dumps(page), content_type="application/json")
 
 
 class UserRecommendationAPIView(APIView):
@@ -50,46 +96,22 @@ class UserRecommendationAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        interactions = UserInteraction.objects.filter(user=user)
-
-        # Call AI recommendation engine
-        products = generate_recommendations_for_user(user, interactions)
-
-        # Store/update recommendations
-        recommendations = []
-        for product in products:
-            rec, _ = Recommendation.objects.update_or_create(
-                user=user,
-                product=product,
-                defaults={
-                    "score": 0.9,
-                    "generated_by": "AI Recommendation Engine"
-                }
-            )
-            recommendations.append(rec)
+        # Read the ranking precomputed by the build_recommendations job
+        recommendations = get_or_refresh_recommendations(user)
 
         serializer = RecommendationSerializer(recommendations, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+@condition(etag_func=catalogue_etag, last_modified_func=catalogue_last_modified)
 def autocomplete_search(request):
     q = request.GET.get("q", "").strip()
-    suggestions = []
-
-    if len(q) >= 2:
-        # Product name suggestions
-        product_names = Product.objects.filter(
-            is_active=True,
-            name__icontains=q
-        ).values_list("name", flat=True)[:5]
-
-        # Category suggestions
-        category_names = Category.objects.filter(
-            name__icontains=q
-        ).values_list("name", flat=True)[:5]
+    index = get_autocomplete_index()
+    suggestions = index.suggest(q)
 
-        suggestions = list(product_names) + list(category_names)
-
-    return JsonResponse({"suggestions": suggestions})
+    response = JsonResponse({"suggestions": suggestions})
+    # Same answer for every user; let browsers and proxies reuse it briefly
+    patch_cache_control(response, public=True, max_age=index.config["MAX_AGE"])
+    return response
 
 
 @login_required
@@ -105,16 +127,15 @@ def recommendation_dashboard(request):
         except User.DoesNotExist:
             selected_user = request.user
 
-    interactions = UserInteraction.objects.filter(user=selected_user)
-    recommendations = generate_recommendations_for_user(selected_user, interactions)
+    # Read the ranking precomputed by the build_recommendations job
+    recommendations = get_or_refresh_recommendations(selected_user)
 
-    # Add simulated AI score
     recommendations_with_score = [
         {
-            "product": product,
-            "score": round(1 - index * 0.1, 2)
+            "product": rec.product,
+            "score": round(rec.score, 2)
         }
-        for index, product in enumerate(recommendations)
+        for rec in recommendations
     ]
 
     return render(request, "recommendations/dashboard.html", {
@@ -123,15 +144,7 @@ def recommendation_dashboard(request):
         "recommendations": recommendations_with_score
     })
 
-def smart_search_view(request):
-    """
-    Smart Search endpoint.
-    Accepts query via GET parameter ?q=
-    Returns list of matching products plus parsed metadata for UI transparency.
-    """
-
-    query = request.GET.get("q", "").strip()
-
+def _search_payload(query):
     products, meta = smart_search_products(query, return_metadata=True)
 
     results = []
@@ -146,14 +159,53 @@ def smart_search_view(request):
             "use_case": product.use_case,
         })
 
-    return JsonResponse({
+    return {
         "query": query,
         "count": len(results),
         "results": results,
         "parsed": meta.get("parsed"),
         "applied_filters": meta.get("applied_filters"),
+    }
+
+
+@condition(etag_func=catalogue_etag, last_modified_func=catalogue_last_modified)
+def smart_search_view(request):
+    """
+    Smart Search endpoint.
+    Accepts query via GET parameter ?q=
+    Returns list of matching products plus parsed metadata for UI transparency.
+    Whole responses are cached per normalized query (see search_response_cache).
+    """
+
+    query = request.GET.get("q", "").strip()
+
+    cached = get_search_response_cache().get_or_compute(query, _search_payload)
+    payload = cached.payload
+    if payload["query"] != query:
+        # Cached under the normalized query; echo what this client sent
+        payload = {**payload, "query": query}
+
+    response = JsonResponse(payload)
+    response["X-Search-Cache"] = cached.status
+    if cached.status == "stale":
+        # Validators of the catalogue the payload was computed from (condition()
+        # keeps headers the view set), so clients don't keep it as current
+        generation, updated_at = cached.version
+        response["ETag"] = quote_etag(generation_etag(generation))
+        response["Last-Modified"] = http_date(updated_at.timestamp() if updated_at else 0)
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+@staff_member_required
+def search_cache_stats(request):
+    """Hit rates of the search caches in this worker process, for tuning."""
+    return JsonResponse({
+        "response_cache": get_search_response_cache().stats(),
+        "intent_cache": get_intent_cache().stats(),
+        "autocomplete": get_autocomplete_index().stats(),
     })
-    
+
 @login_required
 def submit_review(request, product_id):
     if request.method == "POST":
@@ -163,18 +215,16 @@ def submit_review(request, product_id):
         review_text = request.POST.get("review_text", "").strip()
 
         if rating and review_text:
-            review = Review.objects.create(
+            Review.objects.create(
                 product=product,
                 user=request.user,
                 rating=int(rating),
                 review_text=review_text
             )
 
-            # 🔁 Invalidate AI cache so the summary is regenerated
-            review.ai_summary_cache = None
-            review.sentiment_label = None
-            review.last_summarized_at = None
-            review.save()
+            # 🔁 Regenerate the AI summary in the background; the stored one
+            # keeps being shown until the job has run
+            enqueue_job("review_summary", product)
 
         # Redirect back to product detail page after submission
         return redirect('product_detail', product_id=product.id)
@@ -182,19 +232,41 @@ def submit_review(request, product_id):
     return redirect('product_detail', product_id=product_id)
 
     
+# The page also renders the visitor (navbar, CSRF token): validators are per visitor
+@condition(etag_func=personal_catalogue_etag)
 def products_page(request):
     """Public product listing UI (non-authenticated users allowed)."""
-    products = Product.objects.filter(is_active=True)
-    return render(request, "products/product_list.html", {"products": products})
+    products = (
+        Product.objects
+        .filter(is_active=True)
+        .select_related("category")
+        .only("id", "name", "price", "image_url", "category__name")
+    )
+    response = render(request, "products/product_list.html", {"products": products})
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
 
 
 @login_required
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    reviews = product.reviews.all()
-    ai_desc =  get_or_generate_product_description(product)
-    
-    review_summary = get_or_generate_review_summary(product)
+    product = get_object_or_404(Product.objects.select_related("category", "review_stats"), id=product_id)
+    reviews = list(product.reviews.select_related("user").order_by("-created_at", "-id")[:PRODUCT_DETAIL_REVIEWS])
+    review_stats = get_review_stats(product)
+    # Precomputed by the similar-products job; one indexed query
+    similar_products = similar_products_for(product, limit=PRODUCT_DETAIL_SIMILAR)
+
+    # AI text is generated by the job queue (run_jobs); never wait on it here
+    ai_desc = (product.ai_description or "").strip()
+    if not ai_desc:
+        enqueue_job("product_description", product)
+        ai_desc = product.base_description
+
+    review_summary = get_cached_review_summary(product)
+    if review_summary is None:
+        review_summary = rating_based_summary(product)
+        if review_summary is not None:
+            enqueue_job("review_summary", product)
 
     return render(
         request,
@@ -202,8 +274,10 @@ def product_detail(request, product_id):
         {
             "product": product,
             "reviews": reviews,
+            "review_stats": review_stats,
             "review_summary": review_summary,
             "ai_description": ai_desc,
+            "similar_products": similar_products,
         }
     )
     
@@ -219,269 +293,85 @@ def chatbot_api(request):
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
     user_message = data.get("message", "")
-    msg = user_message.lower().strip()
-    
-    # Determine if message is a follow-up about availability or reviews
-    AVAILABILITY_INTENTS = ["stock", "in stock", "available", "availability"]
-    REVIEW_INTENTS = ["review", "reviews", "rating", "good", "bad", "feedback", "worth"]
-
-    # Check for follow-up intents
-    is_followup = any(k in msg for k in (AVAILABILITY_INTENTS + REVIEW_INTENTS))
-
-    # Check last message for product context if follow-up
-    last_product = None
-    if is_followup:
-        last_message = (
-            ChatMessage.objects
-            .filter(user=request.user)
-            .order_by("-created_at")
-            .first()
-        )
-        if last_message and last_message.response:
-            # Try multiple patterns to extract product name
-            import re
-            
-            # Pattern 1: **ProductName** (bold)
-            match = re.search(r'\*\*([^*]+)\*\*', last_message.response)
-            
-            # Pattern 2: "ProductName ($" (product with price)
-            if not match:
-                match = re.search(r':\s*([^(]+?)\s*\(\$', last_message.response)
-            
-            # Pattern 3: Just search the response text against all products
-            if match:
-                product_name = match.group(1).strip()
-                try:
-                    last_product = Product.objects.get(
-                        name__iexact=product_name,
-                        is_active=True
-                    )
-                except Product.DoesNotExist:
-                    last_product = Product.objects.filter(
-                        name__icontains=product_name,
-                        is_active=True
-                    ).first()
-            else:
-                # Fallback: search all active products and see which one appears in response
-                all_products = Product.objects.filter(is_active=True)
-                for p in all_products:
-                    if p.name in last_message.response:
-                        last_product = p
-                        break
+    turn = answer_chat_message(request.user, user_message)
 
-    
-    # Greeting intent
-    if msg in ["hi", "hello", "hey", "good morning", "good afternoon"]:
-        reply = (
-            f"Hi {request.user.first_name or request.user.username}! 👋 "
-            "How can I help you today?"
-        )
-        ChatMessage.objects.create(
-            user=request.user, message=user_message, response=reply
-        )
-        return JsonResponse({"reply": reply})
-    
-    # ---- Primary: smart search for products ----
-    products = []
-    meta = {"parsed": {}, "applied_filters": {}}
-    
-    if not is_followup or not last_product:     
-        # Use smart search with metadata to get parsed filters and price info
-        products, meta = smart_search_products(user_message, user=request.user, return_metadata=True)
-    
-        # Prefer exact keyword matches for concrete product nouns
-        if products:
-            tokens = [w for w in msg.split() if w not in ["i", "need", "want", "a", "an", "the"]]
-
-            explicit_matches = [
-                p for p in products
-                if any(token in p.name.lower() for token in tokens)
-            ]            
-            if explicit_matches:
-                products = explicit_matches    
-    
-        products = list(products)[:1] # IMPORTANT: only 1 product for clarity
+    # Persist chat message
+    record_chat_turn(request.user, user_message, turn["reply"], turn)
 
-    product = last_product if (is_followup and last_product) else (products[0] if products else None)   
-            
-    
-    # If no products found, try to reference last chat message for context
-    if not product and not is_followup:
-        last_chat = (
-            ChatMessage.objects
-            .filter(user=request.user)
-            .order_by("-created_at")
-            .first()
-        )
-
-        if last_chat and last_chat.response:
-            # Extract product name from previous response
-            import re
-            match = re.search(r'\*\*([^*]+)\*\*', last_chat.response)
-            if not match:
-                match = re.search(r':\s*([^(]+?)\s*\(\$', last_chat.response)
-            
-            if match:
-                product_name = match.group(1).strip()
-                try:
-                    product = Product.objects.get(
-                        name__iexact=product_name,
-                        is_active=True
-                    )
-                except Product.DoesNotExist:
-                    product = Product.objects.filter(
-                        name__icontains=product_name,
-                        is_active=True
-                    ).first()
-            else:
-                # Fallback search
-                all_products = Product.objects.filter(is_active=True)
-                for p in all_products:
-                    if p.name in last_chat.response:
-                        product = p
-                        break
-    
-    if not product and len(products) > 1 and any(k in msg for k in AVAILABILITY_INTENTS + REVIEW_INTENTS):
-        reply = (
-            "I found a few matching products. "
-            "Could you tell me which one you're referring to?"
-        )
-        ChatMessage.objects.create(
-            user=request.user, message=user_message, response=reply
-        )
-        return JsonResponse({"reply": reply})
-
-     
-    # Handle availability requests  
-    if product and any(k in msg for k in AVAILABILITY_INTENTS):
-        if product.stock > 0:
-            reply = f"Yes, **{product.name}** is currently in stock."
-        else:
-            reply = f"Sorry, **{product.name}** is currently out of stock."
-
-        ChatMessage.objects.create(
-            user=request.user, message=user_message, response=reply
-        )
-        return JsonResponse({"reply": reply})
-         
-
-    # Handle review-related questions
-    if product and any(k in msg for k in REVIEW_INTENTS):
-        from product_recommendations.models import Review
-        from django.db.models import Avg, Count
-
-        reviews = Review.objects.filter(product=product)
-
-        if not reviews.exists():
-            reply = f"There are no customer reviews yet for **{product.name}**."
-        else:
-            # Use cached AI summaries if available
-            ai_summaries = reviews.exclude(ai_summary_cache__isnull=True)\
-                                .exclude(ai_summary_cache__exact="")\
-                                .values_list("ai_summary_cache", flat=True)
-
-            sentiments = reviews.exclude(sentiment_label__isnull=True)\
-                                .values_list("sentiment_label", flat=True)
-
-            avg_rating = reviews.aggregate(avg=Avg("rating"))["avg"]
-            total_reviews = reviews.count()
-
-            if ai_summaries:
-                # Combine cached AI summaries (lightweight + deterministic)
-                combined_summary = " ".join(set(ai_summaries))
-
-                # Sentiment distribution
-                sentiment_counts = {}
-                for s in sentiments:
-                    sentiment_counts[s] = sentiment_counts.get(s, 0) + 1
-
-                dominant_sentiment = max(sentiment_counts, key=sentiment_counts.get)
-
-                reply = (
-                    f"Here’s what customers say about **{product.name}**:\n\n"
-                    f"**AI Summary:** {combined_summary}\n\n"
-                    f"**Overall Sentiment:** {dominant_sentiment}\n"
-                    f"**Average Rating:** {avg_rating:.1f}/5 "
-                    f"from {total_reviews} reviews"
-                )
-            else:
-                # Fallback: no AI summary yet, but reviews exist
-                reply = (
-                    f"**{product.name}** has {total_reviews} reviews "
-                    f"with an average rating of {avg_rating:.1f}/5.\n\n"
-                    "Detailed AI summaries will be available soon."
-                )
-
-        ChatMessage.objects.create(
-            user=request.user,
-            message=user_message,
-            response=reply
-        )
-        return JsonResponse({"reply": reply})
-  
-
-    # Build reply based on search results
-    if products:
-        max_price = meta.get('parsed', {}).get('max_price')
-        price_relaxed = meta.get('applied_filters', {}).get('price_relaxed', False)
-        
-        # Build product list with pricing info
-        product_lines = []
-        for p in products:
-            line = p.name
-            price = float(p.price)
-            line += f" (${price:.2f})"
-            
-            # Add price-relative warning based on how much it exceeds budget
-            if max_price and price > max_price:
-                overage_pct = ((price - max_price) / max_price) * 100
-                if overage_pct <= 10:
-                    indicator = "⚠️ slightly above"
-                elif overage_pct <= 25:
-                    indicator = "⚠️ moderately above"
-                else:
-                    indicator = "⚠️ well above"
-                line += f" {indicator} your ${max_price:.0f} budget"
-            
-            product_lines.append(line)
-        
-        reply = "Here's what I found for you: " + ", ".join(product_lines)
-        
-        # Add note if price constraint was relaxed
-        if price_relaxed and max_price:
-            reply += f"\n(Note: No items strictly under ${max_price:.0f} found, showing alternatives)"
-    else:
-        parsed = meta.get("parsed", {}) or {}
-        category = parsed.get("mapped_category") or parsed.get("category")
-        keywords = parsed.get("keywords", [])
-
-        reply = "I don't currently have a matching item in the SmartShop catalogue."
-
-        if category:
-            reply += f" I detected a request related to **{category}**."
-
-            category_exists = Product.objects.filter(
-                is_active=True,
-                category__name__icontains=category
-            ).exists()
-
-            if category_exists:
-                reply += (
-                    f" While I don't have that specific item, you can browse other products "
-                    f"available under **{category}**."
-                )
-            else:
-                reply += f" At the moment, there are no products listed under **{category}**."
-
-        if keywords:
-            reply += f" (Keywords detected: {', '.join(keywords)}.)"
-
-        reply += " You can browse **All Products** or try a more specific search."
+    return JsonResponse({"reply": turn["reply"]})
 
-    # Persist chat message
-    ChatMessage.objects.create(user=request.user, message=user_message, response=reply)
 
-    return JsonResponse({"reply": reply})
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _product_card(product):
+    return {
+        "id": product.id,
+        "name": product.name,
+        "price": float(product.price),
+        "image_url": product.image_url,
+        "in_stock": product.stock > 0,
+        "url": reverse("product_detail", args=[product.id]),
+    }
+
+
+async def chatbot_stream(request):
+    """
+    Streaming chat endpoint (server-sent events, served via SmartShop/asgi.py).
+
+    Events, in order:
+      product - the matched product card, as soon as the search finishes
+      token   - incremental reply text
+      done    - final metadata (intent, parsed query, applied filters, timings)
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=400)
+
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+
+    try:
+        data = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    user_message = data.get("message", "")
+
+    async def events():
+        started = time.perf_counter()
+        # Flush headers right away so the client sees the stream open
+        yield ": stream open\n\n"
+
+        turn = await sync_to_async(answer_chat_message)(user, user_message)
+        product = turn["product"] or (turn["products"][0] if turn["products"] else None)
+        if product is not None:
+            yield _sse("product", _product_card(product))
+        first_byte_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        parts = []
+        async for chunk in stream_chat_reply(user_message, turn):
+            parts.append(chunk)
+            yield _sse("token", {"text": chunk})
+        reply = "".join(parts)
+
+        await sync_to_async(record_chat_turn)(user, user_message, reply, turn)
+
+        yield _sse("done", {
+            "intent": turn["intent"],
+            "product_id": product.id if product is not None else None,
+            "parsed": turn["meta"].get("parsed"),
+            "applied_filters": turn["meta"].get("applied_filters"),
+            "reply": reply,
+            "first_event_ms": first_byte_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 # Separate greeting endpoint (if your frontend calls this on chatbot open)